@@ -54,8 +54,9 @@ class Cache( Component ):
             # on Windows XP, the shelve does not work, work without cache
             try:
                 self._cache = shelve.open(self.cache_filename,"c", writeback = False)
-                debug( "disp%s: using cache %s" % (id(self), self.cache_filename ))
-                debug( "disp%s: keys in cache: %s" % (id(self,), str(list(self._cache.keys()) ) ))                
+                debug( "disp%s: using cache %s", id(self), self.cache_filename )
+                if logging.getLogger().isEnabledFor( logging.DEBUG ):
+                    debug( "disp%s: keys in cache: %s", id(self), list(self._cache.keys()) )
             # except bsddb.db.DBFileExistsError as msg:    
             except OSError as msg:    
                 warn("disp%s: could not open cache %s - continuing without. Error = %s" %\
@@ -63,14 +64,14 @@ class Cache( Component ):
                 self.cache_filename = None
                 self._cache = None
         else:
-            debug( "disp%s: not using cache"% (id(self),) )
+            debug( "disp%s: not using cache", id(self) )
             
     def __del__(self):
 
         if self._cache != None: 
             return
-        self.debug( "closing cache %s" % self.cache_filename )
-        self.debug( "keys in cache %s" % (str(list(self._cache.keys()) ) ))
+        self.debug( "closing cache %s", self.cache_filename )
+        self.debug( "keys in cache %s", list(self._cache.keys()) )
         self._cache.close()
         self._cache = None
 
@@ -92,11 +93,11 @@ class Cache( Component ):
             if key in self._cache: 
                 result = self._cache[key]
                 if result is not None:
-                    self.debug( "retrieved data for key '%s' from cache" % (key) )
+                    self.debug( "retrieved data for key '%s' from cache", key )
                 else:
                     self.warn( "retrieved None data for key '%s' from cache" % (key ))
             else:
-                self.debug( "key '%s' not found in cache" % key )
+                self.debug( "key '%s' not found in cache", key )
                 raise KeyError("cache does not contain %s" % str(key))
 
         # except (bsddb.db.DBPageNotFoundError, bsddb.db.DBAccessError, pickle.UnpicklingError, ValueError, EOFError) as msg:
@@ -117,7 +118,7 @@ class Cache( Component ):
             # best method is clear
             try:
                 self._cache[key] = data
-                self.debug( "saved data for key '%s' in cache" % key )
+                self.debug( "saved data for key '%s' in cache", key )
             # except (bsddb.db.DBPageNotFoundError,bsddb.db.DBAccessError) as msg:
             except (OSError) as msg:
                 self.warn( "could not save key '%s' from '%s': msg=%s" % (key,
@@ -26,16 +26,23 @@ class Component(object):
     def __init__(self, *args, **kwargs ):
         pass
 
-    def debug( self, msg ):
-        debug( "disp%s: %s" % (id(self),msg) )
-    def warn( self, msg ):
-        warn( "disp%s: %s" % (id(self),msg) ) 
-    def info( self, msg ):
-        logging.info( "disp%s: %s" % (id(self),msg) ) 
-    def error( self, msg ):
-        error( "disp%s: %s" % (id(self),msg) ) 
-    def critical( self, msg ):
-        critical( "disp%s: %s" % (id(self),msg) ) 
+    # messages are only formatted with *args* if they are logged
+    def log( self, level, msg, *args ):
+        if args:
+            log( level, "disp%s: " + msg, id(self), *args )
+        else:
+            log( level, "disp%s: %s", id(self), msg )
+
+    def debug( self, msg, *args ):
+        self.log( logging.DEBUG, msg, *args )
+    def warn( self, msg, *args ):
+        self.log( logging.WARNING, msg, *args )
+    def info( self, msg, *args ):
+        self.log( logging.INFO, msg, *args )
+    def error( self, msg, *args ):
+        self.log( logging.ERROR, msg, *args )
+    def critical( self, msg, *args ):
+        self.log( logging.CRITICAL, msg, *args )
 
 # plugins are only initialized once they are called
 # for in order to remove problems with cyclic imports
@@ -69,8 +76,8 @@ def init_plugins():
     if len(plugins) == 0:
         warn("did not find any plugins")
     else:
-        debug("found plugins: %i capabilites and %i plugins" % \
-                  (len(plugins), sum( [len(x) for x in list(plugins.values()) ] ) ))
+        debug("found plugins: %i capabilites and %i plugins",
+          len(plugins), sum( [len(x) for x in list(plugins.values()) ] ) )
 
     return plugins
 
@@ -1,55 +1,79 @@
-import numpy, numpy.linalg, numpy.linalg.linalg
+import numpy, numpy.linalg
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+except ImportError:
+    scipy = None
+
+# matrices with more rows and columns than this are decomposed
+# with a truncated SVD, if scipy is available.
+MAX_DENSE = 500
 
 ##---------------------------------------------------------------------
 def GetIndices( matrix ):
-    """return order (1st eigenvector) of row and column indicies.
+    """return order (1st principal axis) of row and column indicies.
+
+    The axis is computed from the singular value decomposition of the
+    matrix of standardized residuals. Large matrices, including
+    :mod:`scipy.sparse` matrices, are decomposed with a truncated SVD
+    that computes the first singular vectors only and never
+    builds the dense residual matrix.
 
-    This procedure fails if there are row or columns with a sum of 0.
+    If there are rows or columns with a sum of 0, the original order
+    is returned.
     """
 
     nrows, ncols = matrix.shape
 
     # calculate row and column sums
-    row_sums = numpy.sum( matrix, 1 )
-    col_sums = numpy.sum( matrix, 0 )    
+    row_sums = numpy.asarray( matrix.sum( 1 ), dtype = numpy.float64 ).ravel()
+    col_sums = numpy.asarray( matrix.sum( 0 ), dtype = numpy.float64 ).ravel()
 
     # check for empty rows/columns
     # return the original permutation
     if 0 in row_sums or 0 in col_sums:
         return list(range(nrows)), list(range(ncols))
     
-    a = numpy.zeros( (nrows, nrows), numpy.float)
-    for x in range( 0, nrows):
-        a[x,x] = 1.0 / float(row_sums[x])
-
-    b = numpy.zeros( (ncols, ncols), numpy.float)    
-    for x in range( 0, ncols):
-        b[x,x] = 1.0 / float(col_sums[x])
-        
-    M = numpy.dot( \
-        a, numpy.dot( \
-        matrix, numpy.dot( \
-        b, numpy.transpose( matrix ))))
+    total = row_sums.sum()
+    # square roots of row and column masses
+    r = numpy.sqrt( row_sums / total )
+    c = numpy.sqrt( col_sums / total )
 
     try:
-        row_eigenvector = numpy.linalg.eig(M)[1][:,1]
-    except numpy.linalg.linalg.LinAlgError as msg:
+        if scipy is not None and min( nrows, ncols ) > MAX_DENSE:
+            # the standardized residuals are
+            # S = Dr^-1/2 ( P - r c^T ) Dc^-1/2 = Dr^-1/2 P Dc^-1/2 - sqrt(r) sqrt(c)^T
+            if scipy.sparse.issparse( matrix ):
+                P = scipy.sparse.csr_matrix( matrix, dtype = numpy.float64 ) / total
+            else:
+                P = numpy.asarray( matrix, dtype = numpy.float64 ) / total
+
+            S = scipy.sparse.linalg.LinearOperator(
+                (nrows, ncols),
+                matvec = lambda x: ( P.dot( numpy.ravel(x) / c ) / r ) - r * c.dot( numpy.ravel(x) ),
+                rmatvec = lambda x: ( P.T.dot( numpy.ravel(x) / r ) / c ) - c * r.dot( numpy.ravel(x) ),
+                dtype = numpy.float64 )
+
+            u, sigma, vt = scipy.sparse.linalg.svds( S, k = 1 )
+            u, v = u[:,0], vt[0,:]
+        else:
+            if scipy is not None and scipy.sparse.issparse( matrix ):
+                matrix = matrix.toarray()
+            P = numpy.asarray( matrix, dtype = numpy.float64 ) / total
+            S = P / r[:,numpy.newaxis] / c[numpy.newaxis,:] - numpy.outer( r, c )
+            u, sigma, vt = numpy.linalg.svd( S, full_matrices = False )
+            u, v = u[:,0], vt[0,:]
+    except (numpy.linalg.LinAlgError, ArithmeticError) as msg:
         raise ValueError( msg )
- 
-    M = numpy.dot( \
-        b, numpy.dot( \
-            numpy.transpose(matrix), numpy.dot( \
-                a, matrix )))
 
-    try:
-        col_eigenvector = numpy.linalg.eig(M)[1][:,1]
-    except numpy.linalg.linalg.LinAlgError as msg:
-        raise ValueError( msg )
-         
-    ## insert columns ignored at the computation and give them the lowest
-    ## eigenvalue
-    row_eigenvector = row_eigenvector.astype(numpy.float) 
-    col_eigenvector = col_eigenvector.astype(numpy.float)
+    # the sign of singular vectors is arbitrary - make it deterministic
+    if u[numpy.argmax( numpy.abs(u) )] < 0:
+        u, v = -u, -v
+
+    ## standard coordinates of rows and columns
+    row_eigenvector = u / r
+    col_eigenvector = v / c
 
     return row_eigenvector, col_eigenvector
 
@@ -57,27 +81,16 @@ def GetIndices( matrix ):
 def GetPermutatedMatrix( matrix, 
                          map_row_new2old, map_col_new2old,
                          row_headers = None, col_headers = None):
-    """return a permuted matrix. Note, that currently this is very
-    inefficient, as I do not know how to do this in numpy.
+    """return a permuted matrix. 
     """
 
-    nrows, ncols = matrix.shape
-
-    result = numpy.zeros( (nrows, ncols), matrix.dtype)
-    for r in range(0, nrows):
-        for c in range(0,ncols):
-            result[r,c] = matrix[map_row_new2old[r], map_col_new2old[c]]
+    result = matrix[numpy.ix_( map_row_new2old, map_col_new2old )]
 
     if not row_headers or not col_headers:
         return result
 
-    rows = []
-    for x in map_row_new2old:
-        rows.append( row_headers[x] )
-        
-    cols = []
-    for x in map_col_new2old:
-        cols.append( col_headers[x] )
+    rows = [ row_headers[x] for x in map_row_new2old ]
+    cols = [ col_headers[x] for x in map_col_new2old ]
 
     return result, rows, cols
         
@@ -90,7 +103,7 @@ if __name__ == "__main__":
 
     num_rows = 6
     num_cols = 5
-    matrix = numpy.zeros( (num_rows,num_cols), numpy.int)
+    matrix = numpy.zeros( (num_rows,num_cols), int)
 
     matrix[0,2] = 1
     matrix[0,3] = 1
@@ -1,9 +1,10 @@
-import collections, itertools
+import collections, itertools, sys
 from logging import warn, log, debug, info
 
 from collections import OrderedDict as odict
 from SphinxReport import Utils
 import pandas
+import numpy
 
 def unique( iterables ):
     s = set()
@@ -529,6 +530,128 @@ def removeLeaf( work, path ):
         del work[path[-1]]
     return work
 
+def hasChunks( work ):
+    '''return True if there are :class:`Utils.ChunkedResult` leaves
+    in *work*.'''
+    if Utils.isChunked( work ): return True
+    if not hasattr( work, "keys" ): return False
+    if isinstance( work, pandas.DataFrame ) or isinstance( work, pandas.Series ): return False
+    for value in work.values():
+        if hasChunks( value ): return True
+    return False
+
+def loadChunks( work ):
+    '''replace :class:`Utils.ChunkedResult` leaves in *work* by
+    dictionaries of columns.
+
+    returns the new root.
+    '''
+    if Utils.isChunked( work ): return work.asColumns()
+    if not hasattr( work, "keys" ): return work
+    if isinstance( work, pandas.DataFrame ) or isinstance( work, pandas.Series ): return work
+    for key, value in list(work.items()):
+        if Utils.isChunked( value ):
+            work[key] = value.asColumns()
+        else:
+            loadChunks( value )
+    return work
+
+def getSize( work ):
+    '''return the number of leaves in *work* and the number of 
+    bytes in numpy arrays and dataframes at the leaves.'''
+    if isinstance( work, pandas.DataFrame ) or isinstance( work, pandas.Series ):
+        return 1, int( numpy.sum( work.memory_usage( index = True ) ) )
+    if isinstance( work, numpy.ndarray ): return 1, work.nbytes
+    if Utils.isChunked( work ) or not hasattr( work, "keys" ): return 1, 0
+    leaves, nbytes = 0, 0
+    for value in work.values():
+        l, b = getSize( value )
+        leaves += l
+        nbytes += b
+    return leaves, nbytes
+
+# leaves smaller than this are never spilled to disk
+SPILL_MIN_BYTES = 1024 * 1024
+
+def getLeafSize( work ):
+    '''return an estimate of the number of bytes used by
+    the leaf *work*.
+
+    Lists and tuples are estimated from their first element.
+    Returns 0 for anything that is not a leaf.
+    '''
+    if isinstance( work, pandas.DataFrame ) or isinstance( work, pandas.Series ):
+        return int( numpy.sum( work.memory_usage( index = True ) ) )
+    if isinstance( work, numpy.ndarray ): return work.nbytes
+    if isinstance( work, (list, tuple) ):
+        if len(work) == 0: return sys.getsizeof( work )
+        return sys.getsizeof( work ) + len(work) * sys.getsizeof( work[0] )
+    return 0
+
+def getLeavesSize( work ):
+    '''return an estimate of the number of bytes used by
+    the leaves in *work*, see :func:`getLeafSize`.'''
+    if Utils.isChunked( work ) or Utils.isSpilled( work ): return 0
+    if not hasattr( work, "keys" ) or \
+            isinstance( work, pandas.DataFrame ) or isinstance( work, pandas.Series ):
+        return getLeafSize( work )
+    return sum( [ getLeavesSize( value ) for value in work.values() ] )
+
+def spillLeaves( work, available, directory = None ):
+    '''write leaves in *work* to disk that do not fit into
+    *available* bytes.
+
+    Leaves are visited in DFS order and are kept in memory as
+    long as the bytes used so far are within *available*.
+    Oversized leaves of at least :data:`SPILL_MIN_BYTES` are
+    replaced by a :class:`Utils.SpilledLeaf` stored in *directory*
+    (see :func:`Utils.getSpillDirectory`).
+
+    returns the new root, the number of bytes kept in memory and
+    the number of leaves spilled.
+    '''
+    if Utils.isChunked( work ) or Utils.isSpilled( work ): return work, 0, 0
+    if not hasattr( work, "keys" ) or \
+            isinstance( work, pandas.DataFrame ) or isinstance( work, pandas.Series ):
+        nbytes = getLeafSize( work )
+        if nbytes >= SPILL_MIN_BYTES and nbytes > available:
+            if directory is None: directory = Utils.getSpillDirectory()
+            return Utils.SpilledLeaf( work, directory, nbytes ), 0, 1
+        return work, nbytes, 0
+
+    used, spilled = 0, 0
+    for key, value in list(work.items()):
+        new, nbytes, nspilled = spillLeaves( value, available - used, directory )
+        if new is not value: work[key] = new
+        used += nbytes
+        spilled += nspilled
+    return work, used, spilled
+
+def hasSpilled( work ):
+    '''return True if there are :class:`Utils.SpilledLeaf` leaves
+    in *work*.'''
+    if Utils.isSpilled( work ): return True
+    if not hasattr( work, "keys" ): return False
+    if isinstance( work, pandas.DataFrame ) or isinstance( work, pandas.Series ): return False
+    for value in work.values():
+        if hasSpilled( value ): return True
+    return False
+
+def loadSpilled( work ):
+    '''return *work* with :class:`Utils.SpilledLeaf` leaves
+    loaded from disk.
+
+    *work* itself is not modified so that spilled leaves are only
+    held in memory while the result is in use. Branches without
+    spilled leaves are shared with *work*.
+    '''
+    if Utils.isSpilled( work ): return work.load()
+    if not hasSpilled( work ): return work
+    result = work.__class__()
+    for key, value in work.items():
+        result[key] = loadSpilled( value )
+    return result
+
 def removeEmptyLeaves( work ):
     '''traverse data tree in DFS order and remove empty 
     leaves.
@@ -627,7 +750,7 @@ def tree2table( data, transpose = False, head = None ):
     header_offset = effective_cols
     matrix = []
 
-    debug( "Datatree.buildTable: creating table with %i columns" % (len(col_headers)))
+    debug( "Datatree.buildTable: creating table with %i columns", len(col_headers) )
 
     ## the following can be made more efficient
     ## by better use of indices
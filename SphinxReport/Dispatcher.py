@@ -1,4 +1,4 @@
-import os, sys, re, shelve, traceback, pickle, types, itertools
+import os, sys, re, shelve, traceback, pickle, types, itertools, logging
 
 from SphinxReport.ResultBlock import ResultBlock, ResultBlocks
 from SphinxReport import DataTree
@@ -6,6 +6,7 @@ from SphinxReport.Component import *
 from SphinxReport import Utils
 from SphinxReport import Cache
 from SphinxReport import Tracker
+from SphinxReport import Profiler
 
 # move User renderer to SphinxReport main distribution
 from SphinxReportPlugins import Renderer
@@ -19,9 +20,6 @@ import pandas
 
 from collections import OrderedDict as odict
 
-# heap memory debugging, search for 'heap' in this code
-# from guppy import hpy; HP=hpy()
-
 class Dispatcher(Component):
     """Dispatch the directives in the ``:report:`` directive
     to a :class:`Tracker`, class:`Transformer` and :class:`Renderer`.
@@ -48,8 +46,8 @@ class Dispatcher(Component):
         '''
         Component.__init__(self)
 
-        self.debug("starting dispatcher '%s': tracker='%s', renderer='%s', transformer:='%s'" % \
-                  (str(self), str(tracker), str(renderer), str(transformers) ) )
+        self.debug("starting dispatcher '%s': tracker='%s', renderer='%s', transformer:='%s'",
+                   self, tracker, renderer, transformers )
 
         self.tracker = tracker
         # add reference to self for access to tracks
@@ -132,7 +130,9 @@ class Dispatcher(Component):
         
         if result is None:
             try:
-                result = self.tracker( *path, **kwargs )
+                with Profiler.profile( "tracker", self.tracker, path = DataTree.path2str(path) ) as p:
+                    result = self.tracker( *path, **kwargs )
+                    self.profileData( p, result )
             except Exception as msg:
                 self.warn( "exception for tracker '%s', path '%s': msg=%s" % (str(self.tracker),
                                                                               DataTree.path2str(path), 
@@ -148,6 +148,23 @@ class Dispatcher(Component):
 
         return result
 
+    def profileData( self, profile, data ):
+        '''add the number of leaves and the size of arrays
+        and dataframes in *data* to *profile*.'''
+        if not Profiler.isEnabled(): return
+        leaves, nbytes = DataTree.getSize( data )
+        profile.add( leaves = leaves, bytes = nbytes )
+
+    def debugPaths( self, stage ):
+        '''log the data paths after *stage*.
+
+        The data paths are only computed if debugging output
+        is enabled.
+        '''
+        if not logging.getLogger().isEnabledFor( logging.DEBUG ): return
+        data_paths = DataTree.getPaths( self.data )
+        self.debug( "%s: after %s: %i data_paths: %s", self, stage, len(data_paths), data_paths )
+
     def getDataPaths( self, obj ):
         '''determine data paths from a tracker.
 
@@ -245,18 +262,21 @@ class Dispatcher(Component):
 
         self.data = odict()
 
-        self.debug( "%s: collecting data paths." % (self.tracker))        
+        self.debug( "%s: collecting data paths.", self.tracker )        
         is_function, datapaths = self.getDataPaths(self.tracker)
-        self.debug( "%s: collected data paths." % (self.tracker))        
+        self.debug( "%s: collected data paths.", self.tracker )        
+
+        budget = self.getMemoryBudget()
 
         # if function, no datapaths
         if is_function:
             d = self.getData( () )
+            if budget is not None: d = self.spill( d, budget )
 
             # save in data tree as leaf
             DataTree.setLeaf( self.data, ("all",), d )
 
-            self.debug( "%s: collecting data finished for function." % (self.tracker))
+            self.debug( "%s: collecting data finished for function.", self.tracker )
             return
 
         # if no tracks, error
@@ -264,40 +284,95 @@ class Dispatcher(Component):
             self.warn( "%s: no tracks found - no output" % self.tracker )
             return
 
-        self.debug( "%s: filtering data paths." % (self.tracker))        
+        self.debug( "%s: filtering data paths.", self.tracker )        
         # filter data paths
         datapaths = self.filterDataPaths( datapaths )
-        self.debug( "%s: filtered data paths." % (self.tracker))        
+        self.debug( "%s: filtered data paths.", self.tracker )        
 
         # if no tracks, error
         if len(datapaths) == 0 or len(datapaths[0]) == 0:
             self.warn( "%s: no tracks remain after filtering - no output" % self.tracker )
             return
 
-        self.debug( "%s: building all_paths" % (self.tracker ) )
+        self.debug( "%s: building all_paths", self.tracker )
         if len(datapaths) > MAX_PATH_NESTING:
             self.warn( "%s: number of nesting in data paths too large: %i" % (self.tracker, len(all_paths)))
             raise ValueError( "%s: number of nesting in data paths too large: %i" % (self.tracker, len(all_paths)))
 
         all_paths = list(itertools.product( *datapaths ))
-        self.debug( "%s: collecting data started for %i data paths" % (self.tracker, 
-                                                                       len( all_paths) ) )
+        self.debug( "%s: collecting data started for %i data paths", self.tracker, len( all_paths) )
+
+        # let trackers load data for paths not in the cache in bulk
+        prefetch, window = [], len(all_paths)
+        if hasattr( self.tracker, "prefetch" ):
+            if self.nocache or self.tracker_options:
+                cached = set()
+            else:
+                cached = set( self.cache.keys() )
+            prefetch = [ path not in cached for path in map( DataTree.path2str, all_paths ) ]
+            if hasattr( self.tracker, "getPrefetchWindow" ):
+                window = self.tracker.getPrefetchWindow()
 
         self.data = odict()
-        for path in all_paths:
+        for x, path in enumerate( all_paths ):
+
+            # prefetch the next window of paths
+            if prefetch and x % window == 0:
+                todo = [ p for p, y in zip( all_paths[x:x+window], prefetch[x:x+window] ) if y ]
+                if todo: self.tracker.prefetch( todo )
 
             d = self.getData( path )
 
             # ignore empty data sets
             if d is None: continue
 
+            # keep within memory budget
+            if budget is not None: d = self.spill( d, budget )
+
             # save in data tree as leaf
             DataTree.setLeaf( self.data, path, d )
 
-        self.debug( "%s: collecting data finished for %i data paths" % (self.tracker, 
-                                                                       len( all_paths) ) )
+        self.debug( "%s: collecting data finished for %i data paths", self.tracker, len( all_paths) )
         return self.data
 
+    def getMemoryBudget( self ):
+        '''return the :term:`memory_budget` of this process in bytes.
+
+        Spilled leaves are loaded one at a time by the first 
+        transformer. Unless that transformer reduces the data 
+        (see :attr:`Transformer.reduces`), all leaves would be
+        held in memory again before rendering and nothing is 
+        gained by spilling.
+
+        Returns None if there is no budget or if the data is not
+        reduced.
+        '''
+        budget = Utils.PARAMS.get( "report_memory_budget", None )
+        if budget in (None, "None", ""): return None
+        if not self.transformers or not getattr( self.transformers[0], "reduces", False ):
+            self.debug( "%s: memory budget ignored - data is not reduced by a transformer", self.tracker )
+            return None
+        return int( float(budget) * 1024 * 1024 )
+
+    def spill( self, data, budget ):
+        '''write leaves of *data* to disk that do not fit into
+        *budget* bytes.
+
+        The memory in use is measured after the tracker has
+        returned *data*, so that it includes *data* and any memory
+        the tracker used to build it. Spilled leaves are loaded
+        again by the transformers.
+
+        returns the new data.
+        '''
+        # the resident set includes data
+        available = max( 0, budget - Profiler.getRSS() * 1024 + DataTree.getLeavesSize( data ) )
+        data, nbytes, nspilled = DataTree.spillLeaves( data, available )
+        if nspilled:
+            self.info( "%s: memory budget exceeded - spilled %i leaves to disk", 
+                       self.tracker, nspilled )
+        return data
+
     def restrict( self ):
         '''restrict data paths.
 
@@ -324,7 +399,7 @@ class Dispatcher(Component):
                     if any( ( rx.search( p ) for p in path ) ):
                         break
             else:
-                self.debug( "%s: ignoring path %s because of :restrict=%s" % (self.tracker, path, s))
+                self.debug( "%s: ignoring path %s because of :restrict=%s", self.tracker, path, s )
                 try: DataTree.removeLeaf( self.data, path )
                 except KeyError: pass
 
@@ -343,7 +418,7 @@ class Dispatcher(Component):
         for path in all_paths:
             for s in self.exclude_paths:
                 if s in path:
-                    self.debug( "%s: ignoring path %s because of :exclude:=%s" % (self.tracker, path, s))
+                    self.debug( "%s: ignoring path %s because of :exclude:=%s", self.tracker, path, s )
                     try: DataTree.removeLeaf( self.data, path )
                     except KeyError: pass
                 elif s.startswith("r(") and s.endswith(")"):
@@ -354,7 +429,7 @@ class Dispatcher(Component):
                     if s[0] in ('"', "'") and s[-1] in ('"', "'"): s = s[1:-1]
                     rx = re.compile( s )
                     if any( ( rx.search( p ) for p in path ) ):
-                        self.debug( "%s: ignoring path %s because of :exclude:=%s" % (self.tracker, path, s))
+                        self.debug( "%s: ignoring path %s because of :exclude:=%s", self.tracker, path, s )
                         try: DataTree.removeLeaf( self.data, path )
                         except KeyError: pass
 
@@ -362,13 +437,16 @@ class Dispatcher(Component):
         '''call data transformers and group tree
         '''
         for transformer in self.transformers:
-            self.debug( "profile: started: transformer: %s" % (transformer))
-            self.debug( "%s: applying %s" % (self.renderer, transformer ))
+            self.debug( "%s: applying %s", self.renderer, transformer )
 
-            try:
+            with Profiler.profile( "transformer", transformer ):
                 self.data = transformer( self.data )
-            finally:
-                self.debug( "profile: finished: transformer: %s" % (transformer))
+
+        # load chunked results that have not been summarized
+        self.data = DataTree.loadChunks( self.data )
+
+        # load spilled leaves that no transformer has reduced
+        self.data = DataTree.loadSpilled( self.data )
 
         return self.data
 
@@ -444,7 +522,7 @@ class Dispatcher(Component):
                                  method = 'bottom-up' )
 
         for level, label in pruned:
-            self.debug( "pruned level %i from data tree: label='%s'" % (level, label) )
+            self.debug( "pruned level %i from data tree: label='%s'", level, label )
 
         # save for conversion
         self.pruned = pruned
@@ -456,8 +534,7 @@ class Dispatcher(Component):
 
         returns a ResultBlocks data structure.
         '''
-        self.debug( "%s: rendering data started for %i items" % (self,
-                                                                 len(self.data)))
+        self.debug( "%s: rendering data started for %i items", self, len(self.data) )
 
         # get number of levels required by renderer
         try:
@@ -504,10 +581,8 @@ class Dispatcher(Component):
 
         nlevels = getIndexLevels( index )
 
-        self.debug( "%s: rendering data started. levels=%i, required levels>=%i, group_level=%s" %\
-                        (self, nlevels, 
-                         renderer_nlevels,
-                         str(self.group_level) ) )
+        self.debug( "%s: rendering data started. levels=%i, required levels>=%i, group_level=%s",
+                    self, nlevels, renderer_nlevels, self.group_level )
 
         if renderer_nlevels < 0 and self.group_level <= 0:
             # no grouping for renderers that will accept
@@ -584,14 +659,12 @@ class Dispatcher(Component):
             self.warn("renderer returned no data.")
             raise ValueError( "renderer returned no data." )
 
-        self.debug( "%s: rendering data finished with %i blocks" % (self.tracker, len(results)))
+        self.debug( "%s: rendering data finished with %i blocks", self.tracker, len(results) )
 
         return results
 
     def __call__(self, *args, **kwargs ):
 
-        #self.debug( "%s: heap at start\n%s" % (self, str(HP.heap()) ))
-        
         try: self.parseArguments( *args, **kwargs )
         except: 
             self.error( "%s: exception in parsing" % self )
@@ -611,33 +684,31 @@ class Dispatcher(Component):
             # for function trackers
             pass
 
-        self.debug( "profile: started: tracker: %s" % (self.tracker))
-        
         # collecting data 
-        try: self.collect()
+        try:
+            with Profiler.profile( "collect", self.tracker ) as p:
+                self.collect()
+                self.profileData( p, self.data )
         except: 
             self.error( "%s: exception in collection" % self )
             return ResultBlocks(ResultBlocks( Utils.buildException( "collection" ) ))
-        finally:
-            self.debug( "profile: finished: tracker: %s" % (self.tracker))
 
         if len(self.data) == 0: 
-            self.info( "%s: no data - processing complete" % self.tracker )
+            self.info( "%s: no data - processing complete", self.tracker )
             return None
 
-        data_paths = DataTree.getPaths( self.data )
-        self.debug( "%s: after collection: %i data_paths: %s" % (self,len(data_paths), str(data_paths)))
-
-        # self.debug( "%s: heap after collection\n%s" % (self, str(HP.heap()) ))        
+        self.debugPaths( "collection" )
 
         # transform data
-        try: self.transform()
+        try:
+            with Profiler.profile( "transform", self.tracker ) as p:
+                self.transform()
+                self.profileData( p, self.data )
         except: 
             self.error( "%s: exception in transformation" % self )
             return ResultBlocks(ResultBlocks( Utils.buildException( "transformation" ) ))
 
-        data_paths = DataTree.getPaths( self.data )
-        self.debug( "%s: after transformation: %i data_paths: %s" % (self,len(data_paths), str(data_paths)))
+        self.debugPaths( "transformation" )
 
         # special Renderers - do not proceed
         # Special renderers
@@ -650,53 +721,57 @@ class Dispatcher(Component):
             results.append( self.renderer( self.data, ('') ) )
             return results
 
-        # self.debug( "%s: heap after transformation\n%s" % (self, str(HP.heap()) ))        
         # restrict
-        try: self.restrict()
+        try:
+            with Profiler.profile( "restrict", self.tracker ) as p:
+                self.restrict()
+                self.profileData( p, self.data )
         except:
             self.error( "%s: exception in restrict" % self )
             return ResultBlocks(ResultBlocks( Utils.buildException( "restrict" ) ))
 
-        data_paths = DataTree.getPaths( self.data )
-        self.debug( "%s: after restrict: %i data_paths: %s" % (self,len(data_paths), str(data_paths)))
+        self.debugPaths( "restrict" )
 
         # exclude
-        try: self.exclude()
+        try:
+            with Profiler.profile( "exclude", self.tracker ) as p:
+                self.exclude()
+                self.profileData( p, self.data )
         except:
             self.error( "%s: exception in exclude" % self )
             return ResultBlocks(ResultBlocks( Utils.buildException( "exclude" ) ))
 
-        data_paths = DataTree.getPaths( self.data )
-        self.debug( "%s: after exclude: %i data_paths: %s" % (self,len(data_paths), str(data_paths)))
+        self.debugPaths( "exclude" )
 
         # remove superfluous levels
-        try: self.prune()
+        try:
+            with Profiler.profile( "prune", self.tracker ) as p:
+                self.prune()
+                self.profileData( p, self.data )
         except: 
            self.error( "%s: exception in pruning" % self )
            return ResultBlocks(ResultBlocks( Utils.buildException( "pruning" ) ))
 
-        data_paths = DataTree.getPaths( self.data )
-        self.debug( "%s: after pruning: %i data_paths: %s" % (self,len(data_paths), str(data_paths)))
+        self.debugPaths( "pruning" )
 
         # remove group plots
-        try: self.group()
+        try:
+            with Profiler.profile( "group", self.tracker ) as p:
+                self.group()
+                self.profileData( p, self.data )
         except: 
             self.error( "%s: exception in grouping" % self )
             return ResultBlocks(ResultBlocks( Utils.buildException( "grouping" ) ))
 
-        data_paths = DataTree.getPaths( self.data )
-        self.debug( "%s: after grouping: %i data_paths: %s" % (self,len(data_paths), str(data_paths)))
+        self.debugPaths( "grouping" )
 
-        self.debug( "profile: started: renderer: %s" % (self.renderer))
-        
-        try: result = self.render()
+        try:
+            with Profiler.profile( "render", self.renderer ) as p:
+                result = self.render()
+                p.add( blocks = len(result) )
         except: 
             self.error( "%s: exception in rendering" % self )
             return ResultBlocks(ResultBlocks( Utils.buildException( "rendering" ) ))
-        finally:
-            self.debug( "profile: finished: renderer: %s" % (self.renderer))
-
-        #self.debug( "%s: heap at end\n%s" % (self, str(HP.heap()) ))
 
         return result
         
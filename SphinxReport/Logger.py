@@ -1,138 +1,141 @@
-import multiprocessing, logging, sys, re, os, io, threading, time, collections
-
-# Python 2/3 Compatibility
-try: import queue
-except ImportError: import Queue as queue
-
-from logging import Logger
-
-class MultiProcessingLogHandler(logging.Handler):
-    """taken from http://stackoverflow.com/questions/641420/how-should-i-log-while-using-multiprocessing-in-python
+'''logging from several processes.
+
+Worker processes do not write to the log file directly. Instead,
+a :class:`QueueHandler` in each worker sends log records through
+a queue to the main process, where a :class:`LogListener` passes
+them on to the actual handlers::
+
+   listener = Logger.LogListener( logging.FileHandler( "sphinxreport.log" ), logging.INFO )
+   listener.start()
+   pool = multiprocessing.Pool( 4, Logger.initWorker, (listener.queue, listener.level) )
+   ...
+   listener.stop()
+
+Records below the log level are discarded in the workers before
+their messages are formatted and sent. Messages are formatted
+in the workers, so that records can be pickled.
+'''
+
+import multiprocessing, logging, threading, collections
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    # python 2, following the implementation in python 3
+    class QueueHandler(logging.Handler):
+        '''send log records to a queue.'''
+
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def prepare(self, record):
+            # merge message and arguments and remove
+            # objects that can not be pickled
+            self.format(record)
+            record.msg = record.message
+            record.args = None
+            record.exc_info = None
+            return record
+
+        def emit(self, record):
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                self.handleError(record)
 
-    added counting of log messages.
-    """
-    def __init__(self, handler, queue, child=False):
-        logging.Handler.__init__(self)
+    class QueueListener(object):
+        '''pass log records from a queue to handlers in a thread.'''
 
-        self._handler = handler
-        self.queue = queue
+        _sentinel = None
 
-        self.counts = collections.defaultdict( int )
+        def __init__(self, queue, *handlers):
+            self.queue = queue
+            self.handlers = handlers
+            self._thread = None
 
-        # we only want one of the loggers to be pulling from the queue.
-        # If there is a way to do this without needing to be passed this
-        # information, that would be great!
-        if child == False:
-            self.shutdown = False
-            self.polltime = 1
-            t = threading.Thread(target=self.receive)
+        def start(self):
+            self._thread = t = threading.Thread(target=self._monitor)
             t.daemon = True
             t.start()
 
-    def setFormatter(self, fmt):
-        logging.Handler.setFormatter(self, fmt)
-        self._handler.setFormatter(fmt)
-
-    def receive(self):
-        while (self.shutdown == False) or (self.queue.empty() == False):
-            # so we block for a short period of time so that we can
-            # check for the shutdown cases.
-            try:
-                record = self.queue.get(True, self.polltime)
-                self._handler.emit(record)
-                self.counts[record.levelname] += 1
-            except queue.Empty as e:
-                pass
-            except EOFError as e:
-                break
-
-    def send(self, s):
-        # send just puts it in the queue for the server to retrieve
-        self.queue.put(s)
-
-    def _format_record(self, record):
-        ei = record.exc_info
-        if ei:
-            dummy = self.format(record) # just to get traceback text into record.exc_text
-            record.exc_info = None  # to avoid Unpickleable error
-
-        return record
+        def handle(self, record):
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+        def _monitor(self):
+            while True:
+                try:
+                    record = self.queue.get(True)
+                except (EOFError, IOError):
+                    break
+                if record is self._sentinel: break
+                self.handle(record)
+
+        def stop(self):
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+class LogCounter(logging.Handler):
+    '''count log messages by level.'''
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.counts = collections.defaultdict( int )
 
     def emit(self, record):
-        try:
-            s = self._format_record(record)
-            self.send(s)
-        except (KeyboardInterrupt, SystemExit):
-            raise
-        except:
-            self.handleError(record)
-
-    def close(self):
-        time.sleep(self.polltime+1) # give some time for messages to enter the queue.
-        self.shutdown = True
-        time.sleep(self.polltime+1) # give some time for the server to time out and see the shutdown
-
-    def __del__(self):
-        self.close() # hopefully this aids in orderly shutdown when things are going poorly.
+        self.counts[record.levelname] += 1
 
     def getCounts( self ):
         return self.counts
 
-def f(x):
-    # just a logging command...
-    logging.critical('function number: ' + str(x))
-    # to make some calls take longer than others, so the output is "jumbled" as real MP programs are.
-    time.sleep(x % 3)
-
-def initPool(queue, level):
-    """
-    This causes the logging module to be initialized with the necessary info
-    in pool threads to work correctly.
-    """
-    logging.getLogger('').addHandler(MultiProcessingLogHandler(logging.StreamHandler(), queue, child=True))
-    logging.getLogger('').setLevel(level)
-
-if __name__ == '__main__':
-
-    use_stream = False
-
-    if use_stream:
-        stream = io.StringIO()
-        logQueue = multiprocessing.Queue(100)
-        handler= MultiProcessingLogHandler(logging.StreamHandler(stream), logQueue)
-        logging.getLogger('').addHandler(handler)
-        logging.getLogger('').setLevel(logging.DEBUG)
-
-        logging.debug('starting main')
-
-        # when bulding the pool on a Windows machine we also have to init the logger in all the instances with the queue and the level of logging.
-        pool = multiprocessing.Pool(processes=10, initializer=initPool, initargs=[logQueue, logging.getLogger('').getEffectiveLevel()] ) # start worker processes
-        pool.map(f, list(range(0,50)))
-        pool.close()
-
-        logging.debug('done')
-        logging.shutdown()
-        print("stream output is:")
-        print(stream.getvalue())
-    else:
-        logQueue = multiprocessing.Queue(100)
-        handler= MultiProcessingLogHandler(logging.FileHandler( "test.log", "w"), logQueue)
-        #logging.setLoggerClass(CountedLogger)
-        #logging.root = CountedLogger( "" )
-        #print dir(logging.getLogger(''))
-        #print logging.getLogger("").getCounts()
-        logging.getLogger('').addHandler(handler)
-        logging.getLogger('').setLevel(logging.DEBUG)
-
-        logging.debug('starting main')
-
-        # when bulding the pool on a Windows machine we also have to init the logger in all the instances with the queue and the level of logging.
-        pool = multiprocessing.Pool(processes=10, initializer=initPool, initargs=[logQueue, logging.getLogger('').getEffectiveLevel()] ) # start worker processes
-        pool.map(f, list(range(0,10)))
-        pool.close()
-
-        logging.debug('done')
-        logging.shutdown()
-
-        print(handler.getCounts())
+class LogListener(object):
+    '''receive log records from worker processes and
+    pass them to *handler*.
+
+    Messages are counted by level, see :meth:`getCounts`.
+    '''
+
+    def __init__(self, handler, level = logging.DEBUG ):
+        self.handler = handler
+        self.level = level
+        self.counter = LogCounter()
+        # unbounded, so that workers never block on logging
+        self.queue = multiprocessing.Queue()
+        self.listener = QueueListener( self.queue, self.handler, self.counter )
+
+    def setFormatter(self, fmt):
+        self.handler.setFormatter(fmt)
 
+    def start(self):
+        self.listener.start()
+
+    def stop(self):
+        '''stop receiving records.
+
+        Returns once all records in the queue have been
+        processed.
+        '''
+        self.listener.stop()
+
+    def getCounts( self ):
+        return self.counter.getCounts()
+
+def initWorker( queue, level ):
+    '''set up logging in a worker process.
+
+    Handlers inherited from the main process are replaced by a
+    handler sending records with at least *level* to *queue*.
+    Use as the initializer of a :class:`multiprocessing.Pool`.
+    '''
+    root = logging.getLogger()
+    for handler in list( root.handlers ):
+        root.removeHandler( handler )
+    handler = QueueHandler( queue )
+    handler.setLevel( level )
+    root.addHandler( handler )
+    root.setLevel( level )
@@ -0,0 +1,188 @@
+'''PagedTable - columnar storage of large tables
+=============================================
+
+Tables that are too large to be displayed within a document
+(see the :term:`large` option of the :class:`Table` renderer)
+can be saved in a compact, column-oriented format. Each table is
+stored as a directory containing one :file:`.npy` file per
+column and an :file:`index.json` file describing the columns.
+
+The columns are memory-mapped when the table is read back, so that
+:command:`sphinxreport-serve` only needs to touch those rows that are
+part of the requested page. Sorting and filtering are done on the
+columns involved only.
+'''
+
+import os, re, json
+
+import numpy
+import pandas
+
+from collections import OrderedDict as odict
+
+# name of the file describing the columns of a table
+INDEX_FILE = "index.json"
+
+def writeTable( dataframe, path ):
+    '''write *dataframe* to directory *path* in columnar format.
+
+    Index levels are stored as the first columns. Numeric and
+    datetime columns are saved with their native dtype, all other
+    columns are converted to unicode strings.
+
+    returns the number of rows written.
+    '''
+
+    if not os.path.exists( path ):
+        os.makedirs( path )
+
+    nindex = dataframe.index.nlevels
+    dataframe = dataframe.reset_index()
+
+    columns = []
+    for x, column in enumerate( dataframe.columns ):
+        values = dataframe.iloc[:,x]
+        if values.dtype.kind in "biufcmM":
+            values = values.values
+        else:
+            values = numpy.array( values.fillna( "" ).astype( str ).values,
+                                  dtype = "U" )
+
+        filename = "column%06i.npy" % x
+        numpy.save( os.path.join( path, filename ), values )
+        columns.append( { 'name' : str(column),
+                          'file' : filename,
+                          'kind' : values.dtype.kind } )
+
+    outf = open( os.path.join( path, INDEX_FILE ), "w" )
+    json.dump( { 'nrows' : len(dataframe),
+                 'nindex' : nindex,
+                 'columns' : columns }, outf )
+    outf.close()
+
+    return len(dataframe)
+
+def isTable( path ):
+    '''return True if *path* contains a table written by :func:`writeTable`.'''
+    return os.path.exists( os.path.join( path, INDEX_FILE ) )
+
+class PagedTable(object):
+    '''a table in columnar format that can be accessed page by page.
+
+    Columns are loaded as memory-maps on first access. Row orders
+    resulting from sorting and filtering are cached, so that paging
+    through a sorted table requires only a single sort.
+    '''
+
+    # maximum number of row orders to keep
+    max_orders = 10
+
+    def __init__( self, path ):
+
+        self.path = path
+        infile = open( os.path.join( path, INDEX_FILE ) )
+        index = json.load( infile )
+        infile.close()
+
+        self.nrows = index["nrows"]
+        self.nindex = index["nindex"]
+        self.columns = index["columns"]
+        self.headers = [ x["name"] for x in self.columns ]
+
+        self._data = {}
+        self._orders = {}
+
+    def getColumn( self, column ):
+        '''return values in *column* as a memory-mapped array.'''
+        if column not in self._data:
+            try:
+                x = self.headers.index( column )
+            except ValueError:
+                raise KeyError( "unknown column `%s`" % column )
+            self._data[column] = numpy.load(
+                os.path.join( self.path, self.columns[x]["file"] ),
+                mmap_mode = "r" )
+        return self._data[column]
+
+    def filterColumn( self, column, expression ):
+        '''return boolean mask of rows in *column* matching *expression*.
+
+        For numeric columns, expressions starting with ``<``, ``<=``,
+        ``>``, ``>=``, ``=`` or ``!=`` are evaluated as numerical comparisons.
+        Otherwise, the expression is interpreted as a regular expression
+        and matched against the text of each cell.
+        '''
+        values = self.getColumn( column )
+
+        if values.dtype.kind in "biuf":
+            m = re.match( "\s*(<=|>=|!=|<|>|=)\s*(\S+)\s*$", expression )
+            if m:
+                op, value = m.groups()
+                value = float( value )
+                if op == "<": return values < value
+                elif op == "<=": return values <= value
+                elif op == ">": return values > value
+                elif op == ">=": return values >= value
+                elif op == "=": return values == value
+                elif op == "!=": return values != value
+
+        values = pandas.Series( numpy.asarray( values ) ).astype( str )
+        return values.str.contains( expression, na = False ).values
+
+    def getOrder( self, sort = None, ascending = True, filters = () ):
+        '''return the row indices after filtering and sorting.
+
+        *filters* is a list of tuples of column and expression (see
+        :meth:`filterColumn`).
+        '''
+        key = ( sort, ascending, tuple(filters) )
+        if key in self._orders:
+            return self._orders[key]
+
+        if filters:
+            mask = numpy.ones( self.nrows, dtype = numpy.bool_ )
+            for column, expression in filters:
+                mask &= self.filterColumn( column, expression )
+            order = numpy.flatnonzero( mask )
+        else:
+            order = numpy.arange( self.nrows )
+
+        if sort:
+            values = self.getColumn( sort )[order]
+            # stable sort, so that ties keep their original order
+            if ascending:
+                o = numpy.argsort( values, kind = "mergesort" )
+            else:
+                # sort the reversed values and reverse the result
+                # in order to keep ties in their original order
+                n = len(values)
+                o = n - 1 - numpy.argsort( values[::-1], kind = "mergesort" )[::-1]
+            order = order[o]
+
+        if len(self._orders) >= self.max_orders:
+            self._orders.clear()
+        self._orders[key] = order
+
+        return order
+
+    def getPage( self, page = 0, page_size = 100,
+                 sort = None, ascending = True, filters = () ):
+        '''return a page of the table.
+
+        returns a tuple of headers, the rows on the page and the
+        total number of rows after filtering.
+        '''
+        order = self.getOrder( sort, ascending, filters )
+        start = max( 0, page ) * page_size
+        selection = order[start:start + page_size]
+
+        columns = [ self.getColumn( x )[selection].tolist() for x in self.headers ]
+        rows = [ list(x) for x in zip( *columns ) ]
+
+        return self.headers, rows, len(order)
+
+    def asDataFrame( self ):
+        '''return the full table as a :class:`pandas.DataFrame`.'''
+        dataframe = pandas.DataFrame( odict( [ (x, numpy.asarray( self.getColumn(x) ) )
+                                               for x in self.headers ] ) )
+        return dataframe.set_index( self.headers[:self.nindex] )
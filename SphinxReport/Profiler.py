@@ -0,0 +1,290 @@
+'''structured profiling events.
+
+Profiling events are written as one JSON object per line to
+the file :data:`PROFILEFILE`, independent of the logging level.
+Each event records
+
+time
+   seconds on a monotonic clock. On most systems the clock
+   is shared by all processes on a machine.
+event
+   ``start`` or ``finish``
+stage
+   the stage that is profiled, for example ``collect``,
+   ``transform``, ``render`` or ``collect-images``.
+name
+   the name of the object that is profiled, for example the
+   tracker or renderer.
+directive
+   the directive (``file:line``) that is being processed.
+pid, worker
+   process id and name of the process that emitted the event.
+
+Finish events additionally record the ``start`` time. Additional
+keyword arguments such as payload sizes are added to the event.
+Events recorded with :class:`profile` also contain the CPU time
+(``cpu``, in seconds) and the increase of the peak resident set
+size of the process (``rss``, in kilobytes).
+
+Events are buffered within a process and written in blocks to
+keep the overhead small. The buffer is written at the end of each
+directive, when it is full and when the process exits.
+
+This module is read by :mod:`SphinxReport.profile`.
+
+In addition, :class:`sampleSlow` samples the stack of code blocks
+such as directives that take longer than a given time and writes
+a profile of the functions that the time is spent in.
+'''
+
+import os, sys, json, time, atexit, multiprocessing, threading, collections
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+PROFILEFILE = "sphinxreport.profile"
+
+# maximum number of events to buffer before writing
+BUFFER_SIZE = 1000
+
+# interval in seconds between stack samples of slow blocks
+SAMPLE_INTERVAL = 0.01
+
+# number of functions and lines listed in profiles of slow blocks
+SAMPLE_TOP = 30
+
+try:
+    clock = time.monotonic
+    cpuclock = time.process_time
+except AttributeError:
+    # python 2
+    clock = time.time
+    cpuclock = time.clock
+
+def getPeakRSS():
+    '''return the peak resident set size of the process in kilobytes.'''
+    if resource is None: return 0
+    rss = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+    # bytes on OS X
+    if sys.platform == "darwin": rss //= 1024
+    return rss
+
+def getRSS():
+    '''return the current resident set size of the process in kilobytes.
+
+    Falls back to the peak resident set size if the current
+    size is not available.
+    '''
+    try:
+        with open( "/proc/self/statm" ) as inf:
+            pages = int( inf.read().split()[1] )
+        return pages * os.sysconf( "SC_PAGE_SIZE" ) // 1024
+    except (IOError, OSError, ValueError, AttributeError):
+        return getPeakRSS()
+
+# events not yet written
+EVENTS = []
+
+# the directive currently being processed
+DIRECTIVE = None
+
+def isEnabled():
+    '''return True if profiling events are recorded.'''
+    from SphinxReport import Utils
+    return str( Utils.PARAMS.get( "report_profile", True ) ).lower() in ( "1", "true", "yes", "on" )
+
+def setDirective( directive ):
+    '''set the directive that subsequent events refer to.'''
+    global DIRECTIVE
+    DIRECTIVE = directive
+
+def getName( obj ):
+    '''return a name for *obj* without memory addresses.'''
+    if obj is None: return None
+    if isinstance( obj, str ): return obj
+    try:
+        # functions
+        name = obj.__name__
+    except AttributeError:
+        name = obj.__class__.__name__
+    module = getattr( obj, "__module__", None )
+    if module: return "%s.%s" % (module, name)
+    return name
+
+def event( kind, stage, name = None, **kwargs ):
+    '''record a profiling event of *kind* ``start`` or ``finish``.
+
+    Nothing is recorded if profiling is disabled.
+
+    returns the time of the event.
+    '''
+    t = clock()
+    if not isEnabled(): return t
+    kwargs.update( { "time" : t,
+                     "event" : kind,
+                     "stage" : stage,
+                     "name" : getName( name ),
+                     "directive" : DIRECTIVE,
+                     "pid" : os.getpid(),
+                     "worker" : multiprocessing.current_process().name } )
+    EVENTS.append( kwargs )
+    if len(EVENTS) >= BUFFER_SIZE: flush()
+    return t
+
+def flush():
+    '''write buffered events to :data:`PROFILEFILE`.
+
+    The events are appended in a single write so that
+    several processes can share the file.
+    '''
+    if not isEnabled(): 
+        del EVENTS[:]
+        return
+    if not EVENTS: return
+    lines = "".join( [ json.dumps( x ) + "\n" for x in EVENTS ] )
+    del EVENTS[:]
+    handle = os.open( PROFILEFILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644 )
+    try:
+        os.write( handle, lines.encode( "utf-8" ) )
+    finally:
+        os.close( handle )
+
+def reset():
+    '''discard recorded events and truncate :data:`PROFILEFILE`.'''
+    del EVENTS[:]
+    if os.path.exists( PROFILEFILE ):
+        open( PROFILEFILE, "w" ).close()
+
+atexit.register( flush )
+
+class profile(object):
+    '''context manager recording the start and finish
+    of *stage*.
+
+    Values given to :meth:`add` are added to the finish event::
+
+       with Profiler.profile( "collect", tracker ) as p:
+           data = collect()
+           p.add( paths = len(data) )
+    '''
+
+    def __init__(self, stage, name = None, **kwargs ):
+        self.stage = stage
+        self.name = name
+        self.payload = kwargs
+
+    def add( self, **kwargs ):
+        '''add *kwargs* to the finish event.'''
+        self.payload.update( kwargs )
+
+    def __enter__(self):
+        self.start = event( "start", self.stage, self.name )
+        self.cpu = cpuclock()
+        self.rss = getPeakRSS()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback ):
+        if exc_type is not None: self.payload["error"] = exc_type.__name__
+        event( "finish", self.stage, self.name, start = self.start, 
+               cpu = cpuclock() - self.cpu,
+               rss = getPeakRSS() - self.rss,
+               **self.payload )
+        return False
+
+def getFrameLabel( frame ):
+    '''return module and function name of *frame*.'''
+    return "%s.%s" % (frame.f_globals.get( "__name__", "?" ), frame.f_code.co_name )
+
+class sampleSlow(object):
+    '''context manager sampling the stack of a block that runs
+    longer than *threshold* seconds.
+
+    A thread waits for *threshold* seconds. If the block has not
+    finished by then, the stack of the thread executing the block
+    is sampled every *interval* seconds until the block finishes.
+    Blocks finishing within *threshold* are not sampled at all.
+
+    If *threshold* is None, nothing is sampled.
+
+    The profile is written to *filename*, listing the functions and
+    lines that samples were taken in. Stacks are written in folded
+    format for flame graphs to *filename* with the suffix ``.folded``::
+
+       with Profiler.sampleSlow( 60, "report.slow", "report.rst:10" ):
+           run()
+    '''
+
+    def __init__(self, threshold, filename, description = None, interval = None ):
+        self.threshold = threshold
+        self.filename = filename
+        self.description = description
+        self.interval = interval or SAMPLE_INTERVAL
+        self.stacks = collections.defaultdict( int )
+        self.lines = collections.defaultdict( int )
+
+    def addSample( self, frame ):
+        self.lines["%s:%i" % (getFrameLabel( frame ), frame.f_lineno)] += 1
+        stack = []
+        while frame is not None:
+            stack.append( getFrameLabel( frame ) )
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+
+    def sample( self ):
+        if self.finished.wait( self.threshold ): return
+        while not self.finished.wait( self.interval ):
+            frame = sys._current_frames().get( self.thread_id )
+            if frame is None: break
+            self.addSample( frame )
+
+    def __enter__(self):
+        self.sampler = None
+        if not self.threshold: return self
+        self.start = clock()
+        self.thread_id = threading.current_thread().ident
+        self.finished = threading.Event()
+        self.sampler = threading.Thread( target = self.sample )
+        self.sampler.daemon = True
+        self.sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback ):
+        if self.sampler is None: return False
+        self.finished.set()
+        self.sampler.join()
+        if self.stacks: self.write( clock() - self.start )
+        return False
+
+    def write( self, duration ):
+        '''write the profile.'''
+        nsamples = sum( self.stacks.values() )
+        functions = collections.defaultdict( int )
+        for stack, count in self.stacks.items():
+            for label in set( stack ): functions[label] += count
+        leaves = collections.defaultdict( int )
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+
+        directory = os.path.dirname( self.filename )
+        if directory and not os.path.exists( directory ):
+            os.makedirs( directory )
+
+        with open( self.filename, "w" ) as outf:
+            outf.write( "# profile of %s\n" % (self.description or "slow block") )
+            outf.write( "# duration: %.1f seconds, threshold: %s seconds\n" % (duration, self.threshold) )
+            outf.write( "# samples: %i every %s seconds after the threshold\n" % (nsamples, self.interval) )
+            outf.write( "# stacks: %s.folded\n" % self.filename )
+            outf.write( "\n# functions\nsamples\tpercent\tself\tfunction\n" )
+            for label, count in sorted( functions.items(), key = lambda x: (-x[1], x[0]) )[:SAMPLE_TOP]:
+                outf.write( "%i\t%5.1f\t%i\t%s\n" % (count, 100.0 * count / nsamples, leaves.get( label, 0 ), label ) )
+            outf.write( "\n# lines\nsamples\tpercent\tline\n" )
+            for label, count in sorted( self.lines.items(), key = lambda x: (-x[1], x[0]) )[:SAMPLE_TOP]:
+                outf.write( "%i\t%5.1f\t%s\n" % (count, 100.0 * count / nsamples, label ) )
+
+        with open( self.filename + ".folded", "w" ) as outf:
+            for stack, count in sorted( self.stacks.items() ):
+                outf.write( "%s %i\n" % (";".join( stack ), count ) )
@@ -0,0 +1,209 @@
+'''progress of building a report.
+
+Worker processes send an event through a queue whenever they
+start or finish a directive (see :func:`sendEvent`). In the main
+process, a :class:`ProgressListener` collects the events and
+periodically
+
+* prints the number of directives done, the throughput, the
+  estimated time to completion and the trackers currently
+  running, and
+* writes the same information as JSON to the status file
+  :data:`STATUSFILE`, which can be polled by other programs.
+
+The status file is replaced atomically and contains::
+
+   { "status" : "running",      # or "finished", "failed"
+     "total" : 500, "done" : 120, "failed" : 0,
+     "elapsed" : 10.1, "rate" : 11.9, "eta" : 30.3,
+     "running" : [ { "worker" : ..., "tracker" : ...,
+                     "directive" : ..., "elapsed" : ... } ],
+     "workers" : { name : { "pid" : ..., "done" : ..., "rss" : ... } } }
+
+Memory (``rss``) is the resident set size of a worker in kilobytes.
+'''
+
+import os, sys, json, time, threading, tempfile, multiprocessing
+
+from collections import OrderedDict as odict
+
+# Python 2/3 Compatibility
+try: import queue
+except ImportError: import Queue as queue
+
+from SphinxReport import Profiler
+
+STATUSFILE = "sphinxreport.status"
+
+# queue to send events to, set in the processes building directives
+QUEUE = None
+
+def sendEvent( kind, **kwargs ):
+    '''send a progress event of *kind* ``start``, ``finish``
+    or ``failed``.
+
+    Events are ignored unless :data:`QUEUE` is set.
+    '''
+    if QUEUE is None: return
+    kwargs.update( { "event" : kind,
+                     "pid" : os.getpid(),
+                     "worker" : multiprocessing.current_process().name,
+                     "rss" : Profiler.getRSS() } )
+    QUEUE.put( kwargs )
+
+def formatTime( seconds ):
+    '''return *seconds* as a short human readable string.'''
+    if seconds is None: return "?"
+    seconds = int( seconds )
+    if seconds < 60: return "%is" % seconds
+    if seconds < 3600: return "%im%02is" % (seconds // 60, seconds % 60)
+    return "%ih%02im" % (seconds // 3600, (seconds % 3600) // 60)
+
+class Progress(object):
+    '''progress of building *total* directives.'''
+
+    def __init__(self, total ):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.time()
+        # directive currently run by each worker
+        self.running = odict()
+        self.workers = odict()
+
+    def update( self, event ):
+        '''update with *event*.'''
+        now = time.time()
+        worker = event["worker"]
+        stats = self.workers.setdefault( worker, { "pid" : event["pid"], "done" : 0, "rss" : 0 } )
+        stats["rss"] = event["rss"]
+
+        if event["event"] == "start":
+            self.running[worker] = { "tracker" : event["tracker"],
+                                     "directive" : event["directive"],
+                                     "start" : now }
+        else:
+            # a failure skips the remaining directives of a work item
+            n = 1 + event.get( "skipped", 0 )
+            self.done += n
+            stats["done"] += n
+            if event["event"] == "failed": self.failed += 1
+            self.running.pop( worker, None )
+
+    def getStatus( self, status = "running" ):
+        '''return a dictionary describing the current progress.'''
+        now = time.time()
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0
+        eta = ( self.total - self.done ) / rate if rate > 0 else None
+        running = [ odict( ( ("worker", worker),
+                             ("tracker", x["tracker"]),
+                             ("directive", x["directive"]),
+                             ("elapsed", now - x["start"]) ) ) \
+                        for worker, x in self.running.items() ]
+        return odict( ( ("status", status),
+                        ("time", now),
+                        ("total", self.total),
+                        ("done", self.done),
+                        ("failed", self.failed),
+                        ("elapsed", elapsed),
+                        ("rate", rate),
+                        ("eta", eta),
+                        ("running", running),
+                        ("workers", self.workers) ) )
+
+    def formatStatus( self, status ):
+        '''return a one-line summary of *status*.'''
+        line = "SphinxReport: %i/%i directives (%i%%), %.1f/s, eta %s" % \
+            ( status["done"], status["total"],
+              100 * status["done"] // max( 1, status["total"] ),
+              status["rate"],
+              formatTime( status["eta"] ) )
+        if status["failed"]: line += ", %i failed" % status["failed"]
+        if status["running"]:
+            line += ", running: " + ", ".join( [ "%s (%s, %iMB)" % \
+                                                     ( x["tracker"],
+                                                       formatTime( x["elapsed"] ),
+                                                       self.workers[x["worker"]]["rss"] // 1024 ) \
+                                                     for x in status["running"] ] )
+        return line
+
+class ProgressListener(object):
+    '''collect progress events for *total* directives
+    in a thread.
+
+    The progress is reported at most every *interval* seconds
+    to *stream* and to *statusfile*.
+    '''
+
+    _sentinel = None
+
+    def __init__(self, total, interval = 5, statusfile = STATUSFILE, stream = sys.stdout ):
+        self.progress = Progress( total )
+        self.interval = interval
+        self.statusfile = statusfile
+        self.stream = stream
+        self.queue = multiprocessing.Queue()
+        self._thread = None
+        self._last = 0
+        # overwrite the line on terminals
+        self._terminal = hasattr( stream, "isatty" ) and stream.isatty()
+
+    def writeStatus( self, status ):
+        '''write *status* to the status file.
+
+        The status file is written to a temporary file first so
+        that readers never see an incomplete file.
+        '''
+        if not self.statusfile: return
+        directory = os.path.dirname( os.path.abspath( self.statusfile ) )
+        handle, tmpfile = tempfile.mkstemp( dir = directory, prefix = ".tmp" )
+        outfile = os.fdopen( handle, "w" )
+        json.dump( status, outfile, indent = 1 )
+        outfile.close()
+        os.rename( tmpfile, self.statusfile )
+
+    def report( self, status = "running" ):
+        '''report the current progress.'''
+        self._last = time.time()
+        s = self.progress.getStatus( status )
+        self.writeStatus( s )
+        if self.stream is None: return
+        line = self.progress.formatStatus( s )
+        if self._terminal:
+            self.stream.write( "\r\033[K" + line )
+            if status != "running": self.stream.write( "\n" )
+        else:
+            self.stream.write( line + "\n" )
+        self.stream.flush()
+
+    def _monitor( self ):
+        while True:
+            try:
+                event = self.queue.get( True, self.interval )
+            except queue.Empty:
+                event = None
+            except (EOFError, IOError):
+                break
+            else:
+                if event is self._sentinel: break
+                self.progress.update( event )
+            if time.time() - self._last >= self.interval:
+                self.report()
+
+    def start( self ):
+        self.report()
+        self._thread = t = threading.Thread( target = self._monitor )
+        t.daemon = True
+        t.start()
+
+    def stop( self, status = "finished" ):
+        '''stop collecting events and report the final progress.
+
+        Returns once all events in the queue have been
+        processed.
+        '''
+        self.queue.put( self._sentinel )
+        self._thread.join()
+        self._thread = None
+        self.report( status )
@@ -1,6 +1,7 @@
 import types
 import math
 import numpy
+import pandas
 
 import scipy
 from functools import reduce
@@ -285,9 +286,186 @@ class Summary( Result ):
                             self._format % self.samplestd,                                      
                             format_vals % self.sum,
                             format_vals % self.q1,
-                            format_vals % self.q3,                            
+                            format_vals % self.q3,
                             ) )
 
+def toNumeric( values ):
+    '''convert *values* to an array of floating point numbers.
+
+    Missing values and values that can not be converted are removed.
+    '''
+    values = numpy.asarray( values )
+    if values.dtype.kind not in "biuf":
+        values = pandas.to_numeric( pandas.Series( values ), errors = "coerce" ).values
+    values = numpy.asarray( values, dtype = numpy.float64 )
+    return values[~numpy.isnan( values )]
+
+def selectRanks( chunks, ranks, mi, ma, counts, nbins = 4096, max_values = 1000000 ):
+    '''return a dictionary mapping tuples of column and rank to the
+    value at this rank in the sorted values of the column in *chunks*.
+
+    *chunks* is an object that can be iterated over several times,
+    each time returning dictionaries mapping columns to arrays of values.
+    *ranks* maps each column to a list of ranks and *mi*, *ma* and
+    *counts* map each column to the minimum, maximum and number of
+    values. 
+
+    Each pass over *chunks* narrows down the interval containing a rank
+    by a histogram with *nbins* bins. All columns and ranks are processed
+    in the same pass. Once an interval contains at most *max_values* 
+    values, these are loaded and sorted.
+    '''
+    # lower bound, upper bound, upper bound included, number of values
+    # below the interval and number of values in the interval
+    intervals = dict( [ ((column, rank), (mi[column], ma[column], True, 0, counts[column])) \
+                            for column in ranks for rank in set(ranks[column]) ] )
+    result = {}
+
+    while intervals:
+        collect, hists, edges, bounds = {}, {}, {}, {}
+        for key, (lower, upper, closed, below, size) in intervals.items():
+            if size <= max_values:
+                collect[key] = []
+            else:
+                hists[key] = numpy.zeros( nbins, dtype = numpy.int64 )
+                edges[key] = numpy.linspace( lower, upper, nbins + 1 )
+                bounds[key] = [ numpy.inf, -numpy.inf ]
+
+        for chunk in chunks:
+            # convert each column only once per chunk
+            converted = {}
+            for key, (lower, upper, closed, below, size) in intervals.items():
+                column = key[0]
+                if column not in converted:
+                    converted[column] = toNumeric( chunk[column] )
+                values = converted[column]
+                if closed: inside = values[ (values >= lower) & (values <= upper) ]
+                else: inside = values[ (values >= lower) & (values < upper) ]
+                if key in collect:
+                    collect[key].append( inside )
+                elif len(inside):
+                    bins = numpy.searchsorted( edges[key], inside, side = "right" ) - 1
+                    numpy.clip( bins, 0, nbins - 1, out = bins )
+                    hists[key] += numpy.bincount( bins, minlength = nbins )
+                    bounds[key][0] = min( bounds[key][0], inside.min() )
+                    bounds[key][1] = max( bounds[key][1], inside.max() )
+
+        for key in list(intervals.keys()):
+            rank = key[1]
+            lower, upper, closed, below, size = intervals[key]
+            if key in collect:
+                values = numpy.sort( numpy.concatenate( collect[key] ) )
+                result[key] = values[rank - below]
+            elif bounds[key][0] == bounds[key][1]:
+                # all values in the interval are the same
+                result[key] = bounds[key][0]
+            else:
+                cumulative = numpy.cumsum( hists[key] )
+                b = numpy.searchsorted( cumulative, rank - below, side = "right" )
+                if b > 0: below += cumulative[b-1]
+                intervals[key] = ( edges[key][b], edges[key][b+1],
+                                   closed and b == nbins - 1,
+                                   below, hists[key][b] )
+                continue
+            del intervals[key]
+
+    return result
+
+def summariesFromChunks( chunks, nbins = 4096, max_values = 1000000 ):
+    '''compute a :class:`Summary` for each column in *chunks* 
+    without loading all values into memory.
+
+    *chunks* is an object that can be iterated over several times,
+    each time returning dictionaries mapping columns to arrays of
+    values, for example a :class:`Utils.ChunkedResult`.
+
+    Counts, minimum, maximum, sum, mean and standard deviation are
+    computed in a single pass. The quantiles are exact and are
+    determined in further passes (see :func:`selectRanks`). Each pass
+    processes all columns.
+
+    returns a dictionary mapping each column to a :class:`Summary`.
+    Columns without numerical values map to None.
+    '''
+    columns, moments = [], {}
+
+    for chunk in chunks:
+        if not moments:
+            columns = list(chunk.keys())
+            # counts, sum, mean, sum of squares, minimum, maximum
+            moments = dict( [ (column, [0, 0.0, 0.0, 0.0, numpy.inf, -numpy.inf]) for column in columns ] )
+        for column in columns:
+            values = toNumeric( chunk[column] )
+            n = len(values)
+            if n == 0: continue
+            x = moments[column]
+            counts, mean = x[0], x[2]
+            m = values.mean()
+            # combine the sums of squares of chunks (Chan et al., 1979)
+            delta = m - mean
+            x[3] += ((values - m) ** 2).sum() + delta ** 2 * counts * n / (counts + n)
+            x[2] += delta * n / (counts + n)
+            x[0] += n
+            x[1] += values.sum()
+            x[4] = min( x[4], values.min() )
+            x[5] = max( x[5], values.max() )
+
+    ranks, quartiles, medians = {}, {}, {}
+    for column in columns:
+        counts = moments[column][0]
+        if counts == 0: continue
+        quartiles[column] = [ counts // 4, counts * 3 // 4 ]
+        if counts % 2: medians[column] = [ counts // 2 ]
+        else: medians[column] = [ counts // 2 - 1, counts // 2 ]
+        ranks[column] = quartiles[column] + medians[column]
+
+    selected = selectRanks( chunks, ranks, 
+                            dict( [ (x, moments[x][4]) for x in ranks ] ),
+                            dict( [ (x, moments[x][5]) for x in ranks ] ),
+                            dict( [ (x, moments[x][0]) for x in ranks ] ),
+                            nbins = nbins, max_values = max_values )
+
+    result = odict()
+    for column in columns:
+        if column not in ranks:
+            result[column] = None
+            continue
+        counts, total, mean, m2, mi, ma = moments[column]
+        summary = Summary()
+        summary.counts = counts
+        summary.min = mi
+        summary.max = ma
+        summary.mean = total / counts
+        summary.median = numpy.mean( [ selected[(column, x)] for x in medians[column] ] )
+        summary.samplestd = math.sqrt( m2 / counts )
+        summary.sum = total
+        summary.q1 = selected[(column, quartiles[column][0])]
+        summary.q3 = selected[(column, quartiles[column][1])]
+        result[column] = summary
+
+    return result
+
+class ValueChunks(object):
+    '''present *chunks* of arrays of values as dictionaries
+    with the single column ``value``.'''
+    def __init__(self, chunks ):
+        self.chunks = chunks
+    def __iter__(self):
+        for values in self.chunks:
+            yield { "value" : values }
+
+def summaryFromChunks( chunks, nbins = 4096, max_values = 1000000 ):
+    '''compute a :class:`Summary` from *chunks*, an object that
+    can be iterated over several times, each time returning
+    the values in arrays, for example a :class:`Utils.ChunkedColumn`.
+
+    See :func:`summariesFromChunks`.
+    '''
+    result = summariesFromChunks( ValueChunks( chunks ), nbins = nbins, max_values = max_values ).get( "value", None )
+    if result is None:
+        raise ValueError( "no data for statistics" )
+    return result
+
 class FDRResult:
     def __init__(self):
         pass
@@ -0,0 +1,206 @@
+'''thumbnails of images for galleries.
+
+Thumbnails are stored in a directory and are named by the
+md5 checksum of the image they were created from. An image
+is thus only converted again if its contents have changed.
+
+Images to be included in the gallery are recorded in an
+index file within the thumbnail directory with :func:`addImage`.
+'''
+
+import os, json, hashlib, tempfile, multiprocessing
+
+from collections import OrderedDict as odict
+
+# relative size of thumbnails
+THUMBNAIL_SCALE = 0.3
+
+# name of the index of images within the thumbnail directory
+IMAGE_INDEX = "images.jsonl"
+
+# name of the index of checksums within the thumbnail directory
+HASH_INDEX = "hashes.json"
+
+def getHash( filename ):
+    '''return md5 checksum of the contents of *filename*.'''
+    md5 = hashlib.md5()
+    infile = open( filename, "rb" )
+    try:
+        for block in iter( lambda: infile.read( 1 << 20 ), b"" ):
+            md5.update( block )
+    finally:
+        infile.close()
+    return md5.hexdigest()
+
+def makeThumbnail( args ):
+    '''create a thumbnail.
+
+    *args* is a tuple of image and thumbnail filename.
+    The thumbnail is written to a temporary file first so
+    that incomplete thumbnails are never visible.
+
+    returns the thumbnail filename or None if the image
+    could not be read.
+    '''
+    import matplotlib.image
+
+    image, thumbnail = args
+    handle, tmpfile = tempfile.mkstemp( dir = os.path.dirname( thumbnail ),
+                                        prefix = ".tmp", suffix = ".png" )
+    os.close( handle )
+    try:
+        matplotlib.image.thumbnail( image, tmpfile, scale = THUMBNAIL_SCALE )
+        os.rename( tmpfile, thumbnail )
+    except (IOError, OSError, ValueError, SyntaxError):
+        os.unlink( tmpfile )
+        return None
+    return thumbnail
+
+class ThumbnailCache(object):
+    '''thumbnails for images in *directory*.
+
+    Checksums of images are kept in an index and are only
+    computed again if the modification time or size of an
+    image changes.
+    '''
+
+    def __init__(self, directory ):
+        self.directory = directory
+        self.index_filename = os.path.join( directory, HASH_INDEX )
+        self._hashes = None
+
+    def loadHashes( self ):
+        if self._hashes is None:
+            try:
+                self._hashes = json.load( open( self.index_filename ) )
+            except (IOError, ValueError):
+                self._hashes = {}
+        return self._hashes
+
+    def saveHashes( self ):
+        handle, tmpfile = tempfile.mkstemp( dir = self.directory, prefix = ".tmp" )
+        outfile = os.fdopen( handle, "w" )
+        json.dump( self.loadHashes(), outfile )
+        outfile.close()
+        os.rename( tmpfile, self.index_filename )
+
+    def getHash( self, filename ):
+        '''return checksum of the image *filename*.'''
+        hashes = self.loadHashes()
+        filename = os.path.abspath( filename )
+        stat = os.stat( filename )
+        stamp = [ stat.st_mtime, stat.st_size ]
+        try:
+            if hashes[filename][:2] == stamp: return hashes[filename][2]
+        except KeyError:
+            pass
+        checksum = getHash( filename )
+        hashes[filename] = stamp + [checksum]
+        return checksum
+
+    def getThumbnail( self, filename ):
+        '''return the thumbnail filename for the image *filename*.
+
+        The thumbnail might not exist yet, see :meth:`update`.
+        '''
+        return os.path.join( self.directory, "%s.png" % self.getHash( filename ) )
+
+    def update( self, filenames, processes = None ):
+        '''create missing thumbnails for the images in *filenames*.
+
+        Thumbnails are created with *processes* processes in parallel.
+        By default, one process per CPU is used. Daemonic processes,
+        such as the workers of sphinxreport-build, can not start
+        processes and create thumbnails serially.
+
+        returns a dictionary mapping images to thumbnails. Images
+        that could not be converted are mapped to None.
+        '''
+        if not os.path.exists( self.directory ):
+            os.makedirs( self.directory )
+
+        result, todo = odict(), odict()
+        for filename in filenames:
+            thumbnail = self.getThumbnail( filename )
+            result[filename] = thumbnail
+            if not os.path.exists( thumbnail ): todo[thumbnail] = filename
+        self.saveHashes()
+
+        if not todo: return result
+
+        args = [ (image, thumbnail) for thumbnail, image in todo.items() ]
+        if processes is None: processes = multiprocessing.cpu_count()
+        processes = min( processes, len(args) )
+        if multiprocessing.current_process().daemon: processes = 1
+        if processes > 1:
+            pool = multiprocessing.Pool( processes )
+            try:
+                created = pool.map( makeThumbnail, args )
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            created = list( map( makeThumbnail, args ) )
+
+        failed = set( [ thumbnail for (image, thumbnail), x in zip( args, created ) if x is None ] )
+        for filename, thumbnail in list(result.items()):
+            if thumbnail in failed: result[filename] = None
+
+        return result
+
+def addImage( directory, name, filename, caption = "" ):
+    '''record the image *filename* called *name* in the index
+    of images in *directory*.
+
+    Entries are appended to the index in a single write, such
+    that several processes can add images at the same time.
+    '''
+    if not os.path.exists( directory ):
+        try:
+            os.makedirs( directory )
+        except OSError:
+            pass
+    line = json.dumps( { "name" : name,
+                         "filename" : filename,
+                         "caption" : caption } ) + "\n"
+    handle = os.open( os.path.join( directory, IMAGE_INDEX ),
+                      os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644 )
+    try:
+        os.write( handle, line.encode( "utf-8" ) )
+    finally:
+        os.close( handle )
+
+def readImages( directory ):
+    '''return images recorded in the index in *directory*.
+
+    returns an ordered dictionary mapping names to entries.
+    Later entries take precedence and entries for images
+    that do not exist any more are skipped.
+    '''
+    images = odict()
+    try:
+        infile = open( os.path.join( directory, IMAGE_INDEX ) )
+    except IOError:
+        return images
+
+    for line in infile:
+        try:
+            entry = json.loads( line )
+        except ValueError:
+            continue
+        images[entry["name"]] = entry
+    infile.close()
+
+    return odict( [ (x, y) for x, y in images.items() if os.path.exists( y["filename"] ) ] )
+
+def writeImages( directory, images ):
+    '''replace the index of images in *directory* with *images*.
+
+    This removes outdated entries from the index.
+    '''
+    handle, tmpfile = tempfile.mkstemp( dir = directory, prefix = ".tmp" )
+    outfile = os.fdopen( handle, "w" )
+    for entry in images.values():
+        outfile.write( json.dumps( entry ) + "\n" )
+    outfile.close()
+    os.rename( tmpfile, os.path.join( directory, IMAGE_INDEX ) )
@@ -1,7 +1,8 @@
-import os, sys, re, types, copy, warnings, inspect, logging, glob, gzip
+import os, sys, re, types, copy, warnings, inspect, logging, glob, gzip, json, hashlib, tempfile, pickle, struct, threading
 
 from collections import OrderedDict as odict
 import collections
+import multiprocessing.pool
 
 # Python 2/3 Compatibility
 try: import ConfigParser as configparser
@@ -12,6 +13,8 @@ import pandas
 import sqlalchemy
 import sqlalchemy.exc as exc
 import sqlalchemy.engine
+import sqlalchemy.event
+import sqlalchemy.pool
 
 # for rpy2 for data frames
 try:
@@ -20,7 +23,7 @@ try:
 except ImportError:
     R = None
 
-from SphinxReport import Utils
+from SphinxReport import Utils, Thumbnails
 
 class SQLError( Exception ):
     pass
@@ -70,11 +73,286 @@ def quoteField( s ):
 ###########################################################################
 ###########################################################################
 ###########################################################################
-@Utils.memoized
+# schema catalogs within this process, see getCatalog()
+CATALOGS = {}
+
+class SchemaCatalog(object):
+    '''table and column names of a database.
+
+    For sqlite databases, the catalog is filled with a single pass
+    over the database and saved in the cache directory, so that it can
+    be shared by all processes of a build. The catalog is discarded
+    when the database file changes.
+
+    For other databases, tables and columns are reflected on demand
+    and kept for the lifetime of the process.
+    '''
+
+    def __init__( self, db ):
+        self.db = db
+        self.tables = None
+        self.columns = {}
+        self.fingerprint = None
+
+        self.dbfile = None
+        if db.url.drivername.startswith( "sqlite" ) and \
+                db.url.database not in (None, "", ":memory:"):
+            self.dbfile = os.path.abspath( db.url.database )
+
+        self.filename = None
+        cache_dir = Utils.PARAMS.get( "report_cachedir", None )
+        if self.dbfile and cache_dir:
+            self.filename = os.path.join( cache_dir, "schema_%s.json" % \
+                                              hashlib.md5( self.dbfile.encode( "utf-8" ) ).hexdigest() )
+
+    def getFingerprint( self ):
+        '''return size and modification time of the database files.'''
+        return getFingerprint( [ self.dbfile ] )
+
+    def validate( self ):
+        '''check if the database has changed and discard the catalog if so.'''
+        if not self.dbfile: return
+
+        fingerprint = self.getFingerprint()
+        if fingerprint == self.fingerprint: return
+
+        self.fingerprint = fingerprint
+        self.tables, self.columns = None, {}
+
+        if not self.load():
+            self.build()
+            self.save()
+
+    def load( self ):
+        '''load catalog from the cache directory.
+
+        returns True if successful.
+        '''
+        if not self.filename or not os.path.exists( self.filename ):
+            return False
+        try:
+            infile = open( self.filename )
+            data = json.load( infile )
+            infile.close()
+        except (IOError, ValueError):
+            return False
+        if data.get( "fingerprint" ) != self.fingerprint:
+            return False
+        self.tables = data["tables"]
+        self.columns = data["columns"]
+        return True
+
+    def save( self ):
+        '''save catalog to the cache directory.'''
+        if not self.filename: return
+        dirname = os.path.dirname( self.filename )
+        try:
+            if not os.path.exists( dirname ): os.makedirs( dirname )
+            # write to temporary file first, other processes might be reading
+            handle, tmpfile = tempfile.mkstemp( dir = dirname )
+            outfile = os.fdopen( handle, "w" )
+            json.dump( { 'fingerprint' : self.fingerprint,
+                         'tables' : self.tables,
+                         'columns' : self.columns }, outfile )
+            outfile.close()
+            os.rename( tmpfile, self.filename )
+        except (IOError, OSError) as msg:
+            logging.warn( "could not save schema catalog %s: %s" % (self.filename, msg) )
+
+    def build( self ):
+        '''read all tables and columns from an sqlite database.'''
+        conn = self.db.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute( "SELECT name FROM sqlite_master WHERE type='table'" )
+            self.tables = sorted( [ x[0] for x in cursor.fetchall() if not x[0].startswith( "sqlite_" ) ] )
+            for table in self.tables:
+                cursor.execute( 'PRAGMA table_info("%s")' % table.replace( '"', '""' ) )
+                self.columns[table] = [ x[1] for x in cursor.fetchall() ]
+            cursor.close()
+        finally:
+            conn.close()
+
+    def getTables( self ):
+        '''return a list of table names.'''
+        self.validate()
+        if self.tables is None:
+            inspector = sqlalchemy.engine.reflection.Inspector.from_engine( self.db ) 
+            self.tables = list(inspector.get_table_names())
+        return self.tables
+
+    def getColumns( self, tablename ):
+        '''return a list of column names in table *tablename*.'''
+        self.validate()
+        if tablename not in self.columns:
+            self.columns[tablename] = [ x['name'] for x in getTableColumns( self.db, tablename ) ]
+        return self.columns[tablename]
+
+def getCatalog( db ):
+    '''return the schema catalog for engine *db*.'''
+    if db.url.database in (None, "", ":memory:"):
+        key = id(db)
+    else:
+        key = str(db.url)
+    if key not in CATALOGS:
+        CATALOGS[key] = SchemaCatalog( db )
+    return CATALOGS[key]
+
 def getTableNames( db ):
     '''return a set of table names.'''
-    inspector = sqlalchemy.engine.reflection.Inspector.from_engine(db) 
-    return set(inspector.get_table_names())
+    return set( getCatalog( db ).getTables() )
+
+def getFingerprint( filenames ):
+    '''return size and modification time of the database files
+    in *filenames* and their write-ahead logs.
+
+    For sqlite databases, the file change counter in the database 
+    header is added, as the modification time might not resolve
+    changes within a second.
+    '''
+    fingerprint = []
+    for filename in filenames:
+        try:
+            st = os.stat( filename )
+            infile = open( filename, "rb" )
+            header = infile.read( 28 )
+            infile.close()
+        except (IOError, OSError):
+            continue
+        entry = [ st.st_size, st.st_mtime ]
+        if header.startswith( b"SQLite format 3" ) and len(header) == 28:
+            entry.append( struct.unpack( ">I", header[24:28] )[0] )
+        fingerprint.append( entry )
+        try:
+            st = os.stat( filename + "-wal" )
+        except OSError:
+            continue
+        fingerprint.append( [ st.st_size, st.st_mtime ] )
+    return fingerprint
+
+###########################################################################
+###########################################################################
+###########################################################################
+# query caches within this process, see getQueryCache()
+QUERY_CACHES = {}
+
+RX_LITERAL = re.compile( "('(?:[^']|'')*')" )
+
+def normalizeStatement( statement ):
+    '''normalize white space in SQL *statement* outside of
+    string literals.'''
+    parts = RX_LITERAL.split( statement )
+    for x in range( 0, len(parts), 2 ):
+        parts[x] = " ".join( parts[x].split() )
+    return "".join( parts ).strip()
+
+class QueryCache(object):
+    '''cache of query results on disk.
+
+    Each result is pickled to a separate file in *directory*, so that
+    the cache can be shared by all processes of a build. If the total
+    size of the cache exceeds *max_size* bytes, the least recently
+    used results are removed.
+
+    The size of the cache is tracked in memory. The directory is only
+    scanned if the size exceeds *max_size* or every :attr:`scan_interval`
+    writes, which picks up results written by other processes.
+    '''
+
+    scan_interval = 100
+
+    def __init__( self, directory, max_size ):
+        self.directory = directory
+        self.max_size = max_size
+        # estimated size of the cache, None if not known
+        self.size = None
+        self.writes = 0
+        if not os.path.exists( self.directory ):
+            try:
+                os.makedirs( self.directory )
+            except OSError:
+                # created by another process
+                pass
+
+    def getKey( self, *args ):
+        '''return key for *args*.'''
+        return hashlib.md5( repr( args ).encode( "utf-8" ) ).hexdigest()
+
+    def __getitem__( self, key ):
+        filename = os.path.join( self.directory, key )
+        try:
+            infile = open( filename, "rb" )
+            try:
+                value = pickle.load( infile )
+            finally:
+                infile.close()
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            raise KeyError( key )
+        # record access for eviction
+        try:
+            os.utime( filename, None )
+        except OSError:
+            pass
+        return value
+
+    def __setitem__( self, key, value ):
+        filename = os.path.join( self.directory, key )
+        try:
+            handle, tmpfile = tempfile.mkstemp( dir = self.directory, prefix = ".tmp" )
+            outfile = os.fdopen( handle, "wb" )
+            try:
+                pickle.dump( value, outfile, pickle.HIGHEST_PROTOCOL )
+            finally:
+                outfile.close()
+            os.rename( tmpfile, filename )
+            nbytes = os.path.getsize( filename )
+        except (IOError, OSError, pickle.PicklingError) as msg:
+            logging.warn( "could not save query result to %s: %s" % (filename, msg) )
+            return
+
+        self.writes += 1
+        if self.size is None or self.writes % self.scan_interval == 0:
+            self.evict()
+        else:
+            self.size += nbytes
+            if self.size > self.max_size: self.evict()
+
+    def evict( self ):
+        '''scan the cache directory and remove least recently used
+        results until the cache is smaller than :attr:`max_size`.'''
+        entries = []
+        for f in os.listdir( self.directory ):
+            if f.startswith( ".tmp" ): continue
+            try:
+                st = os.stat( os.path.join( self.directory, f ) )
+            except OSError:
+                continue
+            entries.append( (st.st_mtime, st.st_size, f) )
+
+        total = sum( [ x[1] for x in entries ] )
+        if total > self.max_size: 
+            entries.sort()
+            for mtime, size, f in entries:
+                if total <= self.max_size: break
+                try:
+                    os.remove( os.path.join( self.directory, f ) )
+                except OSError:
+                    pass
+                total -= size
+        self.size = total
+
+def getQueryCache():
+    '''return the query cache in the cache directory.
+
+    returns None if there is no cache directory.
+    '''
+    cache_dir = Utils.PARAMS.get( "report_cachedir", None )
+    if not cache_dir: return None
+    directory = os.path.abspath( os.path.join( cache_dir, "queries" ) )
+    if directory not in QUERY_CACHES:
+        max_size = float( Utils.PARAMS.get( "report_sql_query_cache_size", 256 ) ) * 1024 * 1024
+        QUERY_CACHES[directory] = QueryCache( directory, max_size )
+    return QUERY_CACHES[directory]
 
 ###########################################################################
 ###########################################################################
@@ -87,6 +365,162 @@ def getTableColumns( db, tablename ):
         vals = inspector.get_columns(tablename)
     return vals
     
+###########################################################################
+###########################################################################
+###########################################################################
+def rowsToColumns( rows, columns ):
+    '''convert *rows*, a list of tuples, into a list of typed arrays,
+    one for each of *columns*.
+
+    The column types are detected by pandas. Integer columns with 
+    missing values are converted to floating point numbers.
+    '''
+    frame = pandas.DataFrame.from_records( rows, columns = columns, coerce_float = True )
+    return [ numpy.asarray( frame.iloc[:,x] ) for x in range( len(columns) ) ]
+
+def iterateRows( result, chunk_size = 100000 ):
+    '''iterate over an SQL *result* in chunks of *chunk_size* rows.
+
+    returns an iterator of lists of tuples.
+    '''
+    try:
+        while 1:
+            rows = result.fetchmany( chunk_size )
+            if not rows: break
+            yield [ tuple(x) for x in rows ]
+    finally:
+        result.close()
+
+def iterateColumns( result, chunk_size = 100000 ):
+    '''iterate over an SQL *result* in chunks of *chunk_size* rows.
+
+    returns an iterator of dictionaries mapping each column to an
+    array of values.
+    '''
+    columns = list(result.keys())
+    for rows in iterateRows( result, chunk_size ):
+        yield odict( list(zip( columns, rowsToColumns( rows, columns ) )) )
+
+def concatenateColumns( chunks ):
+    '''concatenate the dictionaries of column arrays in *chunks*.
+
+    Columns that change type between chunks are converted to a
+    type that can hold all values.
+    '''
+    if len(chunks) == 1: return chunks[0]
+    return odict( [ (column, numpy.concatenate( [ x[column] for x in chunks ] ) ) \
+                        for column in chunks[0].keys() ] )
+
+###########################################################################
+###########################################################################
+###########################################################################
+# process-wide registry of database engines, see getEngine()
+ENGINES = {}
+
+def setPragmas( dbapi_connection, connection_record ):
+    '''apply the pragmas in PARAMS["report_sql_pragmas"] to a new
+    sqlite connection.'''
+    pragmas = str( Utils.PARAMS.get( "report_sql_pragmas", "" ) )
+    cursor = dbapi_connection.cursor()
+    for pragma in [ x.strip() for x in pragmas.split(",") if x.strip() ]:
+        cursor.execute( "PRAGMA %s" % pragma )
+    cursor.close()
+
+def getEngine( backend, attach = () ):
+    '''return database engine for *backend* with the databases in 
+    *attach* attached.
+
+    Engines are shared between all trackers within a process and
+    are identified by the backend and the list of attached
+    databases. Each engine keeps a pool of 
+    PARAMS["report_sql_pool_size"] connections open and opens
+    at most PARAMS["report_sql_max_overflow"] additional
+    connections. If all connections are in use, callers wait up to
+    PARAMS["report_sql_pool_timeout"] seconds for a connection.
+
+    New sqlite connections are configured with PARAMS["report_sql_pragmas"].
+    '''
+    attach = tuple( [ (os.path.abspath( filename ), name) for filename, name in attach ] )
+
+    # engines can not be shared with forked processes
+    key = ( os.getpid(), backend, attach )
+    if key in ENGINES: 
+        return ENGINES[key]
+
+    is_sqlite = backend.startswith( 'sqlite' )
+
+    kwargs = { 'echo' : False }
+    # in-memory databases are not shared between connections
+    if backend not in ( "sqlite://", "sqlite:///:memory:" ):
+        kwargs['poolclass'] = sqlalchemy.pool.QueuePool
+        kwargs['pool_size'] = int( Utils.PARAMS.get( "report_sql_pool_size", 5 ) )
+        # additional connections are opened when all pooled connections are
+        # in use, for example by several open SQLResult iterators, and are
+        # closed when returned. Beyond that, callers wait for a connection.
+        max_overflow = Utils.PARAMS.get( "report_sql_max_overflow", None )
+        if max_overflow in ( None, "None", "" ): max_overflow = kwargs['pool_size']
+        kwargs['max_overflow'] = int( max_overflow )
+        kwargs['pool_timeout'] = float( Utils.PARAMS.get( "report_sql_pool_timeout", 30 ) )
+
+    if attach:
+        if not is_sqlite:
+            raise NotImplementedError( 'attach only implemented for sqlite backend')
+
+        def _my_creator():
+            # issuing the ATTACH DATABASE into the sqlalchemy ORM (self.db.execute( ... ))
+            # does not work. The database is attached, but tables are not accessible in later
+            # SELECT statements.
+            import sqlite3
+            conn = sqlite3.connect( re.sub( "sqlite:///", "", backend), 
+                                    check_same_thread = False )
+            for filename, name in attach:
+                conn.execute( "ATTACH DATABASE '%s' AS %s" % (filename, name) )
+            return conn
+        kwargs['creator'] = _my_creator
+
+    elif is_sqlite:
+        kwargs['connect_args'] = { 'check_same_thread' : False }
+
+    db = sqlalchemy.create_engine( backend, **kwargs )
+
+    if not db:
+        raise ValueError( "could not connect to database %s" % backend )
+
+    if is_sqlite:
+        sqlalchemy.event.listen( db, "connect", setPragmas )
+
+    ENGINES[key] = db
+    return db
+
+class SQLResult( Utils.ChunkedResult ):
+    '''result of an SQL statement that is read in chunks.
+
+    The statement is executed each time the result is iterated
+    over. Only the connection parameters and the statement are
+    kept, so that a result can be pickled and stored in the cache.
+    '''
+
+    def __init__(self, backend, statement, params = None, attach = (), chunk_size = 100000 ):
+        self.backend = backend
+        self.statement = statement
+        self.params = params
+        self.attach = tuple( attach )
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        db = getEngine( self.backend, self.attach )
+        try:
+            if self.params is None:
+                result = db.execute( self.statement )
+            else:
+                result = db.execute( sqlalchemy.text( self.statement ), self.params )
+        except exc.SQLAlchemyError as msg:
+            raise SQLError(msg)
+        return iterateColumns( result, self.chunk_size )
+
+    def __str__(self):
+        return "<SQLResult: %s>" % self.statement
+
 ###########################################################################
 ###########################################################################
 ###########################################################################
@@ -181,6 +615,162 @@ class Tracker(object):
         if locals: return dict( l, **locals)
         else: return l
 
+###########################################################################
+###########################################################################
+###########################################################################
+## files parsed within this process, see readFile()
+PARSED_FILES = odict()
+PARSED_FILES_LOCK = threading.Lock()
+## maximum number of parsed files kept
+MAX_PARSED_FILES = 16
+
+def readFile( filename, parser, *args ):
+    '''return the result of applying *parser* to *filename*.
+
+    Results are re-used as long as the modification time and size
+    of *filename* are unchanged. Additional arguments are passed
+    on to *parser* and are part of the cache key. Only the
+    :data:`MAX_PARSED_FILES` most recently used results are kept.
+    '''
+    stat = os.stat( filename )
+    stamp = ( stat.st_mtime, stat.st_size )
+    key = ( os.path.abspath( filename ), parser, args )
+    with PARSED_FILES_LOCK:
+        if key in PARSED_FILES:
+            cached, result = PARSED_FILES.pop( key )
+            if cached == stamp: 
+                PARSED_FILES[key] = ( cached, result )
+                return result
+
+    result = parser( filename, *args )
+
+    with PARSED_FILES_LOCK:
+        PARSED_FILES.pop( key, None )
+        PARSED_FILES[key] = ( stamp, result )
+        while len( PARSED_FILES ) > MAX_PARSED_FILES:
+            PARSED_FILES.popitem( last = False )
+    return result
+
+class CommentFilter(object):
+    '''file-like object returning the lines of *infile* that
+    do not start with *comment*.
+
+    Unlike the ``comment`` option of :func:`pandas.read_csv`,
+    ``#`` characters within fields are kept.
+    '''
+    def __init__( self, infile, comment = "#" ):
+        self.infile = infile
+        self.comment = comment
+        self.buffer = ""
+
+    def read( self, size = -1 ):
+        chunks, n = [ self.buffer ], len( self.buffer )
+        while size is None or size < 0 or n < size:
+            line = self.infile.readline()
+            if not line: break
+            if line.startswith( self.comment ): continue
+            chunks.append( line )
+            n += len( line )
+        data = "".join( chunks )
+        if size is None or size < 0: size = len( data )
+        self.buffer = data[size:]
+        return data[:size]
+
+    def __iter__( self ):
+        while True:
+            data = self.read( 65536 )
+            if not data: break
+            for line in data.splitlines( True ): yield line
+
+    def close( self ):
+        self.infile.close()
+
+def openTSV( filename ):
+    '''open *filename* for reading skipping lines starting with ``#``.
+
+    Compressed files are recognized by the suffix ``.gz``.
+    '''
+    if filename.endswith( ".gz" ):
+        infile = gzip.open( filename, "rt" )
+    else:
+        infile = open( filename, "r" )
+    return CommentFilter( infile )
+
+def readTSV( filename, **kwargs ):
+    '''read a tab-separated file with a header line with
+    :func:`pandas.read_csv`. Lines starting with ``#`` are ignored.
+    Additional arguments are passed on to :func:`pandas.read_csv`.
+    '''
+    infile = openTSV( filename )
+    try:
+        return pandas.read_csv( infile, sep = "\t", header = 0, engine = "c", **kwargs )
+    finally:
+        infile.close()
+
+def parseTSV( filename, usecols = None ):
+    '''parse a tab-separated file with a header line into a dataframe.
+
+    Compressed files are recognized by the suffix ``.gz``. Lines
+    starting with ``#`` are ignored. If *usecols* is given, only 
+    these columns are parsed.
+    '''
+    if usecols is not None: usecols = list(usecols)
+    return readTSV( filename, usecols = usecols )
+
+def parseHeader( filename ):
+    '''return the column names of a tab-separated file.'''
+    return list( readTSV( filename, nrows = 0 ).columns )
+
+def getExtension( filename ):
+    '''return the extension of *filename* ignoring a ``.gz`` suffix.'''
+    if filename.endswith( ".gz" ): filename = filename[:-3]
+    return os.path.splitext( filename )[1]
+
+def parseMatrix( filename ):
+    '''parse a tab-separated matrix with row and column headers.
+
+    Files ending in ``.npy`` are read with :func:`numpy.load`
+    and rows and columns are labeled by their index.
+
+    returns a tuple of the matrix, row names and column names.
+    '''
+    if getExtension( filename ) == ".npy":
+        matrix = numpy.asarray( numpy.load( filename ), dtype = numpy.float64 )
+        return ( matrix,
+                 [ str(x) for x in range( matrix.shape[0] ) ],
+                 [ str(x) for x in range( matrix.shape[1] ) ] )
+
+    df = readTSV( filename, index_col = 0, converters = { 0 : str } )
+    return ( numpy.asarray( df.values, dtype = numpy.float64 ),
+             list( df.index ),
+             [ str(x) for x in df.columns ] )
+
+def parseDataframe( filename, index_column = None ):
+    '''parse a dataframe from *filename*.
+
+    The format is chosen by extension: ``.parquet``, ``.feather``
+    and ``.npy`` files are read as binary, everything else as
+    tab-separated text with a header line. 
+
+    If *index_column* is given, the column is used as row names.
+    '''
+    extension = getExtension( filename )
+    if extension not in ( ".parquet", ".feather", ".npy" ):
+        return pandas.read_csv( filename, sep = "\t", header = 0, 
+                                index_col = index_column, engine = "c" )
+
+    if extension == ".parquet":
+        df = pandas.read_parquet( filename )
+    elif extension == ".feather":
+        df = pandas.read_feather( filename )
+    else:
+        df = pandas.DataFrame( numpy.load( filename ) )
+
+    if index_column is not None:
+        if index_column not in df.columns: index_column = df.columns[int(index_column)]
+        df = df.set_index( index_column )
+    return df
+
 ###########################################################################
 ###########################################################################
 ###########################################################################
@@ -217,18 +807,36 @@ class TrackerMultipleFiles( Tracker ):
         a filename. If not given, the complete filename 
         path is used.
 
+    Derived classes implement :meth:`loadFile`. Parsed files
+    are cached (see :func:`readFile`) and files for several
+    tracks are parsed concurrently by :meth:`prefetch`
+    using :attr:`threads` threads. Files are prefetched 
+    in windows of :meth:`getPrefetchWindow` tracks.
     '''
-    def getTracks(self, subset = None ):
-        files = glob.glob( self.glob )
-        self.mapTrack2File = {}
-        for f in files:
-            try:
-                track = self.regex.search( f ).groups()[0]
-            except AttributeError:
-                raise ValueError( "filename %s does not match regular expression" % f )
 
-            self.mapTrack2File[track] = f
-        return self.mapTrack2File.keys()
+    # number of threads for parsing files. If None,
+    # the configuration option ``file_threads`` is used.
+    threads = None
+
+    def getFiles( self ):
+        '''return a dictionary mapping tracks to filenames.
+
+        The file system is searched only once.
+        '''
+        if self.mapTrack2File is None:
+            mapTrack2File = odict()
+            for f in sorted( glob.glob( self.glob ) ):
+                try:
+                    track = self.regex.search( f ).groups()[0]
+                except AttributeError:
+                    raise ValueError( "filename %s does not match regular expression" % f )
+
+                mapTrack2File[track] = f
+            self.mapTrack2File = mapTrack2File
+        return self.mapTrack2File
+
+    def getTracks(self, subset = None ):
+        return list( self.getFiles().keys() )
 
     def __init__(self, *args, **kwargs ):
         Tracker.__init__(self, *args, **kwargs )
@@ -241,90 +849,101 @@ class TrackerMultipleFiles( Tracker ):
         if '(' not in self.regex:
             raise ValueError( "regular expression requires exactly one group enclosed in ()")
         self.regex = re.compile( self.regex)
+        self.mapTrack2File = None
 
     def openFile( self, track ):
         '''open a file.'''
-        filename = self.mapTrack2File[track]
+        filename = self.getFiles()[track]
         if filename.endswith( ".gz" ):
             infile = gzip.open( filename, "r" )
         else:
             infile = open( filename, "r" )
         return infile
 
+    def loadFile( self, filename ):
+        '''return the parsed contents of *filename*.'''
+        raise NotImplementedError( "loadFile not implemented in %s" % self.__class__.__name__ )
+
+    def getThreads( self ):
+        '''return the number of threads for parsing files.'''
+        return self.threads or Utils.PARAMS["report_file_threads"]
+
+    def getPrefetchWindow( self ):
+        '''return the number of paths to prefetch at a time.
+
+        The window is limited by the number of parsed files
+        kept in memory (see :func:`readFile`).
+        '''
+        return max( 1, min( self.getThreads(), MAX_PARSED_FILES ) )
+
+    def prefetch( self, paths ):
+        '''parse the files for the tracks in *paths* concurrently.
+
+        The results are kept in the cache of parsed files. Callers
+        should pass no more than :meth:`getPrefetchWindow` paths
+        at a time.
+        '''
+        files = self.getFiles()
+        filenames = list( odict( [ (files[path[0]], 1) for path in paths if path[0] in files ] ).keys() )
+        threads = self.getThreads()
+        if threads <= 1 or len(filenames) <= 1: return
+
+        pool = multiprocessing.pool.ThreadPool( min( threads, len(filenames) ) )
+        try:
+            pool.map( self.loadFile, filenames )
+        finally:
+            pool.close()
+            pool.join()
+
 #######################################################
 #######################################################
 #######################################################
 class TrackerTSV( TrackerSingleFile ):
     """Base class for trackers that fetch data from an CSV file.
 
-    Each track is a column in the file.
+    Each track is a column in the file. Columns are returned as
+    numpy arrays keeping their numeric type.
+
+    The file is parsed only once. If :attr:`usecols` is set, only
+    the column of the requested track is parsed, which is faster 
+    if only a few columns of a wide file are used.
     """
 
-    def __init__(self, *args, **kwargs ):
-        TrackerSingleFile.__init__(self, *args, **kwargs )
-
-        self._data = None
-        self._tracks = None
+    usecols = False
 
     def getTracks(self, subset = None ):
-        if self.filename.endswith( ".gz" ):
-            inf = gzip.open( self.filename, "r" )
-        else:
-            inf = open( self.filename, "r" )
-
-        for line in inf:
-            if line.startswith("#"): continue
-            tracks = line[:-1].split( "\t" )
-            break
-        inf.close()
-        self._tracks = tracks
-        return tracks
+        if self.usecols:
+            return readFile( self.filename, parseHeader )
+        return list( self.readData().columns )
     
     def readData( self ):
-        if self._data == None:
-            if self.filename.endswith( ".gz" ):
-                inf = gzip.open( self.filename, "r" )
-            else:
-                inf = open( self.filename, "r" )
-
-            data = [ x.split() for x in inf.readlines() if not x.startswith("#")]
-            inf.close()
-
-            self.data = dict( list(zip( data[0], list(zip( *data[1:] )) )) )
+        '''return the contents of the file as a dataframe.'''
+        return readFile( self.filename, parseTSV )
 
     def __call__(self, track, **kwargs ):
         """return a data structure for track :param: track"""
-        self.readData()
-        return self.data[track]
-
+        if self.usecols:
+            data = readFile( self.filename, parseTSV, (track,) )
+        else:
+            data = self.readData()
+        # copy, as the parsed file is shared
+        return numpy.array( data[track].values )
 
 class TrackerMatrices( TrackerMultipleFiles ):
     """Return matrix data from multiple files.
     """
 
+    def loadFile( self, filename ):
+        return readFile( filename, parseMatrix )
+
     def __call__(self, track, **kwargs ):
         """return a data structure for track :param: track"""
 
-        infile = self.openFile( track )
-
-        dtype = numpy.float
-
-        lines = [ l for l in infile.readlines() if not l.startswith("#") ]
-        infile.close()
-        nrows = len(lines) - 1
-        col_headers = lines[0][:-1].split("\t")[1:]
-        ncols = len(col_headers)
-        matrix = numpy.zeros( (nrows, ncols), dtype = dtype )
-        row_headers = []
+        matrix, row_headers, col_headers = self.loadFile( self.getFiles()[track] )
         
-        for row, l in enumerate(lines[1:]):
-            data = l.split("\t")
-            row_headers.append( data[0] )
-            matrix[row] = numpy.array(data[1:], dtype = dtype)
-        
-        return odict( ( ('matrix', matrix),
-                        ('rows', row_headers),
-                        ('columns', col_headers) ) )
+        return odict( ( ('matrix', matrix.copy()),
+                        ('rows', list(row_headers)),
+                        ('columns', list(col_headers)) ) )
 
 #######################################################
 #######################################################
@@ -335,22 +954,31 @@ class TrackerDataframes( TrackerMultipleFiles ):
     By default, the dataframe has no row names. 
     If self.index_column is set, the specified column
     will be used as row names.
+
+    Files ending in ``.parquet``, ``.feather`` or ``.npy`` are 
+    read as binary files, all others as tab-separated text.
     '''
     def __init__(self, *args, **kwargs ):
         TrackerMultipleFiles.__init__(self, *args, **kwargs )
         self.index_column = kwargs.get('index_column', None )
 
-    def __call__( self, track, **kwargs ):
+    def loadFile( self, filename ):
+        return readFile( filename, parseDataframe, self.index_column )
 
-        df = pandas.read_csv( self.openFile(track), sep='\t', header=0, 
-                              index_col=self.index_column )
-        return df
+    def __call__( self, track, **kwargs ):
+        # copy, as the parsed file is shared
+        return self.loadFile( self.getFiles()[track] ).copy()
         
 ###########################################################################
 ###########################################################################
 ###########################################################################
 class TrackerImages( Tracker ):
     '''Collect image files and arrange them in a gallery.
+
+    Thumbnails of the images are kept in the directory
+    ``thumbnails`` within the :term:`cachedir` and are only
+    created for new or changed images. Thumbnails for
+    all images are created in parallel by :meth:`prefetch`.
     '''
     
     def __init__(self, *args, **kwargs ):
@@ -358,13 +986,34 @@ class TrackerImages( Tracker ):
         if "glob" not in kwargs:
             raise ValueError( "TrackerImages requires a :glob: parameter" )
         self.glob = kwargs["glob"]
+        self._tracks = None
+        self._thumbnails = None
 
     def getTracks(self, subset = None ):
-        return glob.glob( self.glob )
+        if self._tracks is None:
+            self._tracks = sorted( glob.glob( self.glob ) )
+        return self._tracks
+
+    def getThumbnailCache( self ):
+        cache_dir = Utils.PARAMS.get( "report_cachedir", None )
+        if not cache_dir: return None
+        return Thumbnails.ThumbnailCache( os.path.join( cache_dir, "thumbnails" ) )
+
+    def prefetch( self, paths ):
+        '''create thumbnails for the images in *paths*.'''
+        cache = self.getThumbnailCache()
+        if cache is None: return
+        self._thumbnails = cache.update( [ path[0] for path in paths ] )
     
     def __call__(self, track, **kwargs ):
         """return a data structure for track :param: track and slice :slice:"""
-        return odict( ( ('name', track), ( 'filename', track) ) )
+        if self._thumbnails is None or track not in self._thumbnails:
+            self.prefetch( [ (track,) ] )
+        if self._thumbnails is None:
+            return odict( ( ('name', track), ( 'filename', track) ) )
+        return odict( ( ('name', track), 
+                        ( 'filename', track), 
+                        ( 'thumbnail', self._thumbnails.get( track, None ) ) ) )
 
 ###########################################################################
 ###########################################################################
@@ -378,16 +1027,39 @@ class TrackerSQL( Tracker ):
     The pattern should contain at least one group. If there are multiple
     groups, these will be associated as tracks/slices.
 
-    This tracker connects to the database. Each tracker will establish
-    its own connection for efficient multi-processing.
+    This tracker connects to the database. Trackers within the same 
+    process share the database engine and its pool of connections
+    (see :func:`getEngine`).
 
     If :attr:`as_tables` is set, the full table names will be returned.
     The default is to apply :attr:`pattern` and return the result.
+
+    Statements passed to the data access methods such as :meth:`getValues`
+    are interpolated with the caller's local variables and the tracker's
+    members. Alternatively, statements can use bind parameters that are
+    supplied as a dictionary::
+
+       self.getValues( "SELECT data FROM table WHERE experiment = :track",
+                       { "track" : track } )
+
+    Statements with bind parameters are compiled once per tracker class
+    and are not interpolated. The database can re-use the query plan
+    for identical statements.
+
+    If :attr:`query_cache` is set, results are cached on disk and
+    shared with other trackers and processes (see :class:`QueryCache`).
     """
 
     pattern = None
     as_tables = False
 
+    # number of rows to fetch from the database at a time
+    chunk_size = 100000
+
+    # cache query results on disk. If None, PARAMS["report_sql_query_cache"]
+    # applies.
+    query_cache = None
+
     def __init__(self, backend = None, attach = [], *args, **kwargs ):
         Tracker.__init__(self, *args, **kwargs )
 
@@ -417,48 +1089,29 @@ class TrackerSQL( Tracker ):
             self.as_tables = self.mAsTables
 
     def connect( self, creator = None ):
-        """lazy connection function."""
+        """lazy connection function.
+
+        Unless a *creator* is given, the engine is shared with all other
+        trackers using the same backend and attached databases
+        (see :func:`getEngine`).
+        """
 
         if not self.db:
             
-            logging.debug( "connecting to %s" % self.backend )
+            logging.debug( "connecting to %s", self.backend )
 
-            # attach to additional databases (sqlite)
-            if self.attach:
-                
-                if creator is not None: 
-                    raise NotImplementedError( 'attach not implemented if creator is set')
-                
-                if not self.backend.startswith( 'sqlite' ):
-                    raise NotImplementedError( 'attach only implemented for sqlite backend')
-
-                def _my_creator():
-                    # issuing the ATTACH DATABASE into the sqlalchemy ORM (self.db.execute( ... ))
-                    # does not work. The database is attached, but tables are not accessible in later
-                    # SELECT statements.
-                    import sqlite3
-                    conn = sqlite3.connect(re.sub( "sqlite:///", "", self.backend) )
-                    for filename, name in self.attach:
-                        conn.execute( "ATTACH DATABASE '%s' AS %s" % \
-                                          (os.path.abspath(filename),
-                                           name))
-                    return conn
-                creator = _my_creator
-
-            # creator can not be None.
             if creator:
+                if self.attach:
+                    raise NotImplementedError( 'attach not implemented if creator is set')
                 db = sqlalchemy.create_engine( self.backend, 
                                                echo = False,
                                                creator = creator )
             else:
-                db = sqlalchemy.create_engine( self.backend, 
-                                               echo = False )
+                db = getEngine( self.backend, self.attach )
             
             if not db:
                 raise ValueError( "could not connect to database %s" % self.backend )
 
-            db.echo = False  
-
             # ignore unknown type BigInt warnings
             # Note that this step can take a while on large databases
             # with many tables and many columns
@@ -472,7 +1125,7 @@ class TrackerSQL( Tracker ):
 
             self.db = db
 
-            logging.debug( "connected to %s" % self.backend )
+            logging.debug( "connected to %s", self.backend )
 
     def rconnect( self, creator = None ):
         '''open connection within R to database.'''
@@ -521,25 +1174,105 @@ class TrackerSQL( Tracker ):
         '''return a list of columns in table *tablename*.'''
         
         self.connect()
-        columns = getTableColumns( self.db, tablename )
-        return [ re.sub( "%s[.]" % tablename, "", x['name']) for x in columns ]
+        columns = getCatalog( self.db ).getColumns( tablename )
+        return [ re.sub( "%s[.]" % tablename, "", x) for x in columns ]
+
+    def execute(self, stmt, params = None ):
+        '''execute SQL statement *stmt*.
 
-    def execute(self, stmt ):
+        If *params* is given, *stmt* is executed as a prepared
+        statement with the bind parameters in *params*
+        (see :meth:`prepare`).
+        '''
         self.connect()
         try:
-            r = self.db.execute(stmt)
+            if params is None:
+                r = self.db.execute(stmt)
+            else:
+                r = self.db.execute(self.prepare(stmt), params)
         except exc.SQLAlchemyError as msg:
             raise SQLError(msg)
         return r
 
-    def buildStatement( self, stmt ):
-        '''fill in placeholders in stmt.'''
-        
+    def prepare( self, stmt ):
+        '''return compiled statement for *stmt* with bind parameters
+        such as ``:track``.
+
+        Compiled statements are cached per tracker class.
+        '''
+        statements = self.__class__.__dict__.get( "_statements" )
+        if statements is None:
+            statements = {}
+            setattr( self.__class__, "_statements", statements )
+        try:
+            return statements[stmt]
+        except KeyError:
+            compiled = statements[stmt] = sqlalchemy.text( stmt )
+            return compiled
+
+    def useQueryCache( self ):
+        '''return True if query results are cached.'''
+        if self.query_cache is not None: return self.query_cache
+        return str( Utils.PARAMS.get( "report_sql_query_cache", False ) ).lower() in ( "1", "true", "yes", "on" )
+
+    def getFingerprint( self ):
+        '''return size and modification time of the database files.
+
+        returns an empty list if the database is not a file.
+        '''
+        self.connect()
+        url = self.db.url
+        if not url.drivername.startswith( "sqlite" ) or url.database in (None, "", ":memory:"):
+            return []
+        return getFingerprint( [ os.path.abspath( url.database ) ] + \
+                                   [ os.path.abspath( x[0] ) for x in self.attach ] )
+
+    def fetch( self, kind, statement, params, f ):
+        '''execute *statement* with bind parameters *params* and return
+        the result of applying *f* to the result proxy.
+
+        If query caching is enabled (see :meth:`useQueryCache`), the results
+        are cached by *kind*, the normalized statement, the parameters and the
+        state of the database files. Results from databases that are not 
+        files are not cached.
+        '''
+        cache = None
+        if self.useQueryCache():
+            fingerprint = self.getFingerprint()
+            if fingerprint: cache = getQueryCache()
+
+        if cache is None:
+            return f( self.execute( statement, params ) )
+
+        key = cache.getKey( kind, 
+                            normalizeStatement( statement ), 
+                            sorted( (params or {}).items() ),
+                            self.backend,
+                            fingerprint )
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        result = f( self.execute( statement, params ) )
+        cache[key] = result
+        return result
+
+    def buildStatement( self, stmt, params = None ):
+        '''fill in placeholders in stmt.
+
+        Placeholders are filled from the local variables of the caller
+        and the members of the tracker. The statement is returned as is
+        if bind parameters *params* are given or if there are no
+        placeholders.
+        '''
+        if params is not None or "%" not in stmt:
+            return stmt
         kwargs = self.members( getCallerLocals() )
         statement = stmt % dict( list(kwargs.items()) )
         return statement
 
-    def getValue( self, stmt ):
+    def getValue( self, stmt, params = None ):
         """returns a single value from SQL statement *stmt*.
 
         The SQL statement is subjected to variable interpolation.
@@ -547,13 +1280,13 @@ class TrackerSQL( Tracker ):
         This function will return the first value in the first row
         from a SELECT statement.
         """
-        statement = self.buildStatement(stmt)
-        result = self.execute(statement).fetchone()
+        statement = self.buildStatement(stmt, params)
+        result = self.fetch( "first", statement, params, lambda e: e.fetchone() )
         if result == None:
             raise exc.SQLAlchemyError( "no result from %s" % statement )
         return result[0]
 
-    def getFirstRow( self, stmt ):
+    def getFirstRow( self, stmt, params = None ):
         """return a row of values from SQL statement *stmt* as a list.
 
         The SQL statement is subjected to variable interpolation.
@@ -563,11 +1296,11 @@ class TrackerSQL( Tracker ):
 
         Returns None if result is empty.
         """
-        e = self.execute(self.buildStatement(stmt)).fetchone()
+        e = self.fetch( "first", self.buildStatement(stmt, params), params, lambda e: e.fetchone() )
         if e: return list(e)
         else: return None
 
-    def getRow( self, stmt ):
+    def getRow( self, stmt, params = None ):
         """return a row of values from an SQL statement as dictionary.
 
         This function will return the first row from a SELECT 
@@ -575,12 +1308,12 @@ class TrackerSQL( Tracker ):
 
         Returns None if result is empty.
         """
-        e = self.execute( self.buildStatement( stmt )).fetchone()
+        e = self.fetch( "first", self.buildStatement( stmt, params ), params, lambda e: e.fetchone() )
         # assumes that values are sorted in ResultProxy.keys()
         if e: return odict( [x,e[x]] for x in list(e.keys()) )
         else: return None
 
-    def getValues( self, stmt ):
+    def getValues( self, stmt, params = None ):
         """return values from SQL statement *stmt* as a list.
 
         This function will return the first value in each row
@@ -588,28 +1321,42 @@ class TrackerSQL( Tracker ):
 
         Returns an empty list if there is no result.
         """
-        e = self.execute(self.buildStatement(stmt)).fetchall()
-        if e: return [x[0] for x in e]
-        return []
+        return self.fetch( "values", self.buildStatement(stmt, params), params,
+                           lambda e: [x[0] for x in e.fetchall()] )
 
-    def getAll( self, stmt ):
+    def getAll( self, stmt, params = None ):
         """return all rows from SQL statement *stmt* as a dictionary.
 
         The dictionary contains key/values pairs where keys are
         the selected columns and the values are the results.
 
         Example: SELECT column1, column2 FROM table
-        Example: { 'column1': [1,2,3], 'column2' : [2,4,2] }
+        Example: { 'column1': (1,2,3), 'column2' : (2,4,2) }
+
+        The values are returned as tuples. Rows are fetched from 
+        the database in chunks of :attr:`chunk_size` rows. Use
+        :meth:`getColumnChunks` to obtain typed arrays.
 
         Returns an empty dictionary if there is no result.
         """
-        # convert to tuples
-        e = self.execute(self.buildStatement(stmt))
-        columns = list(e.keys())
-        d = e.fetchall()
-        return odict( list(zip( columns, list(zip( *d )) )) )
+        def _fetch( e ):
+            columns = list(e.keys())
+            values = [ [] for x in columns ]
+            for rows in iterateRows( e, self.chunk_size ):
+                for v, c in zip( values, zip( *rows ) ): v.extend( c )
+            if not values or not values[0]: return odict()
+            return odict( list(zip( columns, [ tuple(x) for x in values ] )) )
+        return self.fetch( "all", self.buildStatement(stmt, params), params, _fetch )
+
+    def getColumnChunks( self, stmt, params = None ):
+        """return an iterator over the results of SQL statement *stmt*.
+
+        Each step returns a dictionary of columns as :meth:`getAll`
+        for at most :attr:`chunk_size` rows.
+        """
+        return iterateColumns( self.execute(self.buildStatement(stmt, params), params), self.chunk_size )
 
-    def get( self, stmt ):
+    def get( self, stmt, params = None ):
         """return all results from an SQL statement as list of tuples.
 
         Example: SELECT column1, column2 FROM table
@@ -617,9 +1364,9 @@ class TrackerSQL( Tracker ):
 
         Returns an empty list if there is no result.
         """
-        return self.execute(self.buildStatement(stmt)).fetchall()
+        return self.fetch( "rows", self.buildStatement(stmt, params), params, lambda e: e.fetchall() )
 
-    def getDict( self, stmt ):
+    def getDict( self, stmt, params = None ):
         """return results from SQL statement *stmt* as a dictionary.
 
         Example: SELECT column1, column2 FROM table
@@ -631,17 +1378,37 @@ class TrackerSQL( Tracker ):
         that can be used for matrix visualization.
         """
         # convert to tuples
-        e = self.execute(self.buildStatement(stmt))
-        columns = list(e.keys())
-        result = odict()
-        for row in e:
-            result[row[0]] = odict( list(zip( columns[1:], row[1:] )) )
-        return result
+        def _fetch( e ):
+            columns = list(e.keys())
+            result = odict()
+            for row in e:
+                result[row[0]] = odict( list(zip( columns[1:], row[1:] )) )
+            return result
+        return self.fetch( "dict", self.buildStatement(stmt, params), params, _fetch )
 
-    def getIter( self, stmt ):
+    def getIter( self, stmt, params = None ):
         '''returns an iterator over results of SQL statement *stmt*.
         '''
-        return self.execute(stmt)
+        return self.execute(stmt, params)
+
+    def getChunks( self, stmt, params = None ):
+        '''return the results of SQL statement *stmt* as a
+        :class:`SQLResult`.
+
+        The statement is not executed until the result is iterated
+        over. Each iteration returns dictionaries of columns as
+        :meth:`getAll` for at most :attr:`chunk_size` rows.
+
+        Transformers such as :class:`TransformerHistogram` or
+        :class:`TransformerStats` summarize the result chunk by
+        chunk without loading all of it into memory.
+        '''
+        self.connect()
+        return SQLResult( self.backend,
+                          self.buildStatement(stmt, params),
+                          params = params,
+                          attach = self.attach,
+                          chunk_size = self.chunk_size )
     
     def getTracks(self, *args, **kwargs):
         """return a list of all tracks that this tracker provides.
@@ -665,12 +1432,15 @@ class TrackerSQL( Tracker ):
     #     self.rconnect()
     #     return R.dbGetQuery(self.rdb, self.buildStatement(stmt) )
     
-    def getDataFrame( self, stmt ):
+    def getDataFrame( self, stmt, params = None ):
         '''return results of SQL statement as an pandas dataframe.
         '''
-        data = self.getAll( stmt )
-        df = pandas.DataFrame.from_dict( data )
-        return df
+        def _fetch( e ):
+            columns = list(e.keys())
+            chunks = list( iterateColumns( e, self.chunk_size ) )
+            if not chunks: return pandas.DataFrame( columns = columns )
+            return pandas.DataFrame( concatenateColumns( chunks ) )
+        return self.fetch( "dataframe", self.buildStatement(stmt, params), params, _fetch )
         
     def getPaths( self ):
          """return all paths this tracker provides.
@@ -875,6 +1645,23 @@ class Status( TrackerSQL ):
                 ( 'info', str(value)),
                 ( 'description', description ) ) )
     
+###########################################################################
+###########################################################################
+###########################################################################
+def buildIndex( *columns ):
+    '''return a dictionary mapping the values in *columns* to the
+    position of their first occurrence.
+
+    *columns* contain the values as returned by the database (see
+    :meth:`TrackerSQL.getAll`). Values are converted to strings, so 
+    that the index can be searched with values that have been passed 
+    as strings.
+    '''
+    index = {}
+    for x, key in enumerate( zip( *[ [ str(y) for y in c ] for c in columns ] ) ):
+        if key not in index: index[key] = x
+    return index
+
 ###########################################################################
 ###########################################################################
 ###########################################################################
@@ -981,14 +1768,30 @@ class SingleTableTrackerColumns( TrackerSQL ):
           table = 'mytable'
           column = 'bin'
 
+    If :py:attr:`preload` is set, the table is read once and all
+    tracks and slices are served from memory.
     '''
     exclude_columns = ("track,")
     table = None
     column = None
+    preload = False
+    loaded = False
 
     def __init__(self, *args, **kwargs ):
         TrackerSQL.__init__(self, *args, **kwargs )
 
+    def _load(self):
+        '''load all tracks and index them by :py:attr:`column`.'''
+        if not self.loaded:
+            columns = list(self.tracks)
+            if self.column: columns.insert( 0, self.column )
+            self.data = self.getAll( "SELECT %s FROM %s" % (",".join(columns), self.table) )
+            if self.column and self.data:
+                self._index = buildIndex( self.data[self.column] )
+            else:
+                self._index = {}
+            self.loaded = True
+
     @property
     def tracks(self):
         if not self.hasTable( self.table ): return []
@@ -1003,6 +1806,19 @@ class SingleTableTrackerColumns( TrackerSQL ):
             return []
 
     def __call__(self, track, slice = None ):
+        if self.preload:
+            self._load()
+            if slice != None:
+                try:
+                    x = self._index[(str(slice),)]
+                except KeyError:
+                    raise exc.SQLAlchemyError( "no result for %s = %s in %s" % (self.column, slice, self.table) )
+                return self.data[track][x]
+            elif self.data:
+                return list( self.data[track] )
+            else:
+                return []
+
         if slice != None:
             data = self.getValue( "SELECT %(track)s FROM %(table)s WHERE %(column)s = '%(slice)s'" )
         else:
@@ -1032,7 +1848,9 @@ class SingleTableTrackerEdgeList( TrackerSQL ):
     the value for ``row,col`` and value2 is the value for ``col,row``.
 
     This method is inefficient, particularly so if there are no
-    indices on :py:attr:`row` and :py:attr:`column`.
+    indices on :py:attr:`row` and :py:attr:`column`. If :py:attr:`preload`
+    is set, the table is read once and all values are served
+    from memory.
 
     '''
     table = None
@@ -1042,10 +1860,37 @@ class SingleTableTrackerEdgeList( TrackerSQL ):
     value2 = None
     transform = None
     where = "1"
+    preload = False
+    loaded = False
     
     def __init__(self, *args, **kwargs ):
         TrackerSQL.__init__(self, *args, **kwargs )
 
+    def _load(self):
+        '''load all values and index them by row and column.'''
+        if not self.loaded:
+            columns = [ self.row, self.column, self.value ]
+            if self.value2: columns.append( self.value2 )
+            data = self.getAll( "SELECT %s FROM %s WHERE %s" % (",".join(columns), self.table, self.where) )
+            if data:
+                data = list(data.values())
+                self._index = buildIndex( data[0], data[1] )
+                self._values = data[2]
+                if self.value2: 
+                    self._values2 = data[3]
+            else:
+                self._index = {}
+                self._values = self._values2 = None
+            self.loaded = True
+
+    def getPreloaded( self, values, row, column ):
+        '''return preloaded value in *values* at *row* and *column*.'''
+        try:
+            x = self._index[(str(row), str(column))]
+        except KeyError:
+            return None
+        return values[x]
+
     @property
     def tracks( self ):
         if self.table == None: raise NotImplementedError("table not defined" )
@@ -1066,6 +1911,15 @@ class SingleTableTrackerEdgeList( TrackerSQL ):
 
     def __call__(self, track, slice = None ):
 
+        if self.preload:
+            self._load()
+            val = self.getPreloaded( self._values, track, slice )
+            if val == None and self.value2:
+                val = self.getPreloaded( self._values2, slice, track )
+            if val == None: return val
+            if self.transform: return self.transform(val)
+            return val
+
         try:
             val = self.getValue( """SELECT %(value)s FROM %(table)s 
                                WHERE %(row)s = '%(track)s' AND %(column)s = '%(slice)s' AND %(where)s""" )
@@ -1249,20 +2103,9 @@ class TrackerSQLMulti( TrackerSQL ):
         if not self.backend.startswith("sqlite"):
             raise ValueError( "TrackerSQLMulti only works for sqlite database" )
 
-        if not self.db:
-            def _my_creator():
-                # issuing the ATTACH DATABASE into the sqlalchemy ORM (self.db.execute( ... ))
-                # does not work. The database is attached, but tables are not accessible in later
-                # SELECT statements.
-                import sqlite3
-                conn = sqlite3.connect(re.sub( "sqlite:///", "", self.backend) )
-                for track, name in zip( self.databases, self.tracks ):
-                    conn.execute( "ATTACH DATABASE '%s/csvdb' AS %s" % \
-                                      (os.path.abspath(track),
-                                       name))
-                return conn
-
-            self.connect( creator = _my_creator )
+        # the engine is shared with other trackers attaching the same databases
+        self.attach = list(self.attach) + \
+            [ ( os.path.join( track, "csvdb" ), name ) for track, name in zip( self.databases, self.tracks ) ]
 
 class TrackerMultipleLists( TrackerSQL ):
     ''' A class to retrieve multiple columns across one or more tables.
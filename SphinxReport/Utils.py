@@ -1,4 +1,4 @@
-import re, os, sys, imp, io, types, traceback, logging, math, glob
+import re, os, sys, imp, io, types, traceback, logging, math, glob, tempfile, pickle
 
 # Python 2/3 Compatibility
 try: import ConfigParser as configparser
@@ -63,7 +63,118 @@ def isArray( data ):
 def isDict( data ):
     '''return True if data is a dictionary'''
     return type(data) in DictionaryTypes
-    
+
+def isChunked( data ):
+    '''return True if data is a :class:`ChunkedResult`.'''
+    return isinstance( data, ChunkedResult )
+
+class ChunkedResult(object):
+    '''Base class for results that are read in chunks.
+
+    Iterating over a chunked result returns chunks. Each chunk is
+    a dictionary mapping column names to arrays of values. A chunked
+    result can be iterated over several times, each time re-reading
+    the data from the source.
+
+    Chunked results take the place of a dictionary of columns
+    in a :term:`data tree`. Transformers that can not consume
+    them incrementally receive the fully loaded columns
+    (see :meth:`asColumns`).
+    '''
+
+    def __iter__(self):
+        raise NotImplementedError( "incomplete implementation of %s" % str(self) )
+
+    def getColumnNames( self ):
+        '''return the column names.'''
+        for chunk in self:
+            return list(chunk.keys())
+        return []
+
+    def getColumn( self, column ):
+        '''return a :class:`ChunkedColumn` for *column*.'''
+        return ChunkedColumn( self, column )
+
+    def asColumns( self ):
+        '''load all chunks and return a dictionary of columns.
+
+        Returns an empty dictionary if there is no data.
+        '''
+        chunks = list( self )
+        if not chunks: return odict()
+        return odict( [ (column, numpy.concatenate( [ x[column] for x in chunks ] ) ) \
+                            for column in chunks[0].keys() ] )
+
+class ChunkedColumn(object):
+    '''a single column of a :class:`ChunkedResult`.
+
+    Iterating returns an array of values for each chunk.
+    '''
+
+    def __init__(self, result, column ):
+        self.result = result
+        self.column = column
+
+    def __iter__(self):
+        for chunk in self.result:
+            yield chunk[self.column]
+
+class SpilledLeaf(object):
+    '''a leaf of a :term:`data tree` that has been written to
+    disk in order to stay within the :term:`memory_budget`.
+
+    The data is written to a file in *directory* and is read
+    back with :meth:`load`. The file is removed once the object
+    is deleted. *nbytes* is the size of the data in memory.
+    '''
+
+    def __init__(self, data, directory, nbytes = 0 ):
+        if not os.path.exists( directory ):
+            try:
+                os.makedirs( directory )
+            except OSError:
+                pass
+        handle, self.filename = tempfile.mkstemp( dir = directory, prefix = "spill", suffix = ".pickle" )
+        with os.fdopen( handle, "wb" ) as outfile:
+            pickle.dump( data, outfile, pickle.HIGHEST_PROTOCOL )
+        self.nbytes = nbytes
+
+    def load( self ):
+        '''return the data.'''
+        with open( self.filename, "rb" ) as infile:
+            return pickle.load( infile )
+
+    def __copy__( self ):
+        # the file is shared, copies must not remove it
+        return self
+
+    def __deepcopy__( self, memo ):
+        return self
+
+    def __del__( self ):
+        try:
+            os.unlink( self.filename )
+        except (OSError, AttributeError, TypeError):
+            pass
+
+    def __repr__( self ):
+        return "<SpilledLeaf of %i bytes in %s>" % (self.nbytes, self.filename)
+
+def isSpilled( data ):
+    '''return True if data is a :class:`SpilledLeaf`.'''
+    return isinstance( data, SpilledLeaf )
+
+def getSpillDirectory():
+    '''return the directory for :class:`SpilledLeaf` data.
+
+    This is the directory ``spill`` within the :term:`cachedir` or
+    the temporary directory if caching is disabled.
+    '''
+    cachedir = PARAMS.get( "report_cachedir", None )
+    if not cachedir or cachedir == "None":
+        return tempfile.gettempdir()
+    return os.path.join( cachedir, "spill" )
+
 def isInt( obj ):
     return type(obj) in IntTypes
 
@@ -103,7 +214,17 @@ PARAMS = {
     "report_show_errors" : True,
     "report_show_warnings" : True,
     "report_sql_backend" : "sqlite:///./csvdb",
+    "report_sql_pool_size" : 5,
+    "report_sql_max_overflow" : None,
+    "report_sql_pool_timeout" : 30,
+    "report_sql_pragmas" : "",
+    "report_sql_query_cache" : False,
+    "report_sql_query_cache_size" : 256,
     "report_cachedir" : "_cache",
+    "report_file_threads" : 4,
+    "report_profile" : True,
+    "report_profile_slow" : None,
+    "report_memory_budget" : getattr( SphinxReport.Config, "sphinxreport_memory_budget", None ),
     "report_urls" : "data,code,rst",
     "report_images" : "hires,hires.png,200,eps,eps,50",
     }
@@ -280,7 +401,7 @@ def getModule( name ):
     """load module in fullpat
     """
     # remove leading '.'
-    logging.debug( "entered getModule with `%s`" % name )
+    logging.debug( "entered getModule with `%s`", name )
 
     parts = name.split(".")
     if parts[0] == "Tracker":
@@ -303,7 +424,7 @@ def getModule( name ):
     else:
         path = None
 
-    debug( "searching for module name=%s at path=%s" % (name, str(path)))
+    debug( "searching for module name=%s at path=%s", name, path )
 
     # find module
     try:
@@ -314,7 +435,7 @@ def getModule( name ):
 
     stdout = sys.stdout
     sys.stdout = io.StringIO()
-    debug( "loading module: %s: %s, %s, %s" % (name, modulefile, pathname, description) )
+    debug( "loading module: %s: %s, %s, %s", name, modulefile, pathname, description )
     # imp.load_module modifies sys.path - save original and restore
     oldpath = sys.path
 
@@ -395,7 +516,7 @@ def makeObject( path, args = (), kwargs = {} ):
     # remove leading '.'
     cls = cls[1:]
 
-    debug( "instantiating class %s" % cls )
+    debug( "instantiating class %s", cls )
 
     module, pathname = getModule( name )
 
@@ -627,6 +748,17 @@ def getTemplatesDir():
     '''returns the location of the templates.'''
     return os.path.join( os.path.dirname( __file__), "templates" )
 
+def removeSpreadSheets( blocks ):
+    """remove spread-sheets in *blocks* that have been saved
+    to temporary files but have not been moved to the output
+    directory by :class:`XLSPlugin`.
+    """
+    for xblocks in blocks:
+        for block in xblocks:
+            filename = getattr( block, "xls", None )
+            if filename and os.path.exists( filename ):
+                os.remove( filename )
+
 def layoutBlocks( blocks, layout = "column"):
     """layout blocks of rst text.
 
@@ -11,6 +11,7 @@ __all__ = [
     "ResultBlock",
     'Dispatcher',
     'DataTree',
+    'PagedTable',
     "only_directive",
     "report_directive" ]
 
@@ -17,8 +17,22 @@ on the command line.
 **-a/--num-jobs** number of jobs
     Number of jobs to start for parallel pre-processing.
 
-**-v/--verbose** verbosity level
-    Increase the number of status messages displayed.
+**--status-file** filename
+    File that the progress of the build is written to as JSON,
+    see :mod:`SphinxReport.Progress`.
+
+**--progress-interval** seconds
+    Interval for reporting the progress of the build.
+
+**--profile-slow** seconds
+    Profile directives taking longer than this number of seconds,
+    see :term:`profile_slow`.
+
+**-v/--verbose** log level
+    Minimum level of messages written to the log, for example
+    10 for debugging, 20 for information and 30 for warnings.
+    Messages below this level are discarded in the worker 
+    processes before they are formatted.
 
 """
 
@@ -32,7 +46,7 @@ Building proceeds in three phases.
 
 """
 
-from SphinxReport import report_directive, gallery, clean, Utils
+from SphinxReport import report_directive, gallery, clean, Utils, Profiler, Progress
 
 from SphinxReport.Component import *
 
@@ -40,7 +54,7 @@ from SphinxReport import Logger
 
 try:
     from multiprocessing import Process
-    from multiprocessing import Pool, Queue
+    from multiprocessing import Pool
 except ImportError:
     from threading import Thread as Process
 
@@ -90,10 +104,11 @@ def run( work ):
     """
 
     try:
-        for f, lineno, b, srcdir, builddir in work:
+        for index, (f, lineno, b, srcdir, builddir) in enumerate(work):
+            Progress.sendEvent( "start",
+                                tracker = b.mArguments[0],
+                                directive = "%s:%i" % (f, lineno) )
             ff = os.path.abspath( f )
-            debug( "build.run: profile: started: rst: %s:%i" % (ff, lineno) )
-
             report_directive.run(  b.mArguments,
                                    b.mOptions,
                                    lineno = lineno,
@@ -102,17 +117,22 @@ def run( work ):
                                    document = ff,
                                    srcdir = srcdir,
                                    builddir = builddir )
-
-            debug( "build.run: profile: finished: rst: %s:%i" % (ff,lineno) )
+            Progress.sendEvent( "finish" )
 
         return None
     except:
+        Progress.sendEvent( "failed", skipped = len(work) - index - 1 )
         exceptionType, exceptionValue, exceptionTraceback = sys.exc_info()
         exception_stack  = traceback.format_exc(exceptionTraceback)
         exception_name   = exceptionType.__module__ + '.' + exceptionType.__name__
         exception_value  = str(exceptionValue)
         return (exception_name, exception_value, exception_stack)
 
+def initWorker( log_queue, level, progress_queue ):
+    """set up logging and progress reporting in a worker process."""
+    Logger.initWorker( log_queue, level )
+    Progress.QUEUE = progress_queue
+
 def rst_reader(infile ):
     """parse infile and extract the :render: block."""
     
@@ -200,33 +220,52 @@ def buildPlots( rst_files, options, args, sourcedir ):
 
     if len(work) == 0: return
 
-    if options.num_jobs > 1:
-        logQueue = Queue(100)
-        handler= Logger.MultiProcessingLogHandler(logging.FileHandler( os.path.abspath( LOGFILE ), "w"), logQueue)
-    else:
-        handler= logging.FileHandler( os.path.abspath( LOGFILE ), "w")
-
+    handler = logging.FileHandler( os.path.abspath( LOGFILE ), "w")
     handler.setFormatter(  
         logging.Formatter( LOGGING_FORMAT ) )
 
+    # workers send log records to the main process, where
+    # they are written and counted
+    listener = Logger.LogListener( handler, options.loglevel )
+
     logging.getLogger('').addHandler(handler)
+    logging.getLogger('').addHandler(listener.counter)
     logging.getLogger('').setLevel(options.loglevel)
     
-    info('starting %i jobs on %i work items' % (options.num_jobs, len(work)))
-    debug( "build.py: profile: started: 0 seconds" )
+    ndirectives = sum( [ len(x) for x in work ] )
+    info('starting %i jobs on %i work items with %i directives' % (options.num_jobs, len(work), ndirectives))
+    Profiler.reset()
+    build_start = Profiler.event( "start", "build" )
+    # write before forking so that workers do not inherit the event
+    Profiler.flush()
+
+    progress = Progress.ProgressListener( ndirectives, 
+                                          interval = options.progress_interval,
+                                          statusfile = options.status_file )
+    progress.start()
 
     if options.num_jobs > 1:
-        pool = Pool( options.num_jobs )
+        listener.start()
+        pool = Pool( options.num_jobs, initWorker, 
+                     (listener.queue, options.loglevel, progress.queue) )
         # todo: async execution with timeouts
         #res = pool.map_async( run, work )
         errors = pool.map( run, work )
         pool.close()
         pool.join()
+        listener.stop()
     else:
+        Progress.QUEUE = progress.queue
         errors = []
         for w in work: errors.append( run( w ) )
+        Progress.QUEUE = None
+
+    Profiler.event( "finish", "build", start = build_start, 
+                    jobs = options.num_jobs, work = len(work) )
+    Profiler.flush()
 
     errors = [ e for e in errors if e ]
+    progress.stop( "failed" if errors else "finished" )
             
     if errors:
         print("SphinxReport caught %i exceptions" % (len(errors)))
@@ -236,15 +275,14 @@ def buildPlots( rst_files, options, args, sourcedir ):
         print("## end of exceptions")
         sys.exit(1)
 
-    if options.num_jobs > 1:
-        counts = handler.getCounts()
-
-        print("SphinxReport: messages: %i critical, %i errors, %i warnings, %i info, %i debug" \
-            % (counts["CRITICAL"],
-               counts["ERROR"],
-               counts["WARNING"],
-               counts["INFO"],
-               counts["DEBUG"] ))
+    counts = listener.getCounts()
+
+    print("SphinxReport: messages: %i critical, %i errors, %i warnings, %i info, %i debug" \
+        % (counts["CRITICAL"],
+           counts["ERROR"],
+           counts["WARNING"],
+           counts["INFO"],
+           counts["DEBUG"] ))
     
     logging.shutdown()
 
@@ -323,10 +361,22 @@ def main( argv = None ):
                        help="number of parallel jobs to run [default=%default]" )
  
     parser.add_option( "-v", "--verbose", dest="loglevel", type="int",
-                       help="loglevel. The higher, the more output [default=%default]" )
+                       help="loglevel. The lower, the more output [default=%default]" )
+ 
+    parser.add_option( "--status-file", dest="status_file", type="string",
+                       help="file to write the progress of the build to [default=%default]" )
+
+    parser.add_option( "--progress-interval", dest="progress_interval", type="float",
+                       help="interval in seconds for reporting progress [default=%default]" )
+ 
+    parser.add_option( "--profile-slow", dest="profile_slow", type="float",
+                       help="profile directives taking longer than this number of seconds [default=%default]" )
  
     parser.set_defaults( num_jobs = 2,
-                         loglevel = 10, )
+                         loglevel = 10,
+                         status_file = Progress.STATUSFILE,
+                         progress_interval = 5,
+                         profile_slow = None )
 
     parser.disable_interspersed_args()
     
@@ -334,6 +384,9 @@ def main( argv = None ):
 
     assert args[0].endswith( "sphinx-build" ), "command line should contain sphinx-build"
 
+    if options.profile_slow:
+        Utils.PARAMS["report_profile_slow"] = options.profile_slow
+
     sphinx_parser = optparse.OptionParser( version = "%prog version: $Id$", usage = USAGE )
     sphinx_parser.add_option( "-b", type = "string" )
     sphinx_parser.add_option( "-a" )
@@ -373,7 +426,5 @@ def main( argv = None ):
 
     print("SphinxReport: finished in %i seconds" % (time.time() - t ))
 
-    debug( "build.py: profile: finished: %i seconds" % (time.time() - t ))
-
 if __name__ == "__main__":
     sys.exit(main())
@@ -83,6 +83,13 @@ def deleteFiles( test_f, dirs_to_check = (".",), dry_run = False ):
     removed = []
     for d in dirs_to_check:
         for root, dirs, files in os.walk(d):
+            # tables in columnar format are saved as directories
+            for f in [ x for x in dirs if x.endswith( ".table" ) ]:
+                if test_f( f ):
+                    ff = os.path.join( root, f) 
+                    if not dry_run: shutil.rmtree( ff, ignore_errors = True )
+                    removed.append( ff )
+                    dirs.remove( f )
             for f in files:
                 if test_f( f ):
                     try:
@@ -113,7 +120,9 @@ def removeTracker( tracker,
     rx3 = re.compile("_%s%s" % (pattern,".code") )
     # .html files
     rx4 = re.compile("_%s%s" % (pattern,".html") )
-    test_f = lambda x: rx1.search(x) or rx2.search(x) or rx3.search(x) or rx4.search(x)
+    # .table directories
+    rx5 = re.compile("_%s%s" % (pattern,".table") )
+    test_f = lambda x: rx1.search(x) or rx2.search(x) or rx3.search(x) or rx4.search(x) or rx5.search(x)
 
     return deleteFiles( test_f, dirs_to_check, dry_run = dry_run )
 
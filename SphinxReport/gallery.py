@@ -6,8 +6,9 @@
 sphinxreport-gallery
 --------------------
 
-The :file:`sphinxreport-gallery` utility examines the build directory for images
-and constructs a gallery. It should be called from the :term:`source directory`.
+The :file:`sphinxreport-gallery` utility reads the index of images created
+during the build and constructs a gallery. Thumbnails are only created for
+new or changed images. It should be called from the :term:`source directory`.
 
    $ sphinxreport-gallery
 
@@ -17,6 +18,8 @@ is used.
 
 import os, glob, re, collections, sys
 
+from SphinxReport import Thumbnails
+
 template = """\
 {%% extends "layout.html" %%}
 {%% set title = "Thumbnail gallery" %%}
@@ -95,45 +98,33 @@ def main( argv = sys.argv ):
                     x = rx.search( l )
                     if x: map_image2file[x.groups()[0]].add( fn[len(basedir)+1:] )
 
+    thumbdir = os.path.join(rootdir, 'thumbnails')
+    images = Thumbnails.readImages( thumbdir )
+    if not images:
+        print("no images recorded in '%s' - no gallery created" % thumbdir)
+        return 0
+    Thumbnails.writeImages( thumbdir, images )
+
+    # only new or changed images are converted
+    print("SphinxReport: updating thumbnails in %s" % thumbdir)
+    thumbnails = Thumbnails.ThumbnailCache( thumbdir ).update( 
+        [ x["filename"] for x in images.values() ] )
+
     data = []
-    for subdir in ( '', ):
-        thisdir = os.path.join(rootdir,subdir)
-        if not os.path.exists(thisdir):
-            print("no directory '%s' - no gallery created" % thisdir)
-            return 
-        thumbdir = os.path.join(thisdir, 'thumbnails')
-        if not os.path.exists(thumbdir):
-            print("no thumbnail directory '%s' - no gallery created" % thumbdir)
-            return 0
-
-        print("SphinxReport: collecting thumbnails from %s" % thumbdir)
-
-        # we search for pdfs here because there is one pdf for each
-        # successful image build (2 pngs since one is high res) and the
-        # mapping between py files and images is 1->many
-        for captionfile in sorted(glob.glob(os.path.join(thisdir, '*.txt'))):
-            basepath, filename = os.path.split(captionfile)
-            basename, ext = os.path.splitext(filename)
-            # print 'generating', subdir, basename
-
-            if basename in skips: continue
-
-            pdffile = os.path.join(thisdir, '%s.pdf' % basename)
-            pngfile = os.path.join(thisdir, '%s.png' % basename)
-            thumbfile = os.path.join(thumbdir, '%s.png' % basename)
-            # captionfile = os.path.join(thumbdir, '%s.txt' % basename)
-            if not os.path.exists(pngfile): pngfile = None
-            if not os.path.exists(thumbfile): thumbfile = None
-
-            try:
-                datasource, renderer, options = basename.split(SEPARATOR)
-            except ValueError:
-                print("could not parse %s into three components" % basename)
-                continue
-
-            #print 'datasource=', datasource, "renderer=", renderer, "filename=",filename, "basename=",basename, "ext=",ext
-            #print 'pngfile', pngfile, "thumbfile", thumbfile
-            data.append( (datasource, subdir, thisdir, renderer, basename, pngfile, thumbfile, captionfile))
+    subdir, thisdir = '', rootdir
+    for basename, entry in images.items():
+        if basename in skips: continue
+
+        pngfile = entry["filename"]
+        thumbfile = thumbnails[pngfile]
+
+        try:
+            datasource, renderer, options = basename.split(SEPARATOR)
+        except ValueError:
+            print("could not parse %s into three components" % basename)
+            continue
+
+        data.append( (datasource, subdir, thisdir, renderer, basename, pngfile, thumbfile, entry["caption"]))
     link_template = """
     <td>
     <table>
@@ -159,7 +150,7 @@ def main( argv = sys.argv ):
     print("SphinxReport: creating %i thumbnails" % len(data))
     col = 0
     last_datasource = None
-    for (datasource, subdir, thisdir, renderer, basename, pngfile, thumbfile, captionfile) in data:
+    for (datasource, subdir, thisdir, renderer, basename, pngfile, thumbfile, caption) in data:
         if datasource != last_datasource:
             if last_datasource:
                 rows.append( "</tr></table>" )
@@ -177,10 +168,7 @@ def main( argv = sys.argv ):
             hires = os.path.join( thisdir, basename ) + ".hires.png"
             pdf = os.path.join( thisdir, basename ) + ".pdf"
 
-            if os.path.exists(captionfile): 
-                caption = "".join( open(captionfile,"r").readlines() )
-            else: 
-                caption = "no caption"
+            if not caption: caption = "no caption"
 
             rows.append( link_template % locals() )
 
@@ -197,7 +185,7 @@ def main( argv = sys.argv ):
 
     rows.append( "</tr></table>" )
 
-    fh = file(dest, 'w')
+    fh = open(dest, 'w')
     fh.write(template%'\n'.join(rows))
     fh.close()
 
@@ -4,87 +4,369 @@
 sphinxreport-profile
 ====================
 
-:command:`sphinxreport-profile` examines the log file and
+:command:`sphinxreport-profile` examines the profiling events
+written during a build (see :mod:`SphinxReport.Profiler`) and 
 computes some summary statistics on rendering times.
 
-   sphinxreport-profile
+   sphinxreport-profile [sphinxreport.profile]
 
 The full list of command line options is listed by suppling :option:`-h/--help`
 on the command line. The options are:
 
 **-s/--section** choice
-   Only examine performance of certain aspects of sphinxreport. Possible choices are
-   ``tracker``, ``rst``, and ``renderer``.
+   Only examine performance of certain stages of sphinxreport. Possible 
+   choices are ``build``, ``directive``, ``collect``, ``tracker``, ``transform``, ``transformer``, 
+   ``restrict``, ``exclude``, ``prune``, ``group``, ``render`` and
+   ``collect-images``.
 
 **-t/--time** choice
    Report times either as ``milliseconds`` or ``seconds``.
 
+**-f/--filter** choice
+   Only output ``running``, ``completed`` or ``all`` objects.
+
+**-m/--mode** choice
+   The type of report to output. ``sections`` summarizes each
+   stage by object. ``directives`` lists the wall time, CPU time, 
+   increase in peak memory, number of leaves and size of dataframes 
+   for every stage and tracker path of each directive. ``flamegraph``
+   outputs folded stacks in microseconds that can be converted to 
+   a flame graph with `flamegraph.pl <https://github.com/brendangregg/FlameGraph>`_.
+   ``timeline`` lists the directives processed by each worker during
+   :command:`sphinxreport-build` with their start and end times. ``critical``
+   computes the idle time of each worker in the ``buildPlots`` phase and 
+   lists the directives on the critical path, i.e., those processed by
+   the worker finishing last. ``top`` ranks the slowest trackers, 
+   transformers and renderers.
+
+**-n/--top** number
+   Number of objects to output in ``top`` mode.
+
+**-c/--compare** filename
+   Compare the total time per stage and object with a previous
+   profile in *filename*. Objects that have become slower by more
+   than :option:`--threshold` are flagged as regressions and
+   the exit status is 1.
+
+**--threshold** fraction
+   Relative increase in time that counts as a regression.
+
+**--min-time** seconds
+   Ignore differences smaller than this when comparing profiles.
+
 .. note::
 
    All times are wall clock times.
 
 """
 
-import sys, os, imp, io, re, types, glob, optparse, shutil, datetime, logging
+import sys, os, re, optparse, json, logging
 import collections
 
-USAGE = """python %s [OPTIONS] target
-
-clean all data according to target.
+USAGE = """python %s [OPTIONS] [profile]
 
-Targets can contain wild cards.
+summarize profiling events of sphinxreport.
 
 """ % sys.argv[0]
 
-from SphinxReport import Component
+from SphinxReport import Profiler
+
+STAGES = ( "build", "directive", "collect", "tracker", "transform", "transformer", "restrict",
+           "exclude", "prune", "group", "render", "collect-images" )
+
+def readEvents( infile ):
+    '''iterate over profiling events in *infile*.'''
+    for line in infile:
+        try:
+            yield json.loads( line )
+        except ValueError:
+            logging.warn( "malformatted line in profile: %s" % line[:-1] )
+
+def getSpans( events ):
+    '''match start and finish events.
 
-class Counter(object):
+    returns a tuple of finished spans and of unfinished start
+    events. Spans are the finish events with an additional
+    field ``duration``.
     '''
-    
-    This class stores the calls per source as calls can be made by
-    different sources in any order.
+    def key( x, t ):
+        return ( x["pid"], x["stage"], x["name"], x["directive"], t )
+
+    started = collections.OrderedDict()
+    spans = []
+    for event in events:
+        if event["event"] == "start":
+            started[key( event, event["time"] )] = event
+        else:
+            started.pop( key( event, event["start"] ), None )
+            event["duration"] = event["time"] - event["start"]
+            spans.append( event )
+    return spans, list( started.values() )
+
+def getObject( event ):
+    '''return the object profiled by *event*.'''
+    if event["name"]: return event["name"]
+    return event["directive"]
+
+def getLabel( span ):
+    '''return a label for *span* in reports.'''
+    if span["stage"] == "directive": return span["directive"]
+    label = "%s:%s" % (span["stage"], span["name"])
+    if "path" in span: label += ":%s" % span["path"]
+    return label
+
+def getStacks( spans ):
+    '''return folded stacks from *spans*.
+
+    Spans are nested by time within each process.
+
+    returns a dictionary mapping stacks to time in seconds
+    spent within the top of the stack.
     '''
+    stacks = collections.defaultdict( float )
+    by_process = collections.defaultdict( list )
+    for span in spans: by_process[span["pid"]].append( span )
+
+    for pid, spans in by_process.items():
+        # sort by start time and with outer spans first
+        spans.sort( key = lambda x: ( x["start"], -x["time"] ) )
+        stack = []
+        for span in spans:
+            while stack and stack[-1]["time"] <= span["start"]:
+                stack.pop()
+            parent = tuple( [ span["worker"] ] + [ getLabel( x ) for x in stack ] )
+            stacks[parent + ( getLabel( span ), )] += span["duration"]
+            # remove time spent in children from parent
+            if stack: stacks[parent] -= span["duration"]
+            stack.append( span )
+    return stacks
+
+def writeSections( outfile, spans, unfinished, sections, filter, f ):
+    '''summarize *spans* per object for each stage in *sections*.'''
+
+    for section in sections:
+        durations = collections.defaultdict( list )
+        running = collections.defaultdict( list )
+        for span in spans:
+            if span["stage"] == section: durations[getObject(span)].append( span["duration"] )
+        for event in unfinished:
+            if event["stage"] == section: running[getObject(event)].append( event )
+
+        outfile.write( "\t".join( ("section", "object", "ncalls", "duration", "percall", "running") ) + "\n" )
+
+        for objct in sorted( set( durations.keys() ).union( running.keys() ) ):
+            ncalls, nrunning = len(durations[objct]), len(running[objct])
 
-    def __init__(self):
-        self._durations = collections.defaultdict( list )
-        self._started = collections.defaultdict( int )
-        self._calls = collections.defaultdict( int )
-
-    def add( self, started, dt, source = None ):
-        if self._started[source] != 0 and not started:
-            self._durations[source].append( dt - self._started[source] )            
-            self._started[source] = 0
-        elif self._started[source] == 0 and started:
-            self._calls[source] += 1
-            self._started[source] = dt
-        else:
-            raise ValueError("inconsistent time points, has_started=%s, is_started=%s" % (self._started[source], started))
-
-    def reset( self, source = None):
-        '''reset last event.'''
-        self._started[source] = None
-        self._calls[source] = 0
-
-    def getDuration( self ): 
-        if self._durations:
-            x = None
-            for source, durations in self._durations.items():
-                if x == None: x = durations[0] 
-                for y in durations[1:]: x += y
-            return x
-        else:
-            return datetime.timedelta()
-        
-    def getCalls( self ): 
-        return sum( self._calls.values() )
+            # apply filters
+            if filter in ("unfinished", "running") and nrunning == 0: 
+                continue
+            if filter == "completed" and nrunning > 0: 
+                continue
+
+            d = f( sum( durations[objct] ) )
+            if ncalls > 0:
+                percall = "%6.3f" %( d / float(ncalls))
+            else:
+                percall = "na"
 
-    def getRunning( self ):
-        '''get numbers of tasks unfinished or still running.'''
-        return len( [x for x,y in self._started.items() if y != 0 ] )
+            outfile.write( "\t".join( \
+                    (list(map( str, \
+                              (section, objct, 
+                               ncalls,
+                               "%6.3f" % d,
+                               percall,
+                               nrunning,
+                               ))))) + "\n" )
 
-    duration = property(getDuration)
-    calls = property(getCalls)
-    running = property(getRunning)
+        outfile.write( "running\n" )
+        outfile.write( "".join( [ "%s\t%s\n" % (x["worker"], x["directive"]) for x in unfinished \
+                                      if x["stage"] == section ] ) )
+        outfile.write( "\n" * 3 )
+
+def writeDirectives( outfile, spans, sections, f ):
+    '''output a table with all stages of each directive.'''
+
+    outfile.write( "\t".join( ("directive", "stage", "object", "path", "wall", "cpu", 
+                                "rss", "leaves", "bytes" ) ) + "\n" )
+    spans = [ x for x in spans if x["directive"] and x["stage"] in sections ]
+    spans.sort( key = lambda x: ( x["directive"], x["start"] ) )
+    for span in spans:
+        outfile.write( "\t".join( map( str, 
+                                        ( span["directive"],
+                                          span["stage"],
+                                          span["name"],
+                                          span.get( "path", "" ),
+                                          "%6.3f" % f( span["duration"] ),
+                                          "%6.3f" % f( span.get( "cpu", 0 ) ),
+                                          span.get( "rss", "" ),
+                                          span.get( "leaves", "" ),
+                                          span.get( "bytes", "" ) ) ) ) + "\n" )
+
+def writeFlamegraph( outfile, spans ):
+    '''output *spans* as folded stacks in microseconds.'''
+    for stack, duration in sorted( getStacks( spans ).items() ):
+        outfile.write( "%s %i\n" % (";".join( stack ), max( 0, int( duration * 1000000 ) ) ) )
+
+def getBuildWindow( spans ):
+    '''return start and end time of the last build in *spans*.
+
+    If there is no build event, the window spans all events.
+    '''
+    builds = [ x for x in spans if x["stage"] == "build" ]
+    if builds: 
+        build = builds[-1]
+        return build["start"], build["time"]
+    if not spans: return 0, 0
+    return min( [ x["start"] for x in spans ] ), max( [ x["time"] for x in spans ] )
+
+def getTimeline( spans ):
+    '''return directives processed by each worker.
+
+    returns a dictionary mapping workers to a list of directive 
+    spans sorted by start time.
+    '''
+    timeline = collections.defaultdict( list )
+    for span in spans:
+        if span["stage"] == "directive": timeline[span["worker"]].append( span )
+    for spans in timeline.values():
+        spans.sort( key = lambda x: x["start"] )
+    return timeline
+
+def getCriticalPath( spans ):
+    '''analyse the parallel execution of the build in *spans*.
+
+    returns a dictionary with the following items:
+
+    makespan
+       the time between start and finish of the build
+    busy, idle
+       dictionaries mapping workers to time spent on directives and
+       to time without work during the build
+    path
+       the directives processed by the worker that finished last.
+       These determine the duration of the build.
+    bound
+       a lower bound of the makespan given the number of workers,
+       the larger of the total work divided by the number of workers
+       and the longest directive.
+    '''
+    start, end = getBuildWindow( spans )
+    timeline = getTimeline( [ x for x in spans if x["start"] >= start and x["time"] <= end ] )
+
+    makespan = end - start
+    busy = dict( [ (worker, sum( [ x["duration"] for x in directives ] ) ) \
+                       for worker, directives in timeline.items() ] )
+    idle = dict( [ (worker, makespan - x) for worker, x in busy.items() ] )
+
+    path = []
+    if timeline:
+        last = max( timeline.keys(), key = lambda x: timeline[x][-1]["time"] )
+        path = timeline[last]
+        longest = max( [ max( [ y["duration"] for y in x ] ) for x in timeline.values() ] )
+        bound = max( sum( busy.values() ) / len(timeline), longest )
+    else:
+        bound = 0
+
+    return { "makespan" : makespan, "busy" : busy, "idle" : idle, "path" : path, "bound" : bound }
+
+def getTotals( spans, stages ):
+    '''return total time, number of calls and maximum time for 
+    each stage and object in *stages*.'''
+    totals = collections.defaultdict( lambda: [0, 0, 0] )
+    for span in spans:
+        if span["stage"] not in stages: continue
+        x = totals[(span["stage"], getObject( span ))]
+        x[0] += span["duration"]
+        x[1] += 1
+        x[2] = max( x[2], span["duration"] )
+    return totals
+
+def compareProfiles( old_spans, new_spans, stages, threshold, min_time ):
+    '''compare total times per stage and object.
+
+    returns a list of tuples (stage, object, old time, new time, 
+    relative change, status) sorted by the absolute change. Status
+    is ``regression`` if the time increased by more than *threshold* 
+    and *min_time*, ``improvement`` if it decreased by as much, 
+    ``new`` or ``removed`` for objects only present in one profile
+    and empty otherwise.
+    '''
+    old_totals, new_totals = getTotals( old_spans, stages ), getTotals( new_spans, stages )
+    result = []
+    for key in set( old_totals.keys() ).union( new_totals.keys() ):
+        old = old_totals[key][0] if key in old_totals else None
+        new = new_totals[key][0] if key in new_totals else None
+        if old is None: 
+            change, status = None, "new"
+        elif new is None:
+            change, status = None, "removed"
+        else:
+            change = ( new - old ) / old if old > 0 else None
+            status = ""
+            if abs( new - old ) >= min_time and change is not None:
+                if change > threshold: status = "regression"
+                elif change < -threshold: status = "improvement"
+        result.append( key + ( old, new, change, status ) )
+
+    result.sort( key = lambda x: -abs( ( x[3] or 0 ) - ( x[2] or 0 ) ) )
+    return result
+
+def writeTimeline( outfile, spans, f ):
+    '''output the directives processed by each worker.'''
+    start, end = getBuildWindow( spans )
+    outfile.write( "\t".join( ("worker", "directive", "start", "end", "duration") ) + "\n" )
+    for worker, directives in sorted( getTimeline( spans ).items() ):
+        for x in directives:
+            outfile.write( "%s\t%s\t%6.3f\t%6.3f\t%6.3f\n" % \
+                               (worker, x["directive"], f( x["start"] - start ), 
+                                f( x["time"] - start ), f( x["duration"] ) ) )
+
+def writeCriticalPath( outfile, spans, f ):
+    '''output idle times and the critical path of the build.'''
+    result = getCriticalPath( spans )
+    makespan = result["makespan"]
+    outfile.write( "makespan\t%6.3f\n" % f( makespan ) )
+    outfile.write( "lower bound\t%6.3f\n" % f( result["bound"] ) )
+    outfile.write( "\n" )
+    outfile.write( "\t".join( ("worker", "busy", "idle", "utilization") ) + "\n" )
+    for worker in sorted( result["busy"].keys() ):
+        outfile.write( "%s\t%6.3f\t%6.3f\t%5.1f%%\n" % \
+                           (worker, f( result["busy"][worker] ), f( result["idle"][worker] ),
+                            100.0 * result["busy"][worker] / makespan if makespan else 0 ) )
+    outfile.write( "\n" )
+    outfile.write( "\t".join( ("critical path", "duration") ) + "\n" )
+    for x in result["path"]:
+        outfile.write( "%s\t%6.3f\n" % (x["directive"], f( x["duration"] ) ) )
+
+def writeTop( outfile, spans, sections, ntop, f ):
+    '''output the *ntop* slowest objects in each stage.'''
+    totals = getTotals( spans, sections )
+    outfile.write( "\t".join( ("stage", "object", "ncalls", "total", "percall", "max") ) + "\n" )
+    for section in sections:
+        rows = [ (key[1], x) for key, x in totals.items() if key[0] == section ]
+        rows.sort( key = lambda x: -x[1][0] )
+        for objct, (total, ncalls, longest) in rows[:ntop]:
+            outfile.write( "%s\t%s\t%i\t%6.3f\t%6.3f\t%6.3f\n" % \
+                               (section, objct, ncalls, f( total ), f( total / ncalls ), f( longest ) ) )
+
+def writeComparison( outfile, old_spans, new_spans, sections, threshold, min_time, f ):
+    '''output the comparison of two profiles.
+
+    returns the number of regressions.
+    '''
+    def fmt( x ):
+        if x is None: return "na"
+        return "%6.3f" % f( x )
+
+    outfile.write( "\t".join( ("stage", "object", "old", "new", "change", "status") ) + "\n" )
+    nregressions = 0
+    for stage, objct, old, new, change, status in compareProfiles( old_spans, new_spans, 
+                                                                    sections, threshold, min_time ):
+        if status == "regression": nregressions += 1
+        if change is None: change = "na"
+        else: change = "%+5.1f%%" % (100.0 * change)
+        outfile.write( "\t".join( (stage, str(objct), fmt( old ), fmt( new ), change, status) ) + "\n" )
+    return nregressions
 
 def main( argv = None ):
 
@@ -93,7 +375,7 @@ def main( argv = None ):
     parser = optparse.OptionParser( version = "%prog version: $Id$", usage = USAGE )
 
     parser.add_option( "-s", "--section", dest="sections", type="choice", action="append",
-                       choices=("tracker", "rst", "renderer"),
+                       choices=STAGES,
                        help="only examine certain sections [default=%default]" )
 
     parser.add_option( "-t", "--time", dest="time", type="choice",
@@ -104,112 +386,74 @@ def main( argv = None ):
                        choices=("unfinished", "running", "completed", "all" ),
                        help="apply filter to output [default=%default]" )
 
+    parser.add_option( "-m", "--mode", dest="mode", type="choice",
+                       choices=("sections", "directives", "flamegraph", 
+                                "timeline", "critical", "top" ),
+                       help="type of report to output [default=%default]" )
+
+    parser.add_option( "-n", "--top", dest="top", type="int",
+                       help="number of objects to output in top mode [default=%default]" )
+
+    parser.add_option( "-c", "--compare", dest="compare", type="string",
+                       help="compare with a previous profile [default=%default]" )
+
+    parser.add_option( "--threshold", dest="threshold", type="float",
+                       help="relative increase in time that is a regression [default=%default]" )
+
+    parser.add_option( "--min-time", dest="min_time", type="float",
+                       help="ignore differences below this number of seconds [default=%default]" )
+
     parser.set_defaults( sections = [],
                          filter = "all",
+                         mode = "sections",
+                         top = 10,
+                         compare = None,
+                         threshold = 0.2,
+                         min_time = 0.1,
                          time = "seconds" )
 
-    (options, args) = parser.parse_args()
-
-    rx = re.compile("^[0-9]+" )
+    (options, args) = parser.parse_args( argv[1:] )
 
     if options.sections:
         profile_sections = options.sections
+    elif options.mode == "directives":
+        profile_sections = STAGES
+    elif options.mode == "top" or options.compare:
+        profile_sections = ("tracker", "transformer", "render" )
     else:
-        profile_sections = ("rst", "tracker", "renderer", "transformer" )
-
-    counts = {}
-    for section in profile_sections:
-        counts[section] = collections.defaultdict( Counter )
-
-    rootpath = os.path.abspath(".")
+        profile_sections = ("directive", "collect", "transformer", "render" )
 
     if len(args) == 1:
         infile = open( args[0] )
     else:
-        infile = open( Component.LOGFILE )
+        infile = open( Profiler.PROFILEFILE )
 
-    for line in infile:
-        if not rx.match( line ): continue
-        data = line[:-1].split()
-        if len(data) < 5: continue
-        date, time, level, source, action = data[:5]
-
-        if action != "profile:": continue
-
-        dt = datetime.datetime.strptime( " ".join( (date, time) ), "%Y-%m-%d %H:%M:%S,%f")
-
-        try:
-            started, section = data[5:7]
-            point = re.sub( "object at .*>","", " ".join(data[7:]))
-            if point.startswith("<"): point = point[1:]
-            point = re.sub( rootpath, "", point )
-        except (IndexError, ValueError):
-            print(data[5:])
-            print("malformatted line in logfile: %s" % line) 
-            continue
-
-        if section.endswith( ":" ): section = section[:-1]
-        
-        if source == "report_directive.run:": continue
-        is_start = started == "started:"
-
-        if source == "build.py:":
-            if is_start:
-                logging.info( "resetting counts at line=%s" % line[:-1] )
-                counts = {}
-                for s in profile_sections:
-                    counts[s] = collections.defaultdict( Counter )
-            continue
-
-        try:
-            counts[section][point].add( is_start, dt, source )
-        except ValueError as msg:
-            # if there are errors, there is no finish, reset counter
-            if is_start: counts[section][point].reset( source )
-            try:
-                counts[section][point].add( is_start, dt, source )
-            except ValueError as msg:
-                logging.warn( "%s: line=%s" % (msg,line) )
-            except KeyError as msg:
-                print(data)
-                print("error in line: (is_start=%s), msg='%s', %s" % (is_start,msg,line))
+    spans, unfinished = getSpans( readEvents( infile ) )
+    infile.close()
 
     if options.time == "milliseconds":
-        f = lambda d: d.seconds + d.microseconds / 1000
+        f = lambda d: d * 1000.0
     elif options.time == "seconds":
-        f = lambda d: d.seconds + d.microseconds / 1000000
-
-    for section in profile_sections:
-        sys.stdout.write( "\t".join( ("section", "object", "ncalls", "duration", "percall", "running") ) + "\n" )
-
-        running = []
-        for objct, c in counts[section].items():
-            
-            # apply filters
-            if options.filter in ("unfinished", "running") and c.running == 0: 
-                continue
-
-            d = f(c.duration)
-            if c.calls > 0:
-                percall = "%6.3f" %( d / float(c.calls))
-            else:
-                percall = "na"
-
-
-            sys.stdout.write( "\t".join( \
-                    (list(map( str, \
-                              (section, objct, 
-                               c.calls,
-                               d,
-                               percall,
-                               c.running,
-                               ))))) + "\n" )
-            
-            running.extend( [x for x,y in c._started.items() if y != 0 ] )
-
-        print("running")
-        print("\n".join( map(str, running ))) 
-        sys.stdout.write( "\n" * 3 )
+        f = lambda d: d
+
+    if options.compare:
+        with open( options.compare ) as inf:
+            old_spans, old_unfinished = getSpans( readEvents( inf ) )
+        nregressions = writeComparison( sys.stdout, old_spans, spans, profile_sections,
+                                        options.threshold, options.min_time, f )
+        if nregressions > 0: return 1
+    elif options.mode == "sections":
+        writeSections( sys.stdout, spans, unfinished, profile_sections, options.filter, f )
+    elif options.mode == "directives":
+        writeDirectives( sys.stdout, spans, profile_sections, f )
+    elif options.mode == "flamegraph":
+        writeFlamegraph( sys.stdout, spans )
+    elif options.mode == "timeline":
+        writeTimeline( sys.stdout, spans, f )
+    elif options.mode == "critical":
+        writeCriticalPath( sys.stdout, spans, f )
+    elif options.mode == "top":
+        writeTop( sys.stdout, spans, profile_sections, options.top, f )
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -17,7 +17,7 @@ import traceback
 
 from docutils.parsers.rst import directives
 
-from SphinxReport import Config, Dispatcher, Utils, Cache
+from SphinxReport import Config, Dispatcher, Utils, Cache, Profiler
 from SphinxReport.ResultBlock import ResultBlock, ResultBlocks
 from SphinxReport.Component import *
 
@@ -50,11 +50,61 @@ def run(arguments,
 
     *srdir* - top level directory of rst documents
     *builddir* - build directory
+
+    If the :term:`profile_slow` option is set, directives taking
+    longer are profiled, see :class:`Profiler.sampleSlow`. The 
+    profile is saved next to the output of the directive.
     """
 
-    tag = "%s:%i" % (str(document), lineno)
+    threshold = Utils.PARAMS.get( "report_profile_slow", None )
+    if not threshold:
+        return runDirective( arguments, options, lineno, content, 
+                             state_machine, document, srcdir, builddir )
+
+    tracker_name = directives.uri(arguments[0])
+    outdir = Utils.buildPaths( tracker_name )[4]
+    filename = os.path.join( outdir, Utils.quote_filename( \
+            Config.SEPARATOR.join( (tracker_name, os.path.basename( str(document) ), str(lineno) ) ) ) + ".slow" )
+
+    with Profiler.sampleSlow( float(threshold), filename, "%s:%i" % (str(document), lineno) ):
+        return runDirective( arguments, options, lineno, content, 
+                             state_machine, document, srcdir, builddir )
+
+def runDirective(arguments, 
+                 options, 
+                 lineno, 
+                 content, 
+                 state_machine = None, 
+                 document = None,
+                 srcdir = None,
+                 builddir = None ):
+    """process :report: directive, see :func:`run`.
+
+    The profiling events of the directive are completed even
+    if processing returns early or fails.
+    """
+
+    Profiler.setDirective( "%s:%i" % (str(document), lineno) )
+    directive_start = Profiler.event( "start", "directive" )
+    try:
+        return processDirective( arguments, options, lineno, content, 
+                                 state_machine, document, srcdir, builddir )
+    finally:
+        Profiler.event( "finish", "directive", start = directive_start )
+        Profiler.setDirective( None )
+        Profiler.flush()
+
+def processDirective(arguments, 
+                     options, 
+                     lineno, 
+                     content, 
+                     state_machine = None, 
+                     document = None,
+                     srcdir = None,
+                     builddir = None ):
+    """process :report: directive, see :func:`runDirective`."""
 
-    logging.debug( "report_directive.run: profile: started: rst: %s" % tag )
+    tag = "%s:%i" % (str(document), lineno)
 
     # sort out the paths
     # reference is used for time-stamping
@@ -89,16 +139,13 @@ def run(arguments,
     # path relative to source (for images)
     root2builddir = os.path.join( os.path.relpath( builddir, start = srcdir ), outdir )
 
-    logging.debug( "report_directive.run: arguments=%s, options=%s, lineno=%s, content=%s, document=%s" % (str(arguments),
-                                                                                                           str(options),
-                                                                                                           str(lineno),
-                                                                                                           str(content),
-                                                                                                           str(document)))
+    logging.debug( "report_directive.run: arguments=%s, options=%s, lineno=%s, content=%s, document=%s",
+                   arguments, options, lineno, content, document )
 
-    logging.debug( "report_directive.run: plotdir=%s, basename=%s, ext=%s, fname=%s, rstdir=%s, srcdir=%s, builddir=%s" %\
-                       (tracker_name, basename, ext, fname, rstdir, srcdir, builddir ) )
-    logging.debug( "report_directive.run: tracker_name=%s, basedir=%s, rst2src=%s, root2build=%s, outdir=%s, codename=%s" %\
-                   (tracker_name, basedir, rst2srcdir, rst2builddir, outdir, codename))
+    logging.debug( "report_directive.run: plotdir=%s, basename=%s, ext=%s, fname=%s, rstdir=%s, srcdir=%s, builddir=%s",
+                   tracker_name, basename, ext, fname, rstdir, srcdir, builddir )
+    logging.debug( "report_directive.run: tracker_name=%s, basedir=%s, rst2src=%s, root2build=%s, outdir=%s, codename=%s",
+                   tracker_name, basedir, rst2srcdir, rst2builddir, outdir, codename )
 
     # try to create. If several processes try to create it,
     # testing with `if` will not work.
@@ -118,7 +165,7 @@ def run(arguments,
     except ValueError as msg:
         logging.warn( "failure while updating options: %s" % msg )
 
-    logging.debug( "report_directive.run: options=%s" % (str(options),) )
+    logging.debug( "report_directive.run: options=%s", options )
 
     transformer_names = []
     renderer_name = None
@@ -133,11 +180,11 @@ def run(arguments,
     tracker_options = Utils.selectAndDeleteOptions( options, option_map["tracker"] )
     display_options = Utils.selectAndDeleteOptions( options, option_map["display"] )
 
-    logging.debug( "report_directive.run: renderer options: %s" % str(renderer_options) )
-    logging.debug( "report_directive.run: transformer options: %s" % str(transformer_options) )
-    logging.debug( "report_directive.run: dispatcher options: %s" % str(dispatcher_options) )
-    logging.debug( "report_directive.run: tracker options: %s" % str(tracker_options) )
-    logging.debug( "report_directive.run: display options: %s" % str(display_options) )
+    logging.debug( "report_directive.run: renderer options: %s", renderer_options )
+    logging.debug( "report_directive.run: transformer options: %s", transformer_options )
+    logging.debug( "report_directive.run: dispatcher options: %s", dispatcher_options )
+    logging.debug( "report_directive.run: tracker options: %s", tracker_options )
+    logging.debug( "report_directive.run: display options: %s", display_options )
 
     if "transform" in display_options: 
         transformer_names = display_options["transform"].split(",")
@@ -163,7 +210,7 @@ def run(arguments,
             Config.SEPARATOR.join( (tracker_name, renderer_name, options_hash ) ))
         filename_text = os.path.join( outdir, "%s.txt" % (template_name))
 
-        logging.debug( "report_directive.run: options_hash=%s" %  options_hash)
+        logging.debug( "report_directive.run: options_hash=%s", options_hash )
 
         ###########################################################
         # check for existing files
@@ -187,20 +234,20 @@ def run(arguments,
                     x = query.search( line )
                     if x: filenames.extend( list( x.groups()) )
 
-            logging.debug( "report_directive.run: %s: checking for %s" % (tag, str(filenames)))
+            logging.debug( "report_directive.run: %s: checking for %s", tag, filenames )
             for filename in filenames:
                 if not os.path.exists( filename ):
-                    logging.info( "report_directive.run: %s: redo: %s missing" % (tag, filename ))
+                    logging.info( "report_directive.run: %s: redo: %s missing", tag, filename )
                     break
             else:
-                logging.info( "report_directive.run: %s: noredo: all files are present" % tag )
+                logging.info( "report_directive.run: %s: noredo: all files are present", tag )
                 ## all is present - save text and return
                 if lines and state_machine:
                     state_machine.insert_input(
                         lines, state_machine.input_lines.source(0) )
                 return []
         else:
-            logging.debug( "report_directive.run: %s: no check performed: %s missing" % (tag, str(filename_text)))
+            logging.debug( "report_directive.run: %s: no check performed: %s missing", tag, filename_text )
     else:
         template_name = ""
         filename_text = None
@@ -218,13 +265,13 @@ def run(arguments,
     try:
         ########################################################
         # find the tracker
-        logging.debug( "report_directive.run: collecting tracker %s with options %s " % (tracker_name, tracker_options) )
+        logging.debug( "report_directive.run: collecting tracker %s with options %s ", tracker_name, tracker_options )
         code, tracker = Utils.makeTracker( tracker_name, (), tracker_options )
         if not tracker: 
             logging.error( "report_directive.run: no tracker - no output from %s " % str(document) )
             raise ValueError( "tracker `%s` not found" % tracker_name )
 
-        logging.debug( "report_directive.run: collected tracker %s" % tracker_name )
+        logging.debug( "report_directive.run: collected tracker %s", tracker_name )
 
         tracker_id = Cache.tracker2key( tracker )
 
@@ -270,7 +317,7 @@ def run(arguments,
         code = None
         tracker_id = None
 
-    logging.debug( "report_directive.run: profile: started: collecting: %s" % tag )
+    collect_start = Profiler.event( "start", "collect-images" )
 
     ########################################################
     ## write code output
@@ -296,6 +343,8 @@ def run(arguments,
     # collect images
     ###########################################################
     map_figure2text = {}
+    # keep a reference, blocks are replaced on errors
+    result_blocks = blocks
     try:
         for collector in collectors:
             map_figure2text.update( collector.collect( blocks,
@@ -316,6 +365,9 @@ def run(arguments,
         blocks = ResultBlocks(ResultBlocks( Utils.buildException( "collection" ) ))
         code = None
         tracker_id = None
+    finally:
+        # remove temporary files that have not been collected
+        Utils.removeSpreadSheets( result_blocks )
         
     ###########################################################
     # replace place holders or add text
@@ -351,8 +403,7 @@ def run(arguments,
         state_machine.insert_input(
             lines, state_machine.input_lines.source(0))
 
-    logging.debug( "report_directive.run: profile: finished: collecting: %s" % tag )
-    logging.debug( "report_directive.run: profile: finished: rst: %s:%i" % (str(document), lineno) )
+    Profiler.event( "finish", "collect-images", start = collect_start )
 
     return []
 
@@ -394,7 +445,7 @@ class report_directive(Directive):
 
     def run(self):
         document = self.state.document.current_source
-        logging.info( "report_directive: starting: %s:%i" % (str(document), self.lineno) )
+        logging.info( "report_directive: starting: %s:%i", document, self.lineno )
 
         return run(self.arguments, 
                    self.options,
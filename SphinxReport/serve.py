@@ -6,7 +6,9 @@ sphinxreport-serve
 
 :command:`sphinxreport-serve` starts a minimalist web server that permits
 the user to interact with some of the elements in a sphinxport document. In particular,
-it enables the ``data`` element permitting the download of raw data.
+it enables the ``data`` element permitting the download of raw data
+and the ``table`` element for paging through large tables (see the
+``large`` option of the :class:`Table` renderer).
 
 To start the server, type::
 
@@ -40,7 +42,7 @@ The options are:
    actions are ``stop`` to stop and ``restart`` to restart the server.
 """
 
-import sys, os, imp, io, re, types, glob, optparse, shutil
+import sys, os, imp, io, re, types, glob, optparse, shutil, json
 
 USAGE = """python %s [OPTIONS] 
 
@@ -51,13 +53,20 @@ start a sphinxreport server
 
 import web
 
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
 from SphinxReport import Utils
 from SphinxReport import Cache
 from SphinxReport import DataTree
+from SphinxReport import PagedTable
 from collections import OrderedDict as odict
 
 
 urls = ( '/data/(.*)', 'DataTable',
+         '/table/(.*)', 'LargeTable',
          '/index/(.*)', 'Index'  )
 
 # expose zip within templates
@@ -78,6 +87,73 @@ class DataTable:
 
         return render.data_table(table, row_headers, col_headers )
 
+# tables opened by LargeTable, kept open between requests
+TABLES = {}
+
+class LargeTable:
+    '''render a page of a large table saved in columnar format.
+
+    The following query parameters are recognized:
+
+    page
+       page to display, starting at 0.
+    rows
+       number of rows per page.
+    sort
+       column to sort by.
+    order
+       sort order, ``asc`` or ``desc``.
+    filter
+       filter expression of the form ``column:expression``. Can be
+       given multiple times.
+    format
+       ``html`` (default) or ``json``.
+    '''
+
+    def GET(self, path):
+
+        # only permit tables within the report directory
+        path = os.path.abspath( path )
+        if not path.startswith( os.path.abspath( os.curdir ) + os.sep ) or \
+                not PagedTable.isTable( path ):
+            raise web.notfound()
+
+        if path not in TABLES:
+            TABLES[path] = PagedTable.PagedTable( path )
+        table = TABLES[path]
+
+        params = web.input( page = 0, rows = 100, sort = None, 
+                            order = "asc", filter = [], format = "html" )
+        page, nrows = int( params.page ), int( params.rows )
+        filters = [ tuple(x.split( ":", 1 )) for x in params.filter if ":" in x ]
+
+        try:
+            headers, rows, total = table.getPage( page, nrows,
+                                                  sort = params.sort,
+                                                  ascending = params.order != "desc",
+                                                  filters = filters )
+        except (KeyError, ValueError, re.error) as msg:
+            raise web.badrequest( str(msg) )
+
+        if params.format == "json":
+            web.header( 'Content-Type', 'application/json' )
+            return json.dumps( { 'headers' : headers,
+                                 'rows' : rows,
+                                 'page' : page,
+                                 'total' : total } )
+
+        # query strings for paging and sorting links
+        query = [ ('rows', nrows) ] + [ ('filter', x) for x in params.filter ]
+        filter_query = urlencode( query )
+        if params.sort:
+            query.extend( [ ('sort', params.sort), ('order', params.order ) ] )
+        page_query = urlencode( query )
+
+        npages = max( 1, (total + nrows - 1) // nrows )
+        return render.paged_table( headers, rows, page, npages, total,
+                                   params.sort, params.order,
+                                   page_query, filter_query )
+
 def main():
 
     parser = optparse.OptionParser( version = "%prog version: $Id$", usage = USAGE )
@@ -48,6 +48,22 @@ The options are:
 **-i/--interactive** 
    Start python interpreter.
 
+**--profile-slow** seconds
+   Profile trackers and renderers taking longer than this number
+   of seconds. The profile is written to the file :file:`<tracker>.slow` 
+   or next to the output of directives when testing a page.
+
+**-j/--num-jobs** number of jobs
+   Number of trackers to run in parallel when testing all trackers.
+
+**--timeout** seconds
+   Terminate trackers running longer than this number of seconds when
+   testing all trackers. Set to 0 for no limit.
+
+**--timings** filename
+   Write the status, time, size of the data and peak memory of each
+   tracker as tab-separated values to *filename* when testing all trackers.
+
 If no command line arguments are given all :term:`trackers` are build in parallel. 
 
 Usage
@@ -87,10 +103,22 @@ Running sphinxreport-test without options::
 will collect all :class:`Trackers` and will execute them.
 Use this method to see if all :class:`Trackers` can access
 their data sources.
+
+Each :class:`Tracker` in the python files in the :file:`trackers`
+directory collects all its data in a separate process. Up to
+``--num-jobs`` trackers run in parallel and trackers running longer
+than ``--timeout`` seconds are terminated. Once all trackers have
+finished, a table with the status, the time taken, the number of leaves
+and bytes in the data and the peak memory of each tracker is printed,
+slowest trackers first.
+
+If :ref:`Caching` is enabled, the data are stored in the cache, so that
+a subsequent :ref:`sphinxreport-build` only needs to render.
 """
 
 
-import sys, os, imp, io, re, types, glob, optparse, code, tempfile
+import sys, os, imp, io, re, types, glob, optparse, code, tempfile, shutil, time
+import multiprocessing
 
 import matplotlib
 import matplotlib.pyplot as plt
@@ -100,15 +128,16 @@ from SphinxReport.Component import *
 from SphinxReport.Tracker import Tracker
 from SphinxReport.ResultBlock import flat_iterator
 from SphinxReport.DataTree import asDataFrame
-from SphinxReport import Utils
+from SphinxReport import Utils, Profiler, DataTree
 
 import SphinxReport.clean
 from SphinxReport.Dispatcher import Dispatcher
 
-try:
-    from multiprocessing import Process
-except ImportError:
-    from threading import Thread as Process
+# Python 2/3 Compatibility
+try: import queue
+except ImportError: import Queue as queue
+
+from collections import OrderedDict as odict
 
 # import conf.py
 if os.path.exists("conf.py"):
@@ -122,6 +151,31 @@ TRACKERDIR = "trackers"
 if "docsdir" in locals():
     TRACKERDIR = os.path.join( docsdir, "trackers" )
 
+# names of trackers that are not tested
+EXCLUDE = set( ("Tracker", 
+                "TrackerSQL", 
+                "returnLabeledData",
+                "returnMultipleColumnData",
+                "returnMultipleColumns",
+                "returnSingleColumn",
+                "returnSingleColumnData", 
+                "SQLError", 
+                "MultipleColumns", 
+                "MultipleColumnData", 
+                "LabeledData", 
+                "DataSimple", 
+                "Data"  ) )
+
+# columns in the table of tracker timings
+TIMING_COLUMNS = ( "tracker", "status", "time", "leaves", "bytes", "rss", "message" )
+
+# seconds to wait for the result of a tracker process that has exited
+RESULT_WAIT = 1.0
+
+# seconds after which the result of a tracker process that has 
+# exited successfully is considered lost
+RESULT_GRACE = 30.0
+
 RST_TEMPLATE = """.. _%(label)s:
 
 .. report:: %(tracker)s
@@ -165,6 +219,18 @@ def getTrackers( fullpath ):
         
     return trackers
 
+def collectTrackers( trackerdir ):
+    """return all trackers in the python files in *trackerdir*
+    except those in :data:`EXCLUDE`.
+
+    returns a list of tuples, see :func:`getTrackers`.
+    """
+    trackers = []
+    for filename in glob.glob( os.path.join( trackerdir, "*.py" )):
+        modulename = os.path.basename( filename )
+        trackers.extend( [ x for x in getTrackers( modulename ) if x[0] not in EXCLUDE ] )
+    return trackers
+
 def writeRST( outfile, options, kwargs, 
               renderer_options, transformer_options, display_options,
               modulename, name):
@@ -227,11 +293,115 @@ def writeNotebook( outfile, options, kwargs,
     outfile.write( Utils.NOTEBOOK_TEMPLATE % params )
 
 
-def run( name, t, kwargs ):
-    
-    print("%s: collecting data started" % name)     
-    t( **kwargs )
-    print("%s: collecting data finished" % name)     
+def runTracker( name, tracker, kwargs, outqueue ):
+    """collect all data of the :class:`Tracker` *tracker*.
+
+    Data are stored in the cache if :ref:`Caching` is enabled.
+    Puts a tuple of *name* and a dictionary with the status, the
+    time taken, the size of the data and the peak memory in kilobytes
+    into *outqueue*.
+    """
+    result = odict( ( ("status", "ok"), ("time", 0), ("leaves", 0),
+                      ("bytes", 0), ("rss", 0), ("message", "") ) )
+    start = time.time()
+    try:
+        dispatcher = Dispatcher( tracker( **kwargs ), None, [] )
+        dispatcher.parseArguments( **kwargs )
+        dispatcher.collect()
+        result["leaves"], result["bytes"] = DataTree.getSize( dispatcher.data )
+    except Exception as msg:
+        result["status"] = "error"
+        result["message"] = "%s: %s" % (msg.__class__.__name__, msg)
+    result["time"] = time.time() - start
+    result["rss"] = Profiler.getPeakRSS()
+    outqueue.put( (name, result) )
+
+def formatResult( name, result ):
+    """return a one-line summary of *result* from :func:`runTracker`."""
+    line = "%s: %s in %.1fs" % (name, result["status"], result["time"])
+    if result["status"] == "ok":
+        line += ", %i leaves, %i bytes, %iMB" % (result["leaves"], result["bytes"], result["rss"] // 1024)
+    if result["message"]:
+        line += ": %s" % result["message"]
+    return line
+
+def testTrackers( trackers, kwargs, num_jobs = 2, timeout = None, poll = 0.1 ):
+    """collect all data from *trackers*, a list of tuples of
+    names and :class:`Tracker` classes.
+
+    Each tracker runs in a separate process and up to *num_jobs*
+    trackers run in parallel. Trackers running longer than *timeout*
+    seconds are terminated.
+
+    returns a dictionary mapping the names of trackers to
+    results, see :func:`runTracker`.
+    """
+    outqueue = multiprocessing.Queue()
+    pending = list( trackers )
+    running, results, exited = odict(), odict(), {}
+
+    def _failed( status, message, elapsed ):
+        return odict( ( ("status", status), ("time", elapsed), ("leaves", 0),
+                        ("bytes", 0), ("rss", 0), ("message", message) ) )
+
+    def _collect( wait ):
+        # collect all results that are available, waiting
+        # up to *wait* seconds for the first one
+        block, collected = True, 0
+        while True:
+            try:
+                name, result = outqueue.get( block, wait )
+            except queue.Empty:
+                break
+            block = False
+            collected += 1
+            results[name] = result
+            print( formatResult( name, result ) )
+        return collected
+
+    while pending or running:
+        while pending and len(running) < num_jobs:
+            name, tracker = pending.pop(0)
+            process = multiprocessing.Process( target = runTracker, 
+                                               args = (name, tracker, kwargs, outqueue) )
+            process.start()
+            running[name] = (process, time.time())
+
+        _collect( poll )
+
+        for name, (process, start) in list(running.items()):
+            if name not in results and not process.is_alive():
+                # the result might still be in transit after the process has exited
+                while name not in results and _collect( RESULT_WAIT ): pass
+
+            now = time.time()
+            if name in results:
+                pass
+            elif timeout and now - start > timeout:
+                process.terminate()
+                results[name] = _failed( "timeout", "terminated after %is" % timeout, now - start )
+                print( formatResult( name, results[name] ) )
+            elif not process.is_alive():
+                # a process exiting successfully has sent its result
+                if process.exitcode == 0 and now - exited.setdefault( name, now ) < RESULT_GRACE:
+                    continue
+                results[name] = _failed( "error", "process exited with code %s" % process.exitcode, now - start )
+                print( formatResult( name, results[name] ) )
+            else:
+                continue
+            process.join()
+            del running[name]
+
+    return results
+
+def writeTimings( outfile, results ):
+    """write *results* from :func:`testTrackers` as a
+    tab-separated table to *outfile*, slowest trackers first.
+    """
+    outfile.write( "\t".join( TIMING_COLUMNS ) + "\n" )
+    for name, result in sorted( results.items(), key = lambda x: -x[1]["time"] ):
+        outfile.write( "\t".join( [ name, result["status"], "%.2f" % result["time"] ] +\
+                                      [ str(result[x]) for x in TIMING_COLUMNS[3:] ] ) + "\n" )
 
 def main( argv = None, **kwargs ):
     '''main function for test.py.
@@ -297,6 +467,22 @@ def main( argv = None, **kwargs ):
                        " The suffix determines the type of plot. "
                        " [default=%default]." )
 
+    parser.add_option( "--profile-slow", dest="profile_slow", type="float",
+                       help="profile trackers and renderers taking longer than this number "
+                       "of seconds [default=%default]." )
+
+    parser.add_option( "-j", "--num-jobs", dest="num_jobs", type="int",
+                       help="number of trackers to run in parallel when testing all trackers "
+                       "[default=%default]." )
+
+    parser.add_option( "--timeout", dest="timeout", type="float",
+                       help="terminate trackers running longer than this number of seconds "
+                       "when testing all trackers. Set to 0 for no limit [default=%default]." )
+
+    parser.add_option( "--timings", dest="timings", type="string",
+                       help="filename to write timings of trackers to when testing all trackers "
+                       "[default=%default]." )
+
     parser.set_defaults(
         loglevel = 1,
         tracker=None,
@@ -315,7 +501,11 @@ def main( argv = None, **kwargs ):
         start_ipython = False,
         language = "rst",
         workdir = None,
-        dpi = 100 )
+        dpi = 100,
+        profile_slow = None,
+        num_jobs = 2,
+        timeout = 600,
+        timings = None )
 
     if argv is None and len(kwargs) == 0:
         argv = sys.argv
@@ -350,6 +540,9 @@ def main( argv = None, **kwargs ):
 
     sys.path.insert( 0, options.trackerdir )
 
+    if options.profile_slow:
+        Utils.PARAMS["report_profile_slow"] = options.profile_slow
+
     ######################################################
     # test plugins
     for x in options.options:
@@ -380,29 +573,11 @@ def main( argv = None, **kwargs ):
 
     transformers = Utils.getTransformers( options.transformers, transformer_options )
 
-    exclude = set( ("Tracker", 
-                    "TrackerSQL", 
-                    "returnLabeledData",
-                    "returnMultipleColumnData",
-                    "returnMultipleColumns",
-                    "returnSingleColumn",
-                    "returnSingleColumnData", 
-                    "SQLError", 
-                    "MultipleColumns", 
-                    "MultipleColumnData", 
-                    "LabeledData", 
-                    "DataSimple", 
-                    "Data"  ) )
-
     ######################################################
     ## build from tracker
     if options.tracker:
 
-        trackers = []
-
-        for filename in glob.glob( os.path.join( options.trackerdir, "*.py" )):
-            modulename = os.path.basename( filename )
-            trackers.extend( [ x for x in getTrackers( modulename ) if x[0] not in exclude ] )
+        trackers = collectTrackers( options.trackerdir )
         
         if "." in options.tracker:
             parts = options.tracker.split(".")
@@ -437,16 +612,19 @@ def main( argv = None, **kwargs ):
 
         dispatcher = Dispatcher( t, renderer, transformers ) 
 
-        if renderer == None:
-            dispatcher.parseArguments( **kwargs )
-            result = dispatcher.collect()
-            result = dispatcher.transform()
-            options.do_print = options.language == "notebook"
-            options.do_show = False
-            options.hardcopy = False
-        else:
-            # needs to be resolved between renderer and dispatcher options
-            result = dispatcher( **kwargs )
+        with Profiler.sampleSlow( options.profile_slow,
+                                  "%s.slow" % Utils.quote_filename( options.tracker ),
+                                  options.tracker ):
+            if renderer == None:
+                dispatcher.parseArguments( **kwargs )
+                result = dispatcher.collect()
+                result = dispatcher.transform()
+                options.do_print = options.language == "notebook"
+                options.do_show = False
+                options.hardcopy = False
+            else:
+                # needs to be resolved between renderer and dispatcher options
+                result = dispatcher( **kwargs )
 
         if options.do_print:                        
 
@@ -518,7 +696,11 @@ def main( argv = None, **kwargs ):
                             tmpfile, outpath = tempfile.mkstemp( dir ='.', suffix = '.xlsx' )
                             os.close(tmpfile)
                             print ('saving xlsx to %s' % outpath )
-                            r.xls.save( outpath )
+                            shutil.move( r.xls, outpath )
+
+        # remove spread-sheets that have not been saved
+        if result and renderer != None:
+            Utils.removeSpreadSheets( result )
                     
     ######################################################
     ## build page
@@ -532,6 +714,8 @@ def main( argv = None, **kwargs ):
             raise IOError( "page %s does not exist" % options.page)
 
         options.num_jobs = 1
+        options.status_file = None
+        options.progress_interval = 5
 
         build.buildPlots( [ options.page, ], options, [], os.path.dirname( options.page ) )
 
@@ -543,8 +727,40 @@ def main( argv = None, **kwargs ):
             elif _pylab_helpers.Gcf.get_all_fig_managers() > 0:
                 plt.show()
 
+    ######################################################
+    ## test all trackers
     else:
-        raise ValueError("please specify either a tracker (-t/--tracker) or a page (-p/--page) to test")
+
+        # only classes defined in the tracker modules, not those imported
+        trackers = [ ("%s.%s" % (modulename, name), tracker) \
+                         for name, tracker, modulename, is_derived in collectTrackers( options.trackerdir ) \
+                         if is_derived and getattr( tracker, "__module__", None ) == modulename ]
+
+        if options.force:
+            for name, tracker in trackers:
+                SphinxReport.clean.removeTracker( tracker.__name__ )
+
+        if not Utils.PARAMS.get( "report_cachedir", None ):
+            print("caching is disabled - data will not be stored")
+
+        print("testing %i trackers with %i jobs" % (len(trackers), options.num_jobs))
+        start = time.time()
+        results = testTrackers( trackers, kwargs, 
+                                num_jobs = options.num_jobs,
+                                timeout = options.timeout )
+
+        nfailed = len( [ x for x in results.values() if x["status"] != "ok" ] )
+        print("tested %i trackers in %.1fs: %i ok, %i failed" % \
+                  (len(results), time.time() - start, len(results) - nfailed, nfailed))
+        writeTimings( sys.stdout, results )
+        if options.timings:
+            with open( options.timings, "w" ) as outfile:
+                writeTimings( outfile, results )
+
+        if savedir is not None:
+            os.chdir( savedir )
+
+        return 1 if nfailed else 0
 
     if savedir is not None:
         os.chdir( savedir )
@@ -10,7 +10,7 @@ from matplotlib.cbook import exception_to_str
 import seaborn
 
 from SphinxReport.Component import *
-from SphinxReport import Config, Utils
+from SphinxReport import Config, Utils, Thumbnails
 
 class MatplotlibPlugin(Component):
 
@@ -70,23 +70,13 @@ class MatplotlibPlugin(Component):
                     warnings.warn(s)
                     return []
 
-                # if format=='png':
-                #     thumbdir = os.path.join(outdir, 'thumbnails')
-                #     try:
-                #         os.makedirs(thumbdir)
-                #     except OSError:
-                #         pass
-                #     thumbfile = str('%s.png' % os.path.join(thumbdir, outname) )
-                #     captionfile = str('%s.txt' % os.path.join(thumbdir, outname) )
-                #     if not os.path.exists(thumbfile):
-                #         # thumbnail only available in matplotlib >= 0.98.4
-                #         try:
-                #             figthumb = image.thumbnail(str(outpath), str(thumbfile), scale=0.3)
-                #         except AttributeError:
-                #             pass
-                #     outfile = open(captionfile,"w")
-                #     outfile.write( "\n".join( content ) + "\n" )
-                #     outfile.close()
+                # record image for the gallery, thumbnails are
+                # created by sphinxreport-gallery
+                if format == 'png':
+                    Thumbnails.addImage( os.path.join( outdir, 'thumbnails' ),
+                                         outname,
+                                         os.path.abspath( outpath ),
+                                         "\n".join( content ) )
 
             # create the text element
             rst_output = Utils.buildRstWithImage( outname, 
@@ -0,0 +1,50 @@
+import os, re
+from SphinxReport.Component import *
+from SphinxReport import Config
+from SphinxReport import Utils
+from SphinxReport import PagedTable
+
+class PagedTablePlugin(Component):
+
+    capabilities = ['collect']
+
+    def __init__(self, *args, **kwargs):
+        Component.__init__(self,*args,**kwargs)
+
+    def collect( self,
+                 blocks,
+                 template_name,
+                 outdir,
+                 rstdir,
+                 builddir,
+                 srcdir,
+                 content,
+                 display_options,
+                 tracker_id,
+                 links = {}):
+        '''collect large tables from result blocks.
+
+        Tables are written in columnar format to a directory and
+        a link to the ``table`` page of :command:`sphinxreport-serve`
+        will be inserted at the place holder.
+        '''
+        map_figure2text = {}
+        extension = "table"
+
+        for xblocks in blocks:
+            for block in xblocks:
+                if not hasattr( block, "table" ): continue
+
+                outname = Utils.quote_filename( "%s_%s" % (template_name, block.title) )
+                outputpath = os.path.join(outdir, '%s.%s' % (outname, extension))
+
+                nrows = PagedTable.writeTable( block.table, outputpath )
+                self.debug( "%s: saved %i rows to %s" % (id(self), nrows, outputpath ) )
+
+                # link relative to the server root
+                link = "/table/%s" % outputpath
+
+                rst_output = "%(link)s" % locals()
+                map_figure2text[ "#$table %s$#" % block.title] = rst_output
+
+        return map_figure2text
@@ -2076,8 +2076,13 @@ class GalleryPlot(PlotByRow):
                                               title = title ) )
         else:
             self.startPlot()
+            # thumbnails are much cheaper to read, the link 
+            # points to the full image
+            thumbnail = dataseries.get( 'thumbnail', None )
+            if not ( isinstance( thumbnail, str ) and os.path.exists( thumbnail ) ):
+                thumbnail = filename
             try:
-                data = plt.imread( filename )
+                data = plt.imread( thumbnail )
             except IOError:
                 raise ValueError( "file format for file '%s' not recognized" % filename )
 
@@ -1,4 +1,4 @@
-import os, sys, re, shelve, traceback, pickle, types, itertools, collections
+import os, sys, re, shelve, traceback, pickle, types, itertools, collections, tempfile
 
 import json
 import pprint
@@ -16,8 +16,6 @@ from SphinxReport.Component import *
 from SphinxReport import Utils, DataTree
 from SphinxReport import CorrespondenceAnalysis
 
-import StringIO
-
 from docutils.parsers.rst import directives
 
 import pandas
@@ -26,7 +24,15 @@ import pandas.core.reshape
 # for output of work books
 # import xlwt
 import openpyxl
-from openpyxl.cell import get_column_letter
+
+# regular expression to detect rst hyperlinks in table cells
+RX_LINK = re.compile( "`(.*?(?:\".+\"|\'.+\')?.*?)\s<(.*?(?:\".+\"|\'.+\')?.*?)>`_" )
+
+# characters that require quoting of a field in a csv-table
+RX_QUOTE = re.compile( '[,"\n]' )
+
+# characters not permitted in worksheet titles
+RX_SHEET = re.compile( r"[\\/*?:\[\]']" )
 
 class Renderer(Component):
     """Base class of renderers that render data into restructured text.
@@ -69,7 +75,7 @@ class Renderer(Component):
         a :class:`Tracker.Tracker`.
         """
 
-        self.debug("%s: starting renderer '%s'"% (id(self), str(self)))
+        self.debug("%s: starting renderer '%s'", id(self), self )
 
         try: self.format = kwargs["format"]
         except KeyError: pass
@@ -163,6 +169,9 @@ class TableBase( Renderer ):
     max_rows = 50
     max_cols = 20
 
+    # number of rows written to a spread-sheet at a time
+    xls_chunk_size = 10000
+
     def __init__( self, *args, **kwargs ):
         Renderer.__init__(self, *args, **kwargs )
 
@@ -171,15 +180,91 @@ class TableBase( Renderer ):
         self.max_rows = kwargs.get( "max-rows", 50 )
         self.max_cols = kwargs.get( "max-cols", 20 )
 
+    def columnToStrings( self, values, quote = False, links = False ):
+        '''convert the array *values* into an array of strings.
+
+        Numeric columns are converted in a single vectorized
+        step. Only columns of type object are examined for
+        characters that need quoting (*quote*) and for rst hyperlinks
+        that need to be converted to html (*links*).
+
+        Missing values are output as empty strings.
+
+        returns a numpy array of type object.
+        '''
+        values = numpy.asarray( values )
+
+        if values.dtype.kind in "biuf":
+            strings = values.astype( str ).astype( object )
+            if values.dtype.kind == "f":
+                strings[numpy.isnan( values )] = ""
+            return strings
+
+        strings = numpy.empty( len(values), dtype = object )
+        missing = pandas.isnull( values )
+        strings[missing] = ""
+        strings[~missing] = [ str(x) for x in values[~missing] ]
+
+        if links:
+            strings = numpy.array( [ RX_LINK.sub( r'<a href="\2">\1</a>', x ) if "`" in x else x \
+                                         for x in strings ], dtype = object )
+        if quote:
+            strings = numpy.array( [ '"%s"' % x.replace( '"', '""' ) if RX_QUOTE.search( x ) else x \
+                                         for x in strings ], dtype = object )
+        return strings
+
+    def tableToColumns( self, dataframe, quote = False, links = False ):
+        '''convert *dataframe* into columns of strings.
+
+        The index of *dataframe* is output as the leading column(s),
+        one per level if the index is hierarchical.
+
+        returns a list of headers and a list of string arrays.
+        '''
+        index = dataframe.index
+        if isinstance( index, pandas.MultiIndex ):
+            headers = [ x or "" for x in index.names ]
+            columns = [ self.columnToStrings( index.get_level_values( x ), quote, links ) \
+                            for x in range( len(index.names) ) ]
+        else:
+            headers = [ index.name or "" ]
+            columns = [ self.columnToStrings( index.values, quote, links ) ]
+
+        headers.extend( dataframe.columns )
+        # iterate by position as column names are not necessarily unique
+        for x in range( len(dataframe.columns) ):
+            columns.append( self.columnToStrings( dataframe.iloc[:,x].values, quote, links ) )
+
+        headers = list(self.columnToStrings( numpy.array( headers, dtype = object ), quote, links ))
+
+        return headers, columns
+
+    def joinColumns( self, columns, separator ):
+        '''join string arrays in *columns* row-wise with *separator*.
+
+        returns an array of strings, one per row.
+        '''
+        if len(columns) == 0: return numpy.zeros( 0, dtype = object )
+        rows = columns[0]
+        for column in columns[1:]:
+            rows = rows + separator + column
+        return rows
+
+    def asCSV( self, dataframe ):
+        '''return *dataframe* as comma separated values.
+
+        returns a tuple of header and list of rows.
+        '''
+        headers, columns = self.tableToColumns( dataframe, quote = True )
+        return ",".join( headers ), list(self.joinColumns( columns, "," ))
+
     def asFile( self, dataframe, row_headers, col_headers, title ):
         '''save the table as HTML file.
 
-        Multiple files of the same Renderer/Tracker combination are distinguished 
+        Multiple files of the same Renderer/Tracker combination are distinguished
         by the title.
         '''
-        self.debug("%s: saving %i x %i table as file'"% (id(self), 
-                                                         len(row_headers), 
-                                                         len(col_headers)))
+        self.debug("%s: saving %i x %i table as file'", id(self), len(row_headers), len(col_headers) )
         lines = []
         lines.append("`%i x %i table <#$html %s$#>`__" %\
                          (len(row_headers), len(col_headers),
@@ -187,101 +272,137 @@ class TableBase( Renderer ):
 
         r = ResultBlock( "\n".join(lines) + "\n", title = title)
 
-        out = StringIO.StringIO()
-        dataframe.to_csv( out )
-        lines = out.getvalue().split("\n")            
+        # create an html table, substituting rst links
+        headers, columns = self.tableToColumns( dataframe, links = True )
+        rows = self.joinColumns( columns, "</td><td>" )
 
-        # create an html table
         data = ["<table>"]
-        data.append( "<tr><th></th><th>%s</th></tr>" % "</th><th>".join( map(str,lines[0].split(","))) )
-        data.extend( ["<tr><td>%s</td></tr>" % \
-                          ("</td><td>".join(x.split(","))) for x in lines[1:]] )
+        data.append( "<tr><th>%s</th></tr>" % "</th><th>".join( headers ) )
+        data.extend( "<tr><td>" + rows + "</td></tr>" )
         data.append( "</table>\n" )
 
-        # substitute links
-        data = [ re.sub("`(.*?(?:\".+\"|\'.+\')?.*?)\s<(.*?(?:\".+\"|\'.+\')?.*?)>`_", r'<a href="\2">\1</a>', x) \
-                     for x in data ]
-
         r.html = "\n".join( data )
 
         return r
 
+    def columnToCells( self, values ):
+        '''convert *values* into a list of spread-sheet cell values.
+
+        Missing values are output as empty cells. Columns of type
+        object are examined for rst hyperlinks, which are converted
+        into ``HYPERLINK`` formulas. The conversion is done per column
+        and not per cell.
+        '''
+        values = pandas.Series( values )
+        missing = values.isnull().values
+        cells = numpy.array( values.astype( object ).values, dtype = object )
+        cells[missing] = None
+
+        if values.dtype.kind == "O":
+            text = values.astype( str )
+            candidates = numpy.flatnonzero( ~missing & text.str.startswith( "`" ).values )
+            if len(candidates):
+                links = text.iloc[candidates].str.extract( RX_LINK.pattern )
+                found = links[1].notnull().values
+                if found.any():
+                    url = links[1][found].str.replace( '"', '""' )
+                    text = links[0][found].str.replace( '"', '""' )
+                    cells[candidates[found]] = ( '=HYPERLINK("' + url + '","' + text + '")' ).values
+
+        return cells.tolist()
+
+    def writeWorksheet( self, wb, dataframe, title ):
+        '''add a worksheet called *title* with the contents of *dataframe* 
+        to the write-only workbook *wb*.
+
+        The index of *dataframe* is output as the leading column(s). 
+        Rows are converted and appended in chunks of :attr:`xls_chunk_size`
+        rows.
+        '''
+        ws = wb.create_sheet( title = title )
+
+        nlevels = dataframe.index.nlevels
+        ws.append( [ x or "" for x in dataframe.index.names ] + 
+                   [ path2str( x ) for x in dataframe.columns ] )
+
+        for start in range( 0, len(dataframe), self.xls_chunk_size ):
+            chunk = dataframe.iloc[start:start + self.xls_chunk_size]
+            columns = [ self.columnToCells( chunk.index.get_level_values( x ) ) \
+                            for x in range( nlevels ) ]
+            # iterate by position as column names are not necessarily unique
+            columns.extend( [ self.columnToCells( chunk.iloc[:,x] ) \
+                                  for x in range( len(chunk.columns) ) ] )
+            for row in zip( *columns ):
+                ws.append( row )
+
     def asSpreadSheet( self, dataframe, row_headers, col_headers, title ):
         '''save the table as an xls file.
 
         Multiple files of the same Renderer/Tracker combination are distinguished 
         by the title.
+
+        The workbook is streamed to a temporary file, the name of which is 
+        stored in the ``xls`` attribute of the result block. The file is
+        removed by :func:`Utils.removeSpreadSheets` if it is not collected.
         '''
         
-        self.debug("%s: saving %i x %i table as spread-sheet'"% (id(self), 
-                                                                 len(row_headers), 
-                                                                 len(col_headers)))
-        quick = len(dataframe) > 10000
-        
-        if quick:
-            # quick writing, only append method works
-            wb = openpyxl.Workbook( optimized_write = True)
-            def addWorksheet( wb, dataframe, title ):
-                ws = wb.create_sheet()
-
-                ws.append( [""] + list(col_headers) )
-                for x,row in enumerate( dataframe.iterrows() ):
-                    ws.append( [path2str(row_headers[x])] + list(row) )
-
-                # patch: maximum title length seems to be 31
-                ws.title = title[:30]
-                    
-        else:
-            # do it cell-by-cell, this might be slow
-            wb = openpyxl.Workbook( optimized_write = False)
-            def addWorksheet( wb, dataframe, title ):
-                ws = wb.create_sheet()
-
-                # regex to detect rst hypelinks
-                regex_link = re.compile( '`(.*) <(.*)>`_')
-                for column, column_name in enumerate( dataframe.columns ):
-                    c = ws.cell( row=0, column=column)
-                    c.value = column_name
-                    dataseries = dataframe[column_name]
-                    if dataseries.dtype == object:
-                        for row, value in enumerate( dataseries ):
-                            c = ws.cell( row=row+1, column=column)
-                            value = str(value)
-                            if value.startswith('`'):
-                                c.value, c.hyperlink = regex_link.match( value ).groups()
-                            else:
-                                c.value = value 
-                    else:
-                        for row, value in enumerate( dataseries ):
-                            c = ws.cell( row=row+1, column=column)
-                            c.value = value 
-                # patch: maximum title length seems to be 31
-                ws.title = title[:30]
+        self.debug("%s: saving %i x %i table as spread-sheet'", id(self), len(row_headers), len(col_headers) )
+
+        try:
+            wb = openpyxl.Workbook( write_only = True )
+        except TypeError:
+            # older versions of openpyxl
+            wb = openpyxl.Workbook( optimized_write = True )
+
+        titles = set()
+        def sheetTitle( title ):
+            '''return a valid and unique worksheet title.'''
+            # patch: maximum title length seems to be 31
+            title = RX_SHEET.sub( "_", title )[:31] or "Sheet"
+            x, unique = 0, title
+            while unique in titles:
+                x += 1
+                unique = "%s_%i" % (title[:31 - len(str(x)) - 1], x)
+            titles.add( unique )
+            return unique
 
-        is_hierarchical = isinstance( dataframe.index, pandas.core.index.MultiIndex )
+        is_hierarchical = isinstance( dataframe.index, pandas.MultiIndex )
 
-        split = is_hierarchical and len(dataframe.index.levels) > 1
+        split = is_hierarchical and dataframe.index.nlevels > 1
 
         if split:
             # create separate worksheets for nested indices
-            nlevels = len(dataframe.index.levels)
-            paths = map( tuple, DataTree.unique( [ x[:nlevels-1] for x in dataframe.index.unique() ] ))
-
-            ws = wb.worksheets[0]
-            ws.title = 'Summary' 
-            ws.append( [dataframe.index.labels[:nlevels-1]] + ["Worksheet", "Rows" ] )
-
-            for row, path in enumerate(paths):
+            nlevels = dataframe.index.nlevels
+            levels = list(range( nlevels - 1 ))
+            groups = dataframe.groupby( level = levels, sort = False ).indices
+
+            summary = sheetTitle( 'Summary' )
+            sheets = []
+            for path, rows in groups.items():
+                if not isinstance( path, tuple ): path = (path,)
+                sheets.append( (path, sheetTitle( path2str( path ) ), rows) )
+
+            ws = wb.create_sheet( title = summary )
+            ws.append( [ x or "" for x in dataframe.index.names[:nlevels-1] ] + ["Worksheet", "Rows" ] )
+            for path, sheet, rows in sheets:
+                ws.append( list(path) + [ '=HYPERLINK("#\'%s\'!A1","%s")' % (sheet, sheet), len(rows) ] )
+
+            for path, sheet, rows in sheets:
                 # select data frame as cross-section
-                work = dataframe.xs(path, axis=0 )
-                title = path2str( path )[:30]
-                ws.append( list(path) + [title, len(work)] )
-                c = ws.cell( row = row+1, column = nlevels )
-                c.hyperlink = "#%s" % title
-                addWorksheet( wb, work, title = title )
+                work = dataframe.iloc[rows]
+                work.index = work.index.droplevel( levels )
+                self.writeWorksheet( wb, work, title = sheet )
                 
         else:
-            writeWorksheet( wb, dataframe, title = title )
+            self.writeWorksheet( wb, dataframe, title = sheetTitle( title ) )
+
+        handle, filename = tempfile.mkstemp( suffix = ".xlsx" )
+        os.close( handle )
+        try:
+            wb.save( filename )
+        except:
+            os.remove( filename )
+            raise
 
         # write result block 
         lines = []
@@ -291,11 +412,28 @@ class TableBase( Renderer ):
         lines.append( "" )
         
         r = ResultBlock( "\n".join(lines), title = title)
-        r.xls = wb
+        r.xls = filename
+
+        self.debug("%s: saved %i x %i table as spread-sheet'", id(self), len(row_headers), len(col_headers) )
+        return r
+
+    def asPagedTable( self, dataframe, row_headers, col_headers, title ):
+        '''save the table in columnar format for paging through
+        with :command:`sphinxreport-serve`.
+
+        Multiple files of the same Renderer/Tracker combination are distinguished 
+        by the title.
+        '''
+        self.debug("%s: saving %i x %i table as paged table'", id(self), len(row_headers), len(col_headers) )
+        lines = []
+        lines.append("`%i x %i table <#$table %s$#>`__" %\
+                         (len(row_headers), len(col_headers),
+                          title) )
+        lines.append( "" )
+
+        r = ResultBlock( "\n".join(lines), title = title)
+        r.table = dataframe
 
-        self.debug("%s: saved %i x %i table as spread-sheet'"% (id(self), 
-                                                                len(row_headers), 
-                                                                len(col_headers)))
         return r
 
 class Table( TableBase ):
@@ -308,7 +446,9 @@ class Table( TableBase ):
     towards a file.
 
     The attribute :attr:`large` determines where large tables are written
-    to. The default is html. Alternative values are ``xls`` for excel spread-sheets.
+    to. The default is html. Alternative values are ``xls`` for excel spread-sheets
+    and ``paged`` for tables that are served page by page through
+    :command:`sphinxreport-serve`.
 
     '''
     options = TableBase.options +\
@@ -384,38 +524,32 @@ class Table( TableBase ):
                               len(col_headers) > self.max_cols)):
             if self.large == "xls":
                 results.append( self.asSpreadSheet( dataframe, row_headers, col_headers, title ) )
+            elif self.large == "paged":
+                results.append( self.asPagedTable( dataframe, row_headers, col_headers, title ) )
             else:
                 results.append( self.asFile( dataframe, row_headers, col_headers, title ) )
 
             if self.preview:
-                row_headers = row_headers[:self.max_rows]
-                col_headers = col_headers[:self.max_cols]
-                matrix = [ x[:self.max_cols] for x in matrix[:self.max_rows] ]
+                dataframe = dataframe.iloc[:self.max_rows,:self.max_cols]
             else:
                 return results
 
-        out = StringIO.StringIO()
-        dataframe.to_csv( out )
+        header, rows = self.asCSV( dataframe )
+
         lines = []
         lines.append( ".. csv-table:: %s" % title )
         lines.append( "   :class: sortable" )
-        
+
         if self.add_rowindex:
-            lines.append( '   :header: "row", "", "%s" ' % '","'.join( map(str, col_headers) ) )
+            lines.append( '   :header: "row",%s' % header )
             lines.append( '' )
-
-            x = 0
-            for header, line in zip( row_headers, matrix ):
-                x += 1
-                lines.append( '   %i,"%s","%s"' % (x, str(header), '","'.join( map(str, line) ) ) )
-
+            lines.extend( [ '   %i,%s' % (x+1, row) for x, row in enumerate( rows ) ] )
         else:
-            l = out.getvalue().split("\n")            
-            lines.append( '   :header: %s' % l[0] )
+            lines.append( '   :header: %s' % header )
             lines.append( '' )
-            lines.extend( ['   %s' % x for x in l[1:] ] )
+            lines.extend( [ '   %s' % row for row in rows ] )
 
-        lines.append( "") 
+        lines.append( "")
         
         results.append( ResultBlock( "\n".join(lines), title = title) )
 
@@ -555,36 +689,32 @@ class MatrixBase:
 
     def transformAddRowTotal( self, matrix, row_headers, col_headers ):
         '''add row total to the matrix.'''
-        nrows, ncols = matrix.shape
-
-        totals = numpy.zeros( nrows )
-        for x in range(nrows): totals[x] = sum(matrix[x,:])
-        col_headers.append( "total" )
-        totals.shape=(nrows,1)
-        return numpy.hstack( numpy.hsplit(matrix,ncols) + [totals,] ), row_headers, col_headers
+        totals = matrix.sum( axis = 1 )
+        return numpy.hstack( (matrix, totals[:,numpy.newaxis]) ), row_headers, list(col_headers) + ["total"]
 
     def transformAddColumnTotal( self, matrix, row_headers, col_headers ):
-        raise NotImplementedError
+        '''add column total to the matrix.'''
+        totals = matrix.sum( axis = 0 )
+        return numpy.vstack( (matrix, totals[numpy.newaxis,:]) ), list(row_headers) + ["total"], col_headers
 
     def transformFilterByRows( self, matrix, row_headers, col_headers ):
         """only take columns that are also present in rows"""
-        take = [ x for x in range( len(col_headers) ) if col_headers[x] in row_headers ]
+        take = numpy.flatnonzero( pandas.Index( col_headers ).isin( row_headers ) )
         return matrix.take( take, axis=1), row_headers, [col_headers[x] for x in take ]
 
     def transformFilterByColumns( self, matrix, row_headers, col_headers ):
         """only take rows that are also present in columns"""
-        take = [ x for x in range( len(row_headers) ) if row_headers[x] in col_headers ]
+        take = numpy.flatnonzero( pandas.Index( row_headers ).isin( col_headers ) )
         return matrix.take( take, axis=0), [row_headers[x] for x in take ], col_headers 
 
     def transformSquare( self, matrix, row_headers, col_headers ):
         """only take rows and columns that are present in both giving a square matrix."""
-        take = set(row_headers).intersection( set(col_headers) )
-        row_indices = [ x for x in range( len(row_headers) ) if row_headers[x] in take ]
-        col_indices = [ x for x in range( len(col_headers) ) if col_headers[x] in take ]
-        m1 = matrix.take( row_indices, axis=0)
-        m2 = m1.take( col_indices, axis=1)
+        rows, cols = pandas.Index( row_headers ), pandas.Index( col_headers )
+        row_indices = numpy.flatnonzero( rows.isin( cols ) )
+        col_indices = numpy.flatnonzero( cols.isin( rows ) )
+        m = matrix[numpy.ix_( row_indices, col_indices )]
 
-        return m2, [row_headers[x] for x in row_indices], [col_headers[x] for x in col_indices]
+        return m, [row_headers[x] for x in row_indices], [col_headers[x] for x in col_indices]
 
     def transformTranspose( self, matrix, row_headers, col_headers ):
         """transpose the matrix."""
@@ -617,82 +747,79 @@ class MatrixBase:
         return matrix, row_headers, col_headers
 
     def transformSort( self, matrix, row_headers, col_headers ):
-        """apply correspondence analysis to a matrix.
+        """sort matrix rows and columns alphanumerically.
         """
 
         map_row_new2old = [x[0] for x in sorted(enumerate( row_headers ), key=lambda x: x[1])]
         map_col_new2old = [x[0] for x in sorted(enumerate( col_headers ), key=lambda x: x[1])]
 
-        matrix, row_headers, col_headers =  CorrespondenceAnalysis.GetPermutatedMatrix( matrix,
-                                                                                        map_row_new2old,
-                                                                                        map_col_new2old,
-                                                                                        row_headers = row_headers,
-                                                                                        col_headers = col_headers)
+        matrix = matrix[numpy.ix_( map_row_new2old, map_col_new2old )]
 
+        return matrix, [row_headers[x] for x in map_row_new2old], [col_headers[x] for x in map_col_new2old]
 
-        return matrix, row_headers, col_headers
+    def symmetrize( self, matrix, rows, cols, f ):
+        """symmetrize a matrix by applying *f* to the matrix 
+        and its transpose. The diagonal is left unchanged.
+
+        returns the symmetrized matrix.
+        """
+        if len(rows) != len(cols):
+            raise ValueError( "matrix not square - can not be symmetrized" )
+
+        result = f( matrix, matrix.T )
+        numpy.fill_diagonal( result, matrix.diagonal() )
+        return result, rows, cols
 
     def transformSymmetricMax( self, matrix, rows, cols ):
         """symmetrize a matrix.
 
         returns the normalized matrix.
         """
-        if len(rows) != len(cols):
-            raise ValueError( "matrix not square - can not be symmetrized" )
-        
-        for x in range(len(rows)):
-            for y in range(x+1,len(cols)):
-                matrix[x,y] = matrix[y,x] = max(matrix[x,y], matrix[y,x])
-
-        return matrix, rows, cols
+        return self.symmetrize( matrix, rows, cols, numpy.maximum )
 
     def transformSymmetricMin( self, matrix, rows, cols ):
         """symmetrize a matrix.
 
         returns the normalized matrix.
         """
-        if len(rows) != len(cols):
-            raise ValueError( "matrix not square - can not be symmetrized" )
-        
-        for x in range(len(rows)):
-            for y in range(x+1,len(cols)):
-                matrix[x,y] = matrix[y,x] = min(matrix[x,y], matrix[y,x])
-
-        return matrix, rows, cols
+        return self.symmetrize( matrix, rows, cols, numpy.minimum )
 
     def transformSymmetricSum( self, matrix, rows, cols ):
         """symmetrize a matrix.
 
         returns the normalized matrix.
         """
-        if len(rows) != len(cols):
-            raise ValueError( "matrix not square - can not be symmetrized" )
-        
-        for x in range(len(rows)):
-            for y in range(x+1,len(cols)):
-                matrix[x,y] = matrix[y,x] = sum(matrix[x,y], matrix[y,x])
-
-        return matrix, rows, cols
+        return self.symmetrize( matrix, rows, cols, numpy.add )
 
     def transformSymmetricAverage( self, matrix, rows, cols ):
         """symmetrize a matrix.
 
         returns the normalized matrix.
         """
-        if len(rows) != len(cols):
-            raise ValueError( "matrix not square - can not be symmetrized" )
-        
-        for x in range(len(rows)):
-            for y in range(x+1,len(cols)):
-                matrix[x,y] = matrix[y,x] = sum(matrix[x,y], matrix[y,x]) / 2
+        return self.symmetrize( matrix, rows, cols, lambda a, b: (a + b) / 2.0 )
 
-        return matrix, rows, cols
+    def normalize( self, matrix, divisor, axis ):
+        """divide *matrix* in place by *divisor* along *axis*.
+
+        Entries in *divisor* that are 0 are skipped.
+
+        returns the normalized matrix.
+        """
+        matrix = numpy.asarray( matrix, dtype = numpy.float64 )
+        divisor = numpy.array( divisor, dtype = numpy.float64 )
+        divisor[divisor == 0] = 1.0
+        if axis == 0:
+            matrix /= divisor[numpy.newaxis,:]
+        else:
+            matrix /= divisor[:,numpy.newaxis]
+        return matrix
 
     def transformNormalizeTotal( self, matrix, rows, cols ):
         """normalize a matrix by the total.
 
         Returns the normalized matrix.
         """
+        matrix = numpy.asarray( matrix, dtype = numpy.float64 )
         t = matrix.sum()
         matrix /= t
         return matrix, rows, cols
@@ -702,6 +829,7 @@ class MatrixBase:
 
         Returns the normalized matrix.
         """
+        matrix = numpy.asarray( matrix, dtype = numpy.float64 )
         t = matrix.max()
         matrix /= t
         return matrix, rows, cols
@@ -711,54 +839,30 @@ class MatrixBase:
 
         Returns the normalized matrix.
         """
-        nrows, ncols = matrix.shape
-
-        for x in range(nrows) :
-            m = sum(matrix[x,:])
-            if m != 0:
-                for y in range(ncols):
-                    matrix[x,y] /= m
-        return matrix, rows, cols
+        return self.normalize( matrix, matrix.sum( axis = 1 ), axis = 1 ), rows, cols
 
     def transformNormalizeRowMax( self, matrix, rows, cols ):
         """normalize a matrix row by the row maximum.
 
         Returns the normalized matrix.
         """
-        nrows, ncols = matrix.shape
-
-        for x in range(nrows) :
-            m = max(matrix[x,:])
-            if m != 0:
-                for y in range(ncols):
-                    matrix[x,y] /= m
-        return matrix, rows, cols
+        return self.normalize( matrix, matrix.max( axis = 1 ), axis = 1 ), rows, cols
 
     def transformNormalizeRowFirst( self, matrix, rows, cols ):
-        """normalize a matrix row by the row maximum.
+        """normalize a matrix row by the first row.
+
+        Removes the first row.
 
         Returns the normalized matrix.
         """
-        nrows, ncols = matrix.shape
-
-        for x in range(1, nrows) :
-            for y in range(ncols):
-                m = matrix[0,y]
-                if m != 0: matrix[x,y] /= m
-        matrix = numpy.delete( matrix, 0, 0 )
+        matrix = self.normalize( matrix[1:,:], matrix[0,:], axis = 0 )
         return matrix, rows[1:], cols
 
     def transformNormalizeColumnTotal( self, matrix, rows, cols ):
         """normalize a matrix by the column total.
 
         Returns the normalized matrix."""
-        nrows, ncols = matrix.shape
-        totals = [sum( matrix[:,y] ) for y in range(ncols) ]
-        for x in range(nrows):
-            for y in range(ncols):
-                m = totals[y]
-                if m != 0: matrix[x,y] /= m
-        return matrix, rows, cols
+        return self.normalize( matrix, matrix.sum( axis = 0 ), axis = 0 ), rows, cols
 
     def transformNormalizeColumnFirst( self, matrix, rows, cols ):
         """normalize a matrix by the first column.
@@ -766,12 +870,7 @@ class MatrixBase:
         Removes the first column.
 
         Returns the normalized matrix."""
-        nrows, ncols = matrix.shape
-        for x in range(nrows):
-            m = matrix[x,0]
-            for y in range(1,ncols):
-                if m != 0: matrix[x,y] /= m
-        matrix = numpy.delete( matrix, 0, 1)
+        matrix = self.normalize( matrix[:,1:], matrix[:,0], axis = 1 )
         return matrix, rows, cols[1:]
 
     def transformNormalizeColumnMax( self, matrix, rows, cols ):
@@ -779,14 +878,7 @@ class MatrixBase:
 
         Returns the normalized matrix.
         """
-        nrows, ncols = matrix.shape
-
-        for y in range(ncols) :
-            m = max(matrix[:,y])
-            if m != 0:
-                for x in range(nrows):
-                    matrix[x,y] /= m
-        return matrix, rows, cols
+        return self.normalize( matrix, matrix.max( axis = 0 ), axis = 0 ), rows, cols
 
     def render( self, work, path ):
         """render the data.
@@ -852,7 +944,7 @@ class TableMatrix(TableBase, MatrixBase):
                      apply_transformations = True,
                      take = None,
                      ignore = None,
-                     dtype = numpy.float ):
+                     dtype = numpy.float64 ):
         """build a matrix from work, a two-level nested dictionary.
 
         If *take* is given, then the matrix will be built from
@@ -869,11 +961,12 @@ class TableMatrix(TableBase, MatrixBase):
         rows = list(dataframe.index)
         columns = list(dataframe.columns)
 
-        matrix = dataframe.as_matrix()
+        # a copy, as transformations are applied in place
+        matrix = numpy.array( dataframe.values, dtype = dtype )
         
         if self.converters and apply_transformations:
             for converter in self.converters: 
-                self.debug("applying converter %s" % converter)
+                self.debug("applying converter %s", converter )
                 matrix, rows, columns = converter(matrix, rows, columns)
 
         # convert rows/columns to str (might be None)
@@ -35,12 +35,25 @@ class Transformer(Component):
     Levels:
     0 - the actual data point
     1 - dictionary of data points
+
+    Transformers that set :attr:`chunked` receive
+    :class:`Utils.ChunkedResult` objects in place of a
+    dictionary of columns. All other transformers receive
+    the fully loaded columns.
     '''
 
     capabilities = ['transform']
 
     nlevels = None
 
+    # transformer can consume chunked results
+    chunked = False
+
+    # transformer returns data much smaller than its input, 
+    # for example summary statistics. Leaves spilled to disk
+    # are only worth it if the first transformer reduces the data.
+    reduces = False
+
     def __init__(self,*args,**kwargs):
         pass
 
@@ -48,16 +61,24 @@ class Transformer(Component):
 
         if self.nlevels == None: raise NotImplementedError("incomplete implementation of %s" % str(self))
 
-        labels = DataTree.getPaths( data )        
-        debug( "transform: started with paths: %s" % labels)
-        assert len(labels) >= self.nlevels, "expected at least %i levels - got %i" % (self.nlevels, len(labels))
-        if self.nlevels:
-            paths = list(itertools.product( *labels[:-self.nlevels] ))
+        nlevels = self.nlevels
+        if not self.chunked:
+            data = DataTree.loadChunks( data )
+        elif nlevels and DataTree.hasChunks( data ):
+            # a chunked result takes the place of a dictionary of columns
+            nlevels -= 1
+
+        labels = DataTree.getPaths( data )
+        debug( "transform: started with paths: %s", labels )
+        assert len(labels) >= nlevels, "expected at least %i levels - got %i" % (nlevels, len(labels))
+        if nlevels:
+            paths = list(itertools.product( *labels[:-nlevels] ))
         else:
             paths = list(itertools.product( *labels ))
 
         for path in paths:
-            work = DataTree.getLeaf( data, path )
+            # spilled leaves are only loaded while they are transformed
+            work = DataTree.loadSpilled( DataTree.getLeaf( data, path ) )
             if not work: continue
             new_data = self.transform( work, path )
             if new_data is not None:
@@ -70,7 +91,8 @@ class Transformer(Component):
                 warn( "no data at %s - removing branch" % str(path))
                 DataTree.removeLeaf( data, path )
 
-        debug( "transform: finished with paths: %s" % DataTree.getPaths( data ))
+        if logging.getLogger().isEnabledFor( logging.DEBUG ):
+            debug( "transform: finished with paths: %s", DataTree.getPaths( data ) )
 
         return data
         
@@ -105,7 +127,7 @@ class TransformerToLabels( Transformer ):
         self.labels = kwargs.get("tf-labels", None)
         
     def transform(self, data, path):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         if len(data) == 0: return data
         
@@ -154,7 +176,7 @@ class TransformerToList( Transformer ):
         Transformer.__init__( self, *args, **kwargs )
 
     def transform(self, data, path ):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         lists = odict()
 
@@ -192,7 +214,7 @@ class TransformerToRDataFrame( Transformer ):
         Transformer.__init__( self, *args, **kwargs )
 
     def transform(self, data, path ):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         t = odict()
         for minor_key, values in data.items():
@@ -226,7 +248,7 @@ class TransformerToDataFrame( Transformer ):
         
     def __call__( self, data ):
         
-        result = DataTree.asDataFrame( data )
+        result = DataTree.asDataFrame( DataTree.loadSpilled( DataTree.loadChunks( data ) ) )
         return odict( ( ('all', result),) )
 
 ########################################################################
@@ -257,7 +279,7 @@ class TransformerIndicator( Transformer ):
         except KeyError: pass
                           
     def transform(self, data, path):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         vals = data[self.filter]
         return odict(list(zip( vals, [1] * len(vals) )))
@@ -284,6 +306,8 @@ class TransformerCount( Transformer ):
     nlevels = 1
     default = 0
 
+    reduces = True
+
     options = Transformer.options +\
         ( ('tf-level', directives.length_or_unitless), )
 
@@ -294,7 +318,7 @@ class TransformerCount( Transformer ):
         except KeyError: pass
                           
     def transform(self, data, path):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         for v in list(data.keys()):
             data[v] = len(data[v])
@@ -348,7 +372,7 @@ class TransformerFilter( Transformer ):
         self.nlevels = int(kwargs.get("tf-level", self.nlevels) )
                           
     def transform(self, data, path):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         for v in list(data.keys()):
             if v not in self.filter:
@@ -392,7 +416,7 @@ class TransformerSelect( Transformer ):
                           
 
     def transform(self, data, path):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         nfound = 0
         for v in list(data.keys()):
@@ -461,7 +485,7 @@ class TransformerGroup( Transformer ):
         self.field = self.fields[0]
 
     def transform(self, data, path):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         nfound = 0
         new_data = odict()
@@ -525,7 +549,7 @@ class TransformerCombinations( Transformer ):
         self.nlevels = int(kwargs.get("tf-level", self.nlevels) )
 
     def transform(self, data, path):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         vals =  list(data.keys())
         new_data = odict()
@@ -586,17 +610,33 @@ class TransformerStats( Transformer ):
        sum=55
        q1=3
        q3=8
+
+    Chunked results are summarized without loading them into
+    memory. All columns are summarized in the same passes. Columns without numerical values
+    are skipped.
     '''
     nlevels = 0
 
+    chunked = True
+
+    reduces = True
+
     def __init__(self,*args,**kwargs):
         Transformer.__init__( self, *args, **kwargs )
 
     def transform(self, data, path ):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         if Utils.isArray( data ):
             return Stats.Summary( data )._data
+        elif Utils.isChunked( data ):
+            result = odict()
+            for column, summary in Stats.summariesFromChunks( data ).items():
+                if summary is None:
+                    warn( "%s: no numerical values in column %s - skipped" % (str(self), column) )
+                    continue
+                result[column] = summary._data
+            return result or None
         else:
             return None
 
@@ -612,11 +652,13 @@ class TransformerPairwise( Transformer ):
     method = None
     paired = False
 
+    reduces = True
+
     def __init__(self,*args,**kwargs):
         Transformer.__init__( self, *args, **kwargs )
 
     def transform(self, data, path ):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
 
         if len(list(data.keys())) < 2:
             raise ValueError( "expected at least two arrays, got only %s." % str(list(data.keys())) )
@@ -812,10 +854,13 @@ class TransformerAggregate( Transformer ):
         add value of first bin to all other bins
         and set first bin to 0.
 
+    Chunked results are converted chunk by chunk.
     '''
 
     nlevels = 1
 
+    chunked = True
+
     options = Transformer.options +\
         ( ('tf-aggregate', directives.unchanged), )
 
@@ -834,6 +879,15 @@ class TransformerAggregate( Transformer ):
             "relevel-with-first": self.relevel_with_first,
             }
 
+        # converters working in-place on a list of chunks
+        self.mMapChunkConverter = {
+            self.normalize_max : self.normalize_max_chunks,
+            self.normalize_total : self.normalize_total_chunks,
+            self.cumulate : self.cumulate_chunks,
+            self.reverse_cumulate : self.reverse_cumulate_chunks,
+            self.relevel_with_first : self.relevel_with_first_chunks,
+            }
+
         if "tf-aggregate" in kwargs:
             for x in kwargs["tf-aggregate"].split(","):
                 try:
@@ -859,7 +913,7 @@ class TransformerAggregate( Transformer ):
     def normalize_max( self, data ):
         """normalize a data vector by maximum.
         """
-        if data == None or len(data) == 0: return data
+        if data is None or len(data) == 0: return data
         m = max(data)
         data = data.astype( numpy.float )
         # numpy does not throw at division by zero, but sets values to Inf
@@ -869,7 +923,7 @@ class TransformerAggregate( Transformer ):
         """re-level data - add value of first bin to all other bins
         and set first bin to 0.
         """
-        if data == None or len(data) == 0: return data
+        if data is None or len(data) == 0: return data
         v = data[0]
         data += v
         data[0] -= v
@@ -877,7 +931,7 @@ class TransformerAggregate( Transformer ):
 
     def normalize_total( self, data ):
         """normalize a data vector by the total"""
-        if data == None or len(data) == 0: return data
+        if data is None or len(data) == 0: return data
         try:
             m = sum(data)
         except TypeError:
@@ -892,8 +946,67 @@ class TransformerAggregate( Transformer ):
     def reverse_cumulate( self, data ):
         return data[::-1].cumsum()[::-1]
 
+    def normalize_max_chunks( self, chunks ):
+        '''normalize chunks by maximum.'''
+        m = max( [ x.max() for x in chunks ] )
+        for x in chunks: x /= m
+
+    def relevel_with_first_chunks( self, chunks ):
+        '''re-level chunks with the first value.'''
+        v = chunks[0][0]
+        for x in chunks: x += v
+        chunks[0][0] -= v
+
+    def normalize_total_chunks( self, chunks ):
+        '''normalize chunks by the total.'''
+        m = sum( [ x.sum() for x in chunks ] )
+        for x in chunks: x /= m
+
+    def cumulate_chunks( self, chunks ):
+        '''cumulate chunks, carrying the total from chunk to chunk.'''
+        total = 0
+        for x in chunks:
+            x.cumsum( out = x )
+            x += total
+            total = x[-1]
+
+    def reverse_cumulate_chunks( self, chunks ):
+        '''reverse cumulate chunks, starting from the last chunk.'''
+        total = 0
+        for x in reversed( chunks ):
+            r = x[::-1]
+            r.cumsum( out = r )
+            x += total
+            total = x[0]
+
+    def transformChunks( self, data ):
+        '''convert the columns of a chunked result *data*.
+
+        Values are converted to floating point numbers as the chunks
+        are read and the converters are applied in-place to each chunk.
+        '''
+        columns = None
+        for chunk in data:
+            if columns is None: columns = odict( [ (key, []) for key in chunk.keys() ] )
+            for x, (key, values) in enumerate( chunk.items() ):
+                # first pair is bins - do not transform
+                if x > 0: values = numpy.array( values, dtype = numpy.float64 )
+                if len(values): columns[key].append( values )
+
+        if columns is None: return None
+
+        for key, chunks in list(columns.items())[1:]:
+            if not chunks: continue
+            for converter in self.mConverters: 
+                self.mMapChunkConverter[converter]( chunks )
+
+        return odict( [ (key, numpy.concatenate( chunks )) for key, chunks in columns.items() ] )
+
     def transform(self, data, path):
-        debug( "%s: called" % str(self))
+        debug( "%s: called", self )
+
+        if Utils.isChunked( data ):
+            return self.transformChunks( data )
 
         to_delete = set()
         first = True
@@ -923,11 +1036,16 @@ class TransformerHistogram( TransformerAggregate ):
        Result (tf-bins=5]:
        x=[ 1.   1.8  2.6  3.4  4.2]
        frequency=[5,3,0,2,1]
-     
+
+    Chunked results are binned column by column without loading
+    them into memory. Unless a range is given, this requires
+    two passes over the data.
     '''
 
     nlevels = 0
 
+    reduces = True
+
     options = Transformer.options +\
         ( ('tf-bins', directives.unchanged), 
           ('tf-range', directives.unchanged), 
@@ -960,6 +1078,74 @@ class TransformerHistogram( TransformerAggregate ):
             return [ (bins[x] - bins[x-1]) / 2.0 for x in range(1,len(bins)) ]
         elif self.mBbinMarker == "right": return bins[1:]
 
+    def getRange( self ):
+        '''return minimum, maximum and bin size from the tf-range
+        option. Values that are not set are None.'''
+        mi, ma, binsize = None, None, None
+        if self.mRange != None: 
+            vals = [ x.strip() for x in self.mRange.split(",") ]
+            if len(vals) == 3: mi, ma, binsize = vals[0], vals[1], float(vals[2])
+            elif len(vals) == 2: mi, ma, binsize = vals[0], vals[1], None
+            elif len(vals) == 1: mi, ma, binsize = vals[0], None, None
+            if mi == "": mi = None
+            if mi != None: mi = float(mi)
+            if ma == "": ma = None
+            if ma != None: ma = float(ma)
+        return mi, ma, binsize
+
+    def getBins( self, mi, ma, binsize ):
+        '''return bins for a histogram of values between *mi* and *ma*.
+
+        returns a tuple of bins and the range for numpy.histogram.
+        Bins are None if there are no bins.
+        '''
+        if self.mBins.startswith("log"):
+
+            try:
+                a,b = self.mBins.split( "-" )
+            except ValueError:
+                raise SyntaxError( "expected log-xxx, got %s" % self.mBins )
+            nbins = float(b)
+            if ma < 0 or mi < 0: raise ValueError( "can not bin logarithmically for negative values.")
+            if mi == 0: mi = numpy.MachAr().epsneg
+            ma = numpy.log10( ma )
+            mi = numpy.log10( mi )
+            try:
+                bins = [ 10 ** x for x in numpy.arange( mi, ma, ma / nbins ) ]
+            except ValueError as msg:
+                raise ValueError("can not compute %i bins for %f-%f: %s" % \
+                                     (nbins, mi, ma, msg ) )
+        elif binsize != None:
+            # AH: why this sort statement? Removed
+            # data.sort()
+
+            # make sure that ma is part of bins
+            bins = numpy.arange(mi, ma + binsize, binsize )
+        else:
+            try:
+                bins = eval(self.mBins)
+            except SyntaxError as msg:
+                raise SyntaxError( "could not evaluate bins from `%s`, error=`%s`" \
+                                       % (self.mBins, msg))
+
+        if hasattr( bins, "__iter__"):
+            if len(bins) == 0:
+                warn( "empty bins")
+                return None, (mi, ma)
+            if self.max_bins > 0 and len(bins) > self.max_bins:
+                # truncate number of bins
+                warn( "too many bins (%i) - truncated to (%i)" % (len(bins), self.max_bins))
+                bins = self.max_bins
+
+        return bins, (mi, ma)
+
+    def dictToHistogram( self, counts ):
+        '''convert a dictionary of *counts* to bins and values.'''
+        bin_edges = sorted( counts.keys() )
+        hist = numpy.array( [ counts[x] for x in bin_edges ], dtype = numpy.int64 )
+        bin_edges.append( bin_edges[-1] + 1 )
+        return self.binToX(bin_edges), hist
+
     def toHistogram( self, data ):
         '''compute the histogram.'''
         ndata = [ x for x in data if x != None and x != 'None' ]
@@ -973,89 +1159,130 @@ class TransformerHistogram( TransformerAggregate ):
             warn( "empty histogram" )
             return None, None
 
-        binsize = None
-
-        if self.mRange != None: 
-            vals = [ x.strip() for x in self.mRange.split(",") ]
-            if len(vals) == 3: mi, ma, binsize = vals[0], vals[1], float(vals[2])
-            elif len(vals) == 2: mi, ma, binsize = vals[0], vals[1], None
-            elif len(vals) == 1: mi, ma, binsize = vals[0], None, None
-            if mi == None or mi == "": mi = min(data)
-            else: mi = float(mi)
-            if ma == None or ma == "": ma = max(data)
-            else: ma = float(ma)
-        else:
-            mi, ma= min( data ), max(data)
+        mi, ma, binsize = self.getRange()
+        if mi == None: mi = min(data)
+        if ma == None: ma = max(data)
 
         if self.mBins.startswith("dict"):
             h = collections.defaultdict( int )
             for x in data: h[x] += 1
-            bin_edges = sorted( h.keys() )
-            hist = numpy.zeros( len(bin_edges), numpy.int )
-            for x in range(len(bin_edges)): hist[x] = h[bin_edges[x]]
-            bin_edges.append( bin_edges[-1] + 1 )
-        else:
-            if self.mBins.startswith("log"):
+            return self.dictToHistogram( h )
 
-                try:
-                    a,b = self.mBins.split( "-" )
-                except ValueError:
-                    raise SyntaxError( "expected log-xxx, got %s" % self.mBins )
-                nbins = float(b)
-                if ma < 0 or mi < 0: raise ValueError( "can not bin logarithmically for negative values.")
-                if mi == 0: mi = numpy.MachAr().epsneg
-                ma = numpy.log10( ma )
-                mi = numpy.log10( mi )
-                try:
-                    bins = [ 10 ** x for x in numpy.arange( mi, ma, ma / nbins ) ]
-                except ValueError as msg:
-                    raise ValueError("can not compute %i bins for %f-%f: %s" % \
-                                         (nbins, mi, ma, msg ) )
-            elif binsize != None:
-                # AH: why this sort statement? Removed
-                # data.sort()
-
-                # make sure that ma is part of bins
-                bins = numpy.arange(mi, ma + binsize, binsize )
-            else:
-                try:
-                    bins = eval(self.mBins)
-                except SyntaxError as msg:
-                    raise SyntaxError( "could not evaluate bins from `%s`, error=`%s`" \
-                                           % (self.mBins, msg))
-
-
-            if hasattr( bins, "__iter__"):
-                if len(bins) == 0:
-                    warn( "empty bins")
-                    return None, None
-                if self.max_bins > 0 and len(bins) > self.max_bins:
-                    # truncate number of bins
-                    warn( "too many bins (%i) - truncated to (%i)" % (len(bins), self.max_bins))
-                    bins = self.max_bins
-
-            # ignore histogram semantics warning
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                hist, bin_edges = numpy.histogram( data, bins=bins, range=(mi,ma) )
+        bins, bin_range = self.getBins( mi, ma, binsize )
+        if bins is None: return None, None
+
+        # ignore histogram semantics warning
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            hist, bin_edges = numpy.histogram( data, bins=bins, range=bin_range )
         
         return self.binToX(bin_edges), hist
 
-    def transform(self, data, path):
-        debug( "%s: called for path %s" % (str(self), str(path)))
+    def toHistogramsFromChunks( self, chunks ):
+        '''compute a histogram for each column in *chunks*, an object 
+        that can be iterated over several times returning dictionaries
+        of columns.
 
-        if not Utils.isArray( data ): return None
+        All columns are processed in the same pass over *chunks*.
+        Missing values are removed.
+
+        returns a dictionary mapping columns to tuples of bins and 
+        values.
+        '''
+        mi, ma, binsize = self.getRange()
+        columns = []
+
+        def _empty( column ):
+            warn( "empty histogram for column %s" % column )
+            return None, None
+
+        if self.mBins.startswith("dict"):
+            hists = {}
+            for chunk in chunks:
+                if not columns:
+                    columns = list(chunk.keys())
+                    hists = dict( [ (x, collections.defaultdict( int )) for x in columns ] )
+                for column in columns:
+                    keys, counts = numpy.unique( Stats.toNumeric( chunk[column] ), return_counts = True )
+                    h = hists[column]
+                    for key, count in zip( keys, counts ): h[key] += count
+            return odict( [ (x, self.dictToHistogram( hists[x] ) if hists[x] else _empty( x )) \
+                                for x in columns ] )
+
+        # determine the range of each column in a first pass
+        ranges = {}
+        for chunk in chunks:
+            if not columns:
+                columns = list(chunk.keys())
+                ranges = dict( [ (x, [numpy.inf, -numpy.inf]) for x in columns ] )
+            if mi != None and ma != None: break
+            for column in columns:
+                values = Stats.toNumeric( chunk[column] )
+                if len(values) == 0: continue
+                r = ranges[column]
+                r[0] = min( r[0], values.min() )
+                r[1] = max( r[1], values.max() )
+
+        bins = odict()
+        for column in columns:
+            data_min, data_max = ranges[column]
+            if mi == None or ma == None:
+                if data_min > data_max: continue
+            bins[column] = self.getBins( data_min if mi == None else mi,
+                                         data_max if ma == None else ma, 
+                                         binsize )
+
+        hists, bin_edges, nvalues = {}, {}, collections.defaultdict( int )
+        # ignore histogram semantics warning
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for chunk in chunks:
+                for column, (b, bin_range) in bins.items():
+                    if b is None: continue
+                    values = Stats.toNumeric( chunk[column] )
+                    nvalues[column] += len(values)
+                    h, bin_edges[column] = numpy.histogram( values, bins=b, range=bin_range )
+                    if column not in hists: hists[column] = h
+                    else: hists[column] += h
+
+        result = odict()
+        for column in columns:
+            if column in bins and bins[column][0] is None:
+                result[column] = (None, None)
+            elif column not in bins or nvalues[column] == 0:
+                result[column] = _empty( column )
+            else:
+                result[column] = (self.binToX(bin_edges[column]), hists[column])
+        return result
 
-        bins, values = self.toHistogram(data)
-        if bins != None:
+    def toData( self, bins, values ):
+        '''apply converters to histogram *values* and return
+        a dictionary with bins and values.'''
+        if bins is not None:
             for converter in self.mConverters: values = converter(values)
 
-        debug( "%s: completed for path %s" % (str(self), str(path)))            
         header = "bins"
         #if len(path) > 1: header = path[-1]
         #else: header = "bins"
         return odict( ((header, bins), ("frequency", values)))
 
+    def transform(self, data, path):
+        debug( "%s: called for path %s", self, path )
+
+        if Utils.isChunked( data ):
+            result = odict()
+            for column, histogram in self.toHistogramsFromChunks( data ).items():
+                result[column] = self.toData( *histogram )
+            debug( "%s: completed for path %s", self, path )            
+            return result
+
+        if not Utils.isArray( data ): return None
+
+        result = self.toData( *self.toHistogram(data) )
+
+        debug( "%s: completed for path %s", self, path )            
+        return result
+
 class TransformerMelt( Transformer ):
     ''' Create a melted table
 
@@ -1101,7 +1328,7 @@ class TransformerMelt( Transformer ):
 
         titles = ["Data","Slice","Track"]
 
-        lol = self.melt(data)
+        lol = self.melt( DataTree.loadSpilled( DataTree.loadChunks( data ) ) )
 
         ntitles = len(lol)
 
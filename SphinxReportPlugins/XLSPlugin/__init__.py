@@ -1,4 +1,4 @@
-import os, re
+import os, re, shutil
 from SphinxReport.Component import *
 from SphinxReport import Config
 
@@ -22,7 +22,8 @@ class XLSPlugin(Component):
                  links = {}):
         '''collect xls output from result blocks.
 
-        xls output is written to a file and a link will be inserted at
+        xls output has been saved to a temporary file by the renderer. The
+        file is moved to the output directory and a link will be inserted at
         the place holder.
         '''
         map_figure2text = {}
@@ -34,8 +35,8 @@ class XLSPlugin(Component):
                 outname = "%s_%s" % (template_name, block.title)
                 outputpath = os.path.join(outdir, '%s.%s' % (outname, extension))
 
-                # save to file
-                block.xls.save( outputpath )
+                # move to output directory
+                shutil.move( block.xls, outputpath )
                 
                 # use absolute path
                 link = os.path.abspath( outputpath )
@@ -145,6 +145,7 @@ setup(name='SphinxReport',
             'html=SphinxReportPlugins.HTMLPlugin:HTMLPlugin',
             'rst=SphinxReportPlugins.RSTPlugin:RSTPlugin',
             'xls=SphinxReportPlugins.XLSPlugin:XLSPlugin',
+            'pagedtable=SphinxReportPlugins.PagedTablePlugin:PagedTablePlugin',
             'transform-stats=SphinxReportPlugins.Transformer:TransformerStats',
             'transform-correlation=SphinxReportPlugins.Transformer:TransformerCorrelationPearson',
             'transform-pearson=SphinxReportPlugins.Transformer:TransformerCorrelationPearson',
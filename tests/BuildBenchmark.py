@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+'''benchmark sphinxreport-build on a synthetic report.
+
+The script creates a report with a configurable number of
+pages and ``.. report::`` directives per page. The directives use
+trackers reading synthetic data from an SQLite database and from
+tab-separated files. The report is then built with
+:command:`sphinxreport-build` for several numbers of jobs in
+three phases:
+
+cold
+   without cache and without rendered output.
+warm
+   with the data cache populated, but without rendered output.
+noop
+   with rendered output present, nothing needs to be done.
+
+For each build the time, the number of directives per second
+and the peak memory of the largest process is reported, for
+example::
+
+   python tests/BuildBenchmark.py --pages=20 --directives=10 --jobs=1,2,4 --dest=/tmp/report
+
+The report is only created if *dest* does not contain a
+:file:`conf.py`. Use :option:`--create-only` to create a report
+without building it.
+'''
+
+import sys, os, optparse, time, json, shutil, sqlite3, subprocess, random
+
+from collections import OrderedDict as odict
+
+USAGE = """python %s [OPTIONS]
+
+benchmark sphinxreport-build on a synthetic report.
+""" % sys.argv[0]
+
+CONF_PY = """import sys, os
+sys.path.extend( [os.path.abspath('.'), os.path.abspath('trackers') ] )
+extensions = [ 'SphinxReport.report_directive',
+               'SphinxReport.errors_directive',
+               'SphinxReport.warnings_directive' ]
+source_suffix = '.rst'
+master_doc = 'contents'
+project = 'Benchmark report'
+exclude_trees = ['_build']
+"""
+
+INI = """[report]
+sql_backend=sqlite:///./csvdb
+cachedir=_cache
+urls=code
+images=hires,hires.png,100
+"""
+
+TRACKERS_PY = """from SphinxReport.Tracker import *
+
+class SQLValues( TrackerSQL ):
+    '''values of y for each track.'''
+    pattern = "(.*)_data$"
+
+    def __call__(self, track, slice = None ):
+        return odict( ( ("y", self.getValues( "SELECT y FROM %%(track)s_data" ) ), ) )
+
+class SQLColumns( TrackerSQL ):
+    '''values of x and y for each track.'''
+    pattern = "(.*)_data$"
+
+    def __call__(self, track, slice = None ):
+        return self.getAll( "SELECT x, y FROM %%(track)s_data ORDER BY x" )
+
+class SQLSummary( TrackerSQL ):
+    '''summary statistics for each track and category.'''
+    pattern = "(.*)_data$"
+    slices = %(categories)r
+
+    def __call__(self, track, slice = None ):
+        return self.getRow( '''SELECT COUNT(*) AS counts, AVG(x) AS mean_x, AVG(y) AS mean_y
+                               FROM %%(track)s_data WHERE category = '%%(slice)s' ''' )
+"""
+
+# directives are created from these templates in turn
+DIRECTIVES = ( """.. report:: Trackers.SQLValues
+   :render: table
+   :transform: stats
+   :tracks: %(tracks)s
+
+   Statistics of values
+""",
+               """.. report:: Trackers.SQLSummary
+   :render: matrix
+   :tracks: %(tracks)s
+
+   Summary per category
+""",
+               """.. report:: Trackers.SQLColumns
+   :render: line-plot
+   :tracks: %(tracks)s
+
+   Values of x and y
+""",
+               """.. report:: Trackers.SQLValues
+   :render: box-plot
+   :tracks: %(tracks)s
+
+   Distribution of values
+""",
+               """.. report:: Trackers.SQLValues
+   :render: line-plot
+   :transform: histogram
+   :tracks: %(tracks)s
+
+   Histogram of values
+""",
+               """.. report:: Trackers.SQLSummary
+   :render: bar-plot
+   :tracks: %(tracks)s
+
+   Counts per category
+""",
+               """.. report:: Tracker.TrackerDataframes
+   :render: table
+   :glob: data/*.tsv
+   :regex: data/(.*).tsv
+   :tracks: %(tracks)s
+
+   Data from tab-separated files
+""" )
+
+CATEGORIES = ( "alpha", "beta", "gamma" )
+
+def createData( dest, ntracks, nrows, rng ):
+    '''create an SQLite database and tab-separated files with
+    *nrows* rows for each of *ntracks* tracks.'''
+    tracks = [ "track%i" % x for x in range( ntracks ) ]
+    datadir = os.path.join( dest, "data" )
+    if not os.path.exists( datadir ): os.makedirs( datadir )
+
+    dbhandle = sqlite3.connect( os.path.join( dest, "csvdb" ) )
+    for track in tracks:
+        rows = [ ( x, rng.gauss( 10, 3 ), rng.choice( CATEGORIES ) ) for x in range( nrows ) ]
+        dbhandle.execute( "DROP TABLE IF EXISTS %s_data" % track )
+        dbhandle.execute( "CREATE TABLE %s_data (x INTEGER, y REAL, category TEXT)" % track )
+        dbhandle.executemany( "INSERT INTO %s_data VALUES (?,?,?)" % track, rows )
+        with open( os.path.join( datadir, "%s.tsv" % track ), "w" ) as outf:
+            outf.write( "x\ty\tcategory\n" )
+            outf.write( "".join( [ "%i\t%f\t%s\n" % row for row in rows ] ) )
+    dbhandle.commit()
+    dbhandle.close()
+    return tracks
+
+def createReport( dest, npages, ndirectives, ntracks, nrows, tracks_per_directive = 3, seed = 1 ):
+    '''create a report in *dest* with *npages* pages of *ndirectives*
+    directives each.
+
+    Each directive selects a random subset of *tracks_per_directive*
+    tracks so that the output of directives differs.
+
+    returns the number of directives.
+    '''
+    rng = random.Random( seed )
+    for d in ( "", "trackers", "pages" ):
+        dd = os.path.join( dest, d )
+        if not os.path.exists( dd ): os.makedirs( dd )
+
+    tracks = createData( dest, ntracks, nrows, rng )
+
+    def write( filename, contents ):
+        with open( os.path.join( dest, filename ), "w" ) as outf:
+            outf.write( contents )
+
+    write( "conf.py", CONF_PY )
+    write( "sphinxreport.ini", INI )
+    write( os.path.join( "trackers", "Trackers.py" ),
+           TRACKERS_PY % { "categories" : list( CATEGORIES ) } )
+
+    pages, n = [], 0
+    for page in range( npages ):
+        name = "page%04i" % page
+        title = "Page %i" % page
+        lines = [ title, "=" * len(title), "" ]
+        for x in range( ndirectives ):
+            selected = rng.sample( tracks, min( tracks_per_directive, len(tracks) ) )
+            lines.append( DIRECTIVES[n % len(DIRECTIVES)] % { "tracks" : ",".join( selected ) } )
+            n += 1
+        write( os.path.join( "pages", name + ".rst" ), "\n".join( lines ) )
+        pages.append( "pages/" + name )
+
+    write( "contents.rst", "Benchmark report\n================\n\n.. toctree::\n   :maxdepth: 1\n\n%s\n" % \
+               "\n".join( [ "   %s" % x for x in pages ] ) )
+
+    return n
+
+def countDirectives( dest ):
+    '''return the number of directives in the report in *dest*.'''
+    n = 0
+    for root, dirs, files in os.walk( dest ):
+        if "_build" in root: continue
+        for f in files:
+            if f.endswith( ".rst" ):
+                n += len( [ x for x in open( os.path.join( root, f ) ) if x.startswith( ".. report::" ) ] )
+    return n
+
+def clean( dest, phase ):
+    '''remove output from a previous build for *phase*.'''
+    if phase == "noop": return
+    remove = [ "_build", os.path.join( "_static", "report_directive" ) ]
+    if phase == "cold": remove.append( "_cache" )
+    for d in remove:
+        d = os.path.join( dest, d )
+        if os.path.exists( d ): shutil.rmtree( d )
+
+def runBuild( command, dest, logfile ):
+    '''run *command* in *dest*.
+
+    returns a tuple of wall clock time in seconds, return code and
+    the peak resident set size in kilobytes of the largest process.
+    '''
+    with open( logfile, "w" ) as outf:
+        start = time.time()
+        process = subprocess.Popen( command, shell = True, cwd = dest,
+                                    stdout = outf, stderr = subprocess.STDOUT )
+        try:
+            # the resource usage of the child includes the
+            # largest of its terminated children, such as
+            # the workers of sphinxreport-build
+            pid, status, usage = os.wait4( process.pid, 0 )
+            process.returncode = os.WEXITSTATUS( status ) if os.WIFEXITED( status ) else -os.WTERMSIG( status )
+            rss = usage.ru_maxrss
+            if sys.platform == "darwin": rss //= 1024
+        except AttributeError:
+            # os.wait4 not available on windows
+            process.wait()
+            rss = 0
+        seconds = time.time() - start
+    return seconds, process.returncode, rss
+
+def main( argv = None ):
+
+    if argv == None: argv = sys.argv
+
+    parser = optparse.OptionParser( version = "%prog version: $Id$", usage = USAGE )
+
+    parser.add_option( "-d", "--dest", dest="dest", type="string",
+                       help="directory of the report [default=%default]" )
+
+    parser.add_option( "-p", "--pages", dest="pages", type="int",
+                       help="number of pages [default=%default]" )
+
+    parser.add_option( "-m", "--directives", dest="directives", type="int",
+                       help="number of directives per page [default=%default]" )
+
+    parser.add_option( "--tracks", dest="tracks", type="int",
+                       help="number of tracks in the synthetic data [default=%default]" )
+
+    parser.add_option( "--rows", dest="rows", type="int",
+                       help="number of rows per track in the synthetic data [default=%default]" )
+
+    parser.add_option( "-j", "--jobs", dest="jobs", type="string",
+                       help="comma separated list of the number of jobs [default=%default]" )
+
+    parser.add_option( "--phases", dest="phases", type="string",
+                       help="comma separated list of phases to run, "
+                       "choose from cold, warm and noop [default=%default]" )
+
+    parser.add_option( "--command", dest="command", type="string",
+                       help="command to build the report. ``%(jobs)i`` is "
+                       "replaced with the number of jobs [default=%default]" )
+
+    parser.add_option( "--create-only", dest="create_only", action="store_true",
+                       help="only create the report [default=%default]" )
+
+    parser.add_option( "-o", "--output-file", dest="output_file", type="string",
+                       help="save results as JSON in this file [default=%default]" )
+
+    parser.set_defaults( dest = "benchmark_report",
+                         pages = 10,
+                         directives = 10,
+                         tracks = 10,
+                         rows = 1000,
+                         jobs = "1,2,4",
+                         phases = "cold,warm,noop",
+                         command = "sphinxreport-build --num-jobs=%(jobs)i sphinx-build -b html -d _build/doctrees . _build/html",
+                         create_only = False,
+                         output_file = None )
+
+    (options, args) = parser.parse_args( argv[1:] )
+
+    dest = os.path.abspath( options.dest )
+    if os.path.exists( os.path.join( dest, "conf.py" ) ):
+        ndirectives = countDirectives( dest )
+        sys.stderr.write( "# using existing report in %s with %i directives\n" % (dest, ndirectives) )
+    else:
+        ndirectives = createReport( dest, options.pages, options.directives,
+                                    options.tracks, options.rows )
+        sys.stderr.write( "# created report in %s with %i directives\n" % (dest, ndirectives) )
+
+    if options.create_only: return
+
+    phases = [ x.strip() for x in options.phases.split(",") ]
+    for phase in phases:
+        if phase not in ( "cold", "warm", "noop" ):
+            raise ValueError( "unknown phase %s" % phase )
+
+    results = []
+    print( "jobs\tphase\tseconds\tdirectives_per_second\tpeak_rss_mb\treturncode" )
+    for jobs in [ int(x) for x in options.jobs.split(",") ]:
+        for phase in phases:
+            clean( dest, phase )
+            seconds, returncode, rss = runBuild( options.command % { "jobs" : jobs }, dest,
+                                                 os.path.join( dest, "benchmark-%s-%i.log" % (phase, jobs) ) )
+            result = odict( ( ("jobs", jobs),
+                              ("phase", phase),
+                              ("seconds", seconds),
+                              ("directives_per_second", ndirectives / seconds),
+                              ("peak_rss_mb", rss / 1024.0),
+                              ("returncode", returncode) ) )
+            results.append( result )
+            print( "%i\t%s\t%f\t%f\t%f\t%i" % tuple( result.values() ) )
+            sys.stdout.flush()
+
+    if options.output_file:
+        with open( options.output_file, "w" ) as outf:
+            json.dump( odict( ( ("directives", ndirectives),
+                                ("parameters", dict( [ (x, getattr( options, x )) for x in \
+                                                           ("pages", "directives", "tracks", "rows", "command") ] )),
+                                ("time", time.strftime( "%Y-%m-%d %H:%M:%S" )),
+                                ("results", results) ) ),
+                       outf, indent = 2 )
+
+    if [ x for x in results if x["returncode"] != 0 ]: return 1
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+'''unit testing code for logging from several processes.
+'''
+
+import unittest
+import logging
+import multiprocessing
+import time
+import io
+
+from SphinxReport import Logger
+
+class Unformattable(object):
+    '''fails if converted to a string.'''
+    def __str__(self):
+        raise ValueError( "formatted" )
+
+def work( x ):
+    logging.debug( "debug %s", Unformattable() )
+    logging.info( "info %i", x )
+    logging.warning( "warning %i", x )
+    return x
+
+class LoggerTest(unittest.TestCase):
+    '''check that records from workers are received and counted.'''
+
+    def testListener( self ):
+        stream = io.StringIO()
+        handler = logging.StreamHandler( stream )
+        handler.setFormatter( logging.Formatter( "%(levelname)s %(message)s" ) )
+        listener = Logger.LogListener( handler, logging.INFO )
+        listener.start()
+        pool = multiprocessing.Pool( 2, Logger.initWorker, (listener.queue, listener.level) )
+        try:
+            self.assertEqual( pool.map( work, range( 4 ) ), list( range( 4 ) ) )
+        finally:
+            pool.close()
+            pool.join()
+        start = time.time()
+        listener.stop()
+        self.assertTrue( time.time() - start < 1 )
+
+        counts = listener.getCounts()
+        self.assertEqual( counts["INFO"], 4 )
+        self.assertEqual( counts["WARNING"], 4 )
+        self.assertEqual( counts["DEBUG"], 0 )
+        lines = sorted( stream.getvalue().splitlines() )
+        self.assertEqual( lines[:2], ["INFO info 0", "INFO info 1"] )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+'''benchmark matrix transformations of the matrix renderers.
+
+Times each transformation in :class:`MatrixBase` on a square
+random matrix, for example::
+
+   python tests/MatrixBenchmark.py --size=5000
+'''
+
+import sys, optparse, time
+
+import numpy
+
+from SphinxReportPlugins import Renderer
+
+USAGE = """python %s [OPTIONS]
+
+benchmark matrix transformations.
+""" % sys.argv[0]
+
+def main():
+
+    parser = optparse.OptionParser( version = "%prog version: $Id$", usage = USAGE )
+
+    parser.add_option( "-s", "--size", dest="size", type="int",
+                       help="number of rows and columns of the matrix [default=%default]" )
+
+    parser.add_option( "-t", "--transform", dest="transforms", type="string", action="append",
+                       help="transformation to benchmark. The default is all [default=%default]" )
+
+    parser.add_option( "-r", "--repeats", dest="repeats", type="int",
+                       help="number of repeats, the minimum time is reported [default=%default]" )
+
+    parser.set_defaults( size = 5000,
+                         transforms = [],
+                         repeats = 3 )
+
+    (options, args) = parser.parse_args()
+
+    renderer = Renderer.TableMatrix()
+    transforms = options.transforms or sorted( renderer.mMapKeywordToTransform.keys() )
+
+    numpy.random.seed( 1 )
+    matrix = numpy.random.rand( options.size, options.size )
+    rows = [ "r%i" % x for x in range( options.size ) ]
+    cols = [ "c%i" % x for x in range( options.size ) ]
+
+    print( "transform\tsize\tseconds" )
+    for transform in transforms:
+        f = renderer.mMapKeywordToTransform[transform]
+        times = []
+        for x in range( options.repeats ):
+            work = matrix.copy()
+            start = time.time()
+            f( work, rows, cols )
+            times.append( time.time() - start )
+        print( "%s\t%i\t%f" % (transform, options.size, min(times) ) )
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+'''unit testing code for matrix transformations.
+'''
+
+import unittest
+
+import numpy
+
+from SphinxReportPlugins import Renderer
+from SphinxReport import CorrespondenceAnalysis
+
+class MatrixTransformTest(unittest.TestCase):
+    '''check vectorized matrix transformations against explicit loops.'''
+
+    def setUp( self ):
+        self.renderer = Renderer.TableMatrix()
+        numpy.random.seed( 1 )
+        self.matrix = numpy.random.rand( 5, 5 )
+        self.matrix[2,:] = 0
+        self.rows = [ "r%i" % x for x in range(5) ]
+        self.cols = [ "c%i" % x for x in range(5) ]
+
+    def check( self, transform, expected ):
+        result, rows, cols = transform( self.matrix.copy(), self.rows, self.cols )
+        self.assertTrue( numpy.allclose( result, expected ) )
+        return rows, cols
+
+    def testNormalizeRowTotal( self ):
+        expected = self.matrix.copy()
+        for x in range( 5 ):
+            if expected[x,:].sum() != 0: expected[x,:] /= expected[x,:].sum()
+        self.check( self.renderer.transformNormalizeRowTotal, expected )
+
+    def testNormalizeColumnFirst( self ):
+        expected = self.matrix.copy()
+        for x in range( 5 ):
+            if expected[x,0] != 0: expected[x,1:] /= expected[x,0]
+        rows, cols = self.check( self.renderer.transformNormalizeColumnFirst, expected[:,1:] )
+        self.assertEqual( cols, self.cols[1:] )
+
+    def testSymmetricMax( self ):
+        expected = self.matrix.copy()
+        for x in range( 5 ):
+            for y in range( x + 1, 5 ):
+                expected[x,y] = expected[y,x] = max( expected[x,y], expected[y,x] )
+        self.check( self.renderer.transformSymmetricMax, expected )
+
+    def testSort( self ):
+        rows = self.rows[::-1]
+        result, rows, cols = self.renderer.transformSort( self.matrix.copy(), rows, self.cols )
+        self.assertEqual( rows, self.rows )
+        self.assertTrue( numpy.allclose( result, self.matrix[::-1,:] ) )
+
+    def testAddRowTotal( self ):
+        rows, cols = self.check( self.renderer.transformAddRowTotal,
+                                 numpy.hstack( (self.matrix, self.matrix.sum( axis = 1 )[:,numpy.newaxis] ) ) )
+        self.assertEqual( cols[-1], "total" )
+
+    def testCorrespondenceAnalysis( self ):
+        matrix = numpy.random.poisson( 2, (60, 50) ) + 1
+        matrix[:30,:25] += 5
+        dense = CorrespondenceAnalysis.GetIndices( matrix )
+        max_dense = CorrespondenceAnalysis.MAX_DENSE
+        try:
+            # force truncated SVD
+            CorrespondenceAnalysis.MAX_DENSE = 10
+            truncated = CorrespondenceAnalysis.GetIndices( matrix )
+        finally:
+            CorrespondenceAnalysis.MAX_DENSE = max_dense
+        self.assertTrue( numpy.allclose( dense[0], truncated[0] ) )
+        self.assertTrue( numpy.allclose( dense[1], truncated[1] ) )
+        # blocks are separated along the first axis
+        order = list( numpy.argsort( dense[0] ) )
+        block = set( range( 30 ) )
+        self.assertTrue( set( order[:30] ) == block or set( order[30:] ) == block )
+
+if __name__ == "__main__":
+    unittest.main()
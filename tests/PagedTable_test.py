@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+'''unit testing code for columnar storage of large tables.
+'''
+
+import unittest
+import tempfile
+import shutil
+import os
+
+import numpy
+import pandas
+
+from SphinxReport import PagedTable
+
+class PagedTableTest(unittest.TestCase):
+    '''check writing and paging through a table.'''
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join( self.tmpdir, "test.table" )
+        self.dataframe = pandas.DataFrame(
+            { 'value' : numpy.arange( 250 ) % 7,
+              'name' : [ "n%i" % x for x in range( 250 ) ] },
+            columns = ('value', 'name'),
+            index = pandas.Index( [ "r%i" % x for x in range(250) ], name = 'track' ) )
+        PagedTable.writeTable( self.dataframe, self.path )
+        self.table = PagedTable.PagedTable( self.path )
+
+    def tearDown( self ):
+        shutil.rmtree( self.tmpdir )
+
+    def testPage( self ):
+        headers, rows, total = self.table.getPage( 2, 100 )
+        self.assertEqual( headers, ['track', 'value', 'name'] )
+        self.assertEqual( total, 250 )
+        self.assertEqual( len(rows), 50 )
+        self.assertEqual( rows[0], ['r200', 200 % 7, 'n200'] )
+
+    def testSortAndFilter( self ):
+        headers, rows, total = self.table.getPage( 0, 10,
+                                                   sort = "value",
+                                                   ascending = False,
+                                                   filters = [ ("value", ">=5"),
+                                                               ("name", "^n1") ] )
+        expected = self.dataframe[ (self.dataframe.value >= 5) &
+                                   self.dataframe.name.str.startswith( "n1" ) ]
+        self.assertEqual( total, len(expected) )
+        self.assertEqual( [ x[1] for x in rows ], [6] * 10 )
+
+    def testSortStable( self ):
+        for ascending in (True, False):
+            headers, rows, total = self.table.getPage( 0, 250, sort = "value", ascending = ascending )
+            expected = self.dataframe.reset_index()
+            expected["row"] = numpy.arange( 250 )
+            expected = expected.sort_values( ["value", "row"], ascending = [ascending, True] )
+            self.assertEqual( [ x[0] for x in rows ], list(expected.track) )
+
+    def testRoundTrip( self ):
+        dataframe = self.table.asDataFrame()
+        self.assertEqual( list(dataframe.index), list(self.dataframe.index) )
+        self.assertEqual( list(dataframe.value), list(self.dataframe.value) )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+'''benchmark the tracker, transformer and renderer pipeline.
+
+A synthetic tracker creates a data tree with a configurable number
+of tracks, slices, nesting depth and type and size of leaves. The
+benchmark times :meth:`Dispatcher.collect`, transformers,
+:func:`DataTree.asDataFrame` and :meth:`Dispatcher.render` for
+several renderers, for example::
+
+   python tests/PipelineBenchmark.py --tracks=100 --leaf=array --output-file=before.json
+   python tests/PipelineBenchmark.py --tracks=100 --leaf=array --compare=before.json
+
+Results are saved as JSON. Benchmarks that fail are recorded with
+their error message. Benchmarks that fail, but succeeded in the
+results given by ``--compare``, are counted as regressions.
+'''
+
+import sys, optparse, time, copy, json, platform
+
+import numpy
+import pandas
+
+from collections import OrderedDict as odict
+
+from SphinxReport import Tracker, Dispatcher, DataTree
+
+USAGE = """python %s [OPTIONS]
+
+benchmark the tracker, transformer and renderer pipeline.
+""" % sys.argv[0]
+
+# renderers and transformers benchmarked by default for each type of leaf
+DEFAULT_RENDERERS = { "scalar" : ( "Table", "TableMatrix", "BarPlot" ),
+                      "array" : ( "Table", "LinePlot", "BoxPlot", "ScatterPlot" ),
+                      "dataframe" : ( "Table", ) }
+
+DEFAULT_TRANSFORMERS = { "scalar" : (),
+                         "array" : ( "TransformerStats", "TransformerHistogram", "TransformerAggregate" ),
+                         "dataframe" : () }
+
+class SyntheticTracker( Tracker.Tracker ):
+    '''tracker returning random data.
+
+    Each track and slice returns a tree of *depth* - 2
+    additional levels of *width* nodes each. Leaves are
+
+    scalar
+       a dictionary of *size* numbers
+    array
+       a dictionary of two arrays ``x`` and ``y`` of length *size*
+    dataframe
+       a dataframe with *size* rows and three columns
+    '''
+
+    def __init__(self, ntracks = 10, nslices = 5, depth = 2, width = 2,
+                 leaf = "array", size = 100, seed = 1 ):
+        Tracker.Tracker.__init__(self)
+        self.tracks = [ "track%i" % x for x in range( ntracks ) ]
+        self.slices = [ "slice%i" % x for x in range( nslices ) ]
+        self.depth, self.width = depth, width
+        self.leaf, self.size = leaf, size
+        self.random = numpy.random.RandomState( seed )
+
+    def getLeaf( self ):
+        if self.leaf == "scalar":
+            return odict( [ ("value%i" % x, self.random.rand()) for x in range( self.size ) ] )
+        elif self.leaf == "array":
+            return odict( ( ("x", numpy.arange( self.size, dtype = numpy.float64 ) ),
+                            ("y", self.random.normal( 10, 3, self.size ) ) ) )
+        elif self.leaf == "dataframe":
+            return pandas.DataFrame( self.random.rand( self.size, 3 ), columns = ("a", "b", "c") )
+        raise ValueError( "unknown leaf type %s" % self.leaf )
+
+    def getTree( self, depth ):
+        if depth <= 0: return self.getLeaf()
+        return odict( [ ("level%i" % x, self.getTree( depth - 1 ) ) for x in range( self.width ) ] )
+
+    def __call__(self, track, slice ):
+        return self.getTree( self.depth - 2 )
+
+def getComponent( name ):
+    '''return an instance of the renderer or transformer *name*.'''
+    from SphinxReportPlugins import Renderer, Transformer
+    for module in ( Renderer, Transformer ):
+        if hasattr( module, name ): return getattr( module, name )()
+    from SphinxReportPlugins import Plotter
+    return getattr( Plotter, name )()
+
+def closeFigures():
+    if "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close( "all" )
+
+def getDispatcher( tracker, renderer, transformers = () ):
+    dispatcher = Dispatcher.Dispatcher( tracker, renderer, list(transformers) )
+    dispatcher.parseArguments( nocache = True )
+    return dispatcher
+
+def timeit( f, setup, repeats ):
+    '''call *f* with the result of *setup* *repeats* times.
+
+    returns the times in seconds.
+    '''
+    times = []
+    for x in range( repeats ):
+        args = setup()
+        start = time.time()
+        f( *args )
+        times.append( time.time() - start )
+        closeFigures()
+    return times
+
+def runBenchmarks( tracker, renderers, transformers, repeats ):
+    '''run all benchmarks.
+
+    returns a dictionary of benchmark names and results.
+    '''
+    from SphinxReportPlugins import Renderer
+
+    def collect():
+        dispatcher = getDispatcher( tracker, Renderer.Table() )
+        dispatcher.collect()
+        return dispatcher.data
+
+    benchmarks = [ ( "collect",
+                     lambda d: d.collect(),
+                     lambda: ( getDispatcher( tracker, Renderer.Table() ), ) ) ]
+
+    data = collect()
+
+    benchmarks.append( ( "asDataFrame",
+                         DataTree.asDataFrame,
+                         lambda: ( copy.deepcopy( data ), ) ) )
+
+    for name in transformers:
+        benchmarks.append( ( "transform:%s" % name,
+                             lambda transformer, d: transformer( d ),
+                             lambda name = name: ( getComponent( name ), copy.deepcopy( data ) ) ) )
+
+    def prepareRender( name ):
+        dispatcher = getDispatcher( tracker, getComponent( name ) )
+        dispatcher.data = copy.deepcopy( data )
+        for f in ( dispatcher.transform, dispatcher.restrict, dispatcher.exclude,
+                   dispatcher.prune, dispatcher.group ):
+            f()
+        return ( dispatcher, )
+
+    for name in renderers:
+        benchmarks.append( ( "render:%s" % name,
+                             lambda d: d.render(),
+                             lambda name = name: prepareRender( name ) ) )
+
+    results = odict()
+    for name, f, setup in benchmarks:
+        try:
+            times = timeit( f, setup, repeats )
+            results[name] = { "seconds" : min( times ), "times" : times }
+        except Exception as msg:
+            results[name] = { "error" : "%s: %s" % (msg.__class__.__name__, msg) }
+        sys.stderr.write( "# %s finished\n" % name )
+    return results
+
+def main( argv = None ):
+
+    if argv == None: argv = sys.argv
+
+    parser = optparse.OptionParser( version = "%prog version: $Id$", usage = USAGE )
+
+    parser.add_option( "--tracks", dest="tracks", type="int",
+                       help="number of tracks [default=%default]" )
+
+    parser.add_option( "--slices", dest="slices", type="int",
+                       help="number of slices [default=%default]" )
+
+    parser.add_option( "--depth", dest="depth", type="int",
+                       help="number of levels in the data tree, at least 2 [default=%default]" )
+
+    parser.add_option( "--width", dest="width", type="int",
+                       help="number of nodes in levels below slices [default=%default]" )
+
+    parser.add_option( "--leaf", dest="leaf", type="choice",
+                       choices = ("scalar", "array", "dataframe"),
+                       help="type of leaves [default=%default]" )
+
+    parser.add_option( "--leaf-size", dest="leaf_size", type="int",
+                       help="number of values per leaf [default=%default]" )
+
+    parser.add_option( "-r", "--renderer", dest="renderers", type="string", action="append",
+                       help="renderer to benchmark. The default depends on the type of leaves [default=%default]" )
+
+    parser.add_option( "-t", "--transformer", dest="transformers", type="string", action="append",
+                       help="transformer to benchmark. The default depends on the type of leaves [default=%default]" )
+
+    parser.add_option( "-n", "--repeats", dest="repeats", type="int",
+                       help="number of repeats, the minimum time is reported [default=%default]" )
+
+    parser.add_option( "-o", "--output-file", dest="output_file", type="string",
+                       help="save results as JSON in this file [default=%default]" )
+
+    parser.add_option( "-c", "--compare", dest="compare", type="string",
+                       help="compare with results in JSON file [default=%default]" )
+
+    parser.add_option( "--threshold", dest="threshold", type="float",
+                       help="relative increase in time that is a regression [default=%default]" )
+
+    parser.set_defaults( tracks = 10,
+                         slices = 5,
+                         depth = 2,
+                         width = 2,
+                         leaf = "array",
+                         leaf_size = 1000,
+                         renderers = [],
+                         transformers = [],
+                         repeats = 3,
+                         output_file = None,
+                         compare = None,
+                         threshold = 0.2 )
+
+    (options, args) = parser.parse_args( argv[1:] )
+
+    tracker = SyntheticTracker( options.tracks, options.slices, options.depth, options.width,
+                                options.leaf, options.leaf_size )
+
+    renderers = options.renderers or DEFAULT_RENDERERS[options.leaf]
+    transformers = options.transformers or DEFAULT_TRANSFORMERS[options.leaf]
+
+    results = runBenchmarks( tracker, renderers, transformers, options.repeats )
+
+    parameters = dict( [ (x, getattr( options, x )) for x in \
+                             ("tracks", "slices", "depth", "width", "leaf", "leaf_size", "repeats") ] )
+
+    previous = {}
+    if options.compare:
+        with open( options.compare ) as inf:
+            previous = json.load( inf )
+        if previous["parameters"] != parameters:
+            sys.stderr.write( "# warning: parameters differ from %s\n" % options.compare )
+        previous = previous["results"]
+
+    nregressions = 0
+    print( "benchmark\tseconds\tprevious\tchange\tstatus" )
+    for name, result in results.items():
+        old = previous.get( name, {} ).get( "seconds", None )
+        if "error" in result:
+            # benchmarks failing now that succeeded before are regressions
+            if old:
+                print( "%s\tna\t%f\tna\tregression: %s" % (name, old, result["error"]) )
+                nregressions += 1
+            else:
+                print( "%s\tna\tna\tna\t%s" % (name, result["error"]) )
+            continue
+        seconds = result["seconds"]
+        if old:
+            change = ( seconds - old ) / old
+            status = ""
+            if change > options.threshold:
+                status = "regression"
+                nregressions += 1
+            elif change < -options.threshold:
+                status = "improvement"
+            print( "%s\t%f\t%f\t%+5.1f%%\t%s" % (name, seconds, old, 100.0 * change, status) )
+        else:
+            print( "%s\t%f\tna\tna\t" % (name, seconds) )
+
+    if options.output_file:
+        with open( options.output_file, "w" ) as outf:
+            json.dump( odict( ( ("parameters", parameters),
+                                ("platform", odict( ( ("python", platform.python_version()),
+                                                      ("numpy", numpy.__version__),
+                                                      ("pandas", pandas.__version__),
+                                                      ("machine", platform.machine()) ) ) ),
+                                ("time", time.strftime( "%Y-%m-%d %H:%M:%S" )),
+                                ("results", results) ) ),
+                       outf, indent = 2 )
+
+    if nregressions > 0: return 1
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+'''unit testing code for profiling events.
+'''
+
+import unittest
+import tempfile
+import shutil
+import os
+import json
+import time
+
+import numpy
+import pandas
+
+from SphinxReport import Profiler, profile, DataTree, Utils
+
+def spin( seconds ):
+    start = time.time()
+    while time.time() - start < seconds: pass
+
+class ProfilerTest(unittest.TestCase):
+    '''check that profiling events are written and summarized.'''
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+        self.profilefile = Profiler.PROFILEFILE
+        Profiler.PROFILEFILE = os.path.join( self.tmpdir, "sphinxreport.profile" )
+        # discard events left by other tests
+        del Profiler.EVENTS[:]
+
+    def tearDown( self ):
+        Profiler.PROFILEFILE = self.profilefile
+        shutil.rmtree( self.tmpdir )
+
+    def testEvents( self ):
+        Profiler.setDirective( "report.rst:10" )
+        with Profiler.profile( "render", self ) as p:
+            p.add( blocks = 2 )
+        try:
+            with Profiler.profile( "collect", "tracker" ):
+                raise ValueError( "no data" )
+        except ValueError:
+            pass
+        Profiler.event( "start", "transform", "tracker" )
+        Profiler.setDirective( None )
+        Profiler.flush()
+
+        events = [ json.loads( x ) for x in open( Profiler.PROFILEFILE ) ]
+        self.assertEqual( [ x["event"] for x in events ], ["start", "finish", "start", "finish", "start"] )
+        self.assertTrue( events[1]["name"].endswith( "Profiler_test.ProfilerTest" ) )
+        self.assertEqual( events[1]["directive"], "report.rst:10" )
+        self.assertEqual( events[1]["blocks"], 2 )
+        self.assertEqual( events[3]["error"], "ValueError" )
+        self.assertEqual( events[1]["pid"], os.getpid() )
+
+        spans, unfinished = profile.getSpans( profile.readEvents( open( Profiler.PROFILEFILE ) ) )
+        self.assertEqual( [ x["stage"] for x in spans ], ["render", "collect"] )
+        self.assertTrue( spans[0]["duration"] >= 0 )
+        self.assertEqual( [ x["stage"] for x in unfinished ], ["transform"] )
+
+        Profiler.reset()
+        self.assertEqual( os.path.getsize( Profiler.PROFILEFILE ), 0 )
+
+    def testDisabled( self ):
+        # values from sphinxreport.ini are strings
+        for value in ( False, "false", "0", "off" ):
+            Utils.PARAMS["report_profile"] = value
+            try:
+                self.assertFalse( Profiler.isEnabled() )
+                with Profiler.profile( "render", self ): pass
+                Profiler.event( "start", "transform", "tracker" )
+                self.assertEqual( Profiler.EVENTS, [] )
+                Profiler.flush()
+                self.assertFalse( os.path.exists( Profiler.PROFILEFILE ) )
+            finally:
+                Utils.PARAMS["report_profile"] = True
+
+        Utils.PARAMS["report_profile"] = "true"
+        try:
+            self.assertTrue( Profiler.isEnabled() )
+        finally:
+            Utils.PARAMS["report_profile"] = True
+
+    def testStacks( self ):
+        def span( stage, start, end, pid = 1 ):
+            return { "stage" : stage, "name" : "x", "directive" : "a.rst:1", "worker" : "w%i" % pid,
+                     "pid" : pid, "start" : start, "time" : end, "duration" : end - start }
+        spans = [ span( "directive", 0, 10 ), span( "collect", 1, 4 ), span( "tracker", 2, 3 ),
+                  span( "render", 5, 9 ), span( "directive", 0, 2, pid = 2 ) ]
+        stacks = profile.getStacks( spans )
+        self.assertEqual( stacks[("w1", "a.rst:1")], 3 )
+        self.assertEqual( stacks[("w1", "a.rst:1", "collect:x")], 2 )
+        self.assertEqual( stacks[("w1", "a.rst:1", "collect:x", "tracker:x")], 1 )
+        self.assertEqual( stacks[("w1", "a.rst:1", "render:x")], 4 )
+        self.assertEqual( stacks[("w2", "a.rst:1")], 2 )
+
+    def testCriticalPath( self ):
+        def span( stage, worker, start, end, directive = None, name = None ):
+            return { "stage" : stage, "name" : name, "directive" : directive, "worker" : worker,
+                     "pid" : worker, "start" : start, "time" : end, "duration" : end - start }
+        spans = [ span( "build", "main", 0, 10 ),
+                  span( "directive", "w1", 1, 3, "a.rst:1" ), span( "directive", "w1", 3, 9, "a.rst:5" ),
+                  span( "directive", "w2", 1, 5, "b.rst:1" ),
+                  span( "tracker", "w1", 1, 2, "a.rst:1", "T" ) ]
+        result = profile.getCriticalPath( spans )
+        self.assertEqual( result["makespan"], 10 )
+        self.assertEqual( result["busy"], { "w1" : 8, "w2" : 4 } )
+        self.assertEqual( result["idle"], { "w1" : 2, "w2" : 6 } )
+        self.assertEqual( [ x["directive"] for x in result["path"] ], ["a.rst:1", "a.rst:5"] )
+        self.assertEqual( result["bound"], 6 )
+
+        # compare with a faster run
+        faster = [ span( "tracker", "w1", 1, 1.5, "a.rst:1", "T" ), span( "tracker", "w1", 2, 2.25, "a.rst:1", "U" ) ]
+        self.assertEqual( profile.compareProfiles( faster, spans, ("tracker",), 0.2, 0.1 ),
+                          [ ("tracker", "T", 0.5, 1, 1.0, "regression"), ("tracker", "U", 0.25, None, None, "removed") ] )
+        self.assertEqual( profile.compareProfiles( spans, faster, ("tracker",), 0.2, 0.1 )[0][-1], "improvement" )
+
+    def testSampleSlow( self ):
+        filename = os.path.join( self.tmpdir, "slow", "block.slow" )
+        with Profiler.sampleSlow( 1, filename ):
+            pass
+        with Profiler.sampleSlow( None, filename ):
+            spin( 0.1 )
+        self.assertFalse( os.path.exists( filename ) )
+
+        with Profiler.sampleSlow( 0.05, filename, "report.rst:10", interval = 0.005 ):
+            spin( 0.3 )
+        lines = open( filename ).readlines()
+        self.assertEqual( lines[0], "# profile of report.rst:10\n" )
+        self.assertTrue( [ x for x in lines if x.endswith( "Profiler_test.spin\n" ) ] )
+        stacks = open( filename + ".folded" ).readlines()
+        self.assertTrue( [ x for x in stacks if "Profiler_test.testSampleSlow;" in x and "Profiler_test.spin" in x ] )
+
+    def testSize( self ):
+        data = { "a" : numpy.zeros( 10 ), 
+                 "b" : { "c" : pandas.DataFrame( { "x" : numpy.zeros( 5 ) } ), "d" : [1, 2] } }
+        leaves, nbytes = DataTree.getSize( data )
+        self.assertEqual( leaves, 3 )
+        self.assertTrue( nbytes >= 120 )
+
+if __name__ == "__main__":
+    unittest.main()
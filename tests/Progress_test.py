@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+'''unit testing code for progress reporting.
+'''
+
+import unittest
+import tempfile
+import shutil
+import os
+import json
+import io
+
+from SphinxReport import Progress
+
+class ProgressTest(unittest.TestCase):
+    '''check that progress events are collected and reported.'''
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+        self.statusfile = os.path.join( self.tmpdir, "status.json" )
+
+    def tearDown( self ):
+        Progress.QUEUE = None
+        shutil.rmtree( self.tmpdir )
+
+    def testProgress( self ):
+        progress = Progress.Progress( 4 )
+        event = { "worker" : "w1", "pid" : 1, "rss" : 2048 }
+        progress.update( dict( event, event = "start", tracker = "T", directive = "a.rst:1" ) )
+        status = progress.getStatus()
+        self.assertEqual( [ x["tracker"] for x in status["running"] ], ["T"] )
+        self.assertEqual( status["eta"], None )
+        self.assertTrue( "running: T" in progress.formatStatus( status ) )
+
+        progress.update( dict( event, event = "finish" ) )
+        progress.update( dict( event, event = "failed", skipped = 1 ) )
+        status = progress.getStatus()
+        self.assertEqual( status["done"], 3 )
+        self.assertEqual( status["failed"], 1 )
+        self.assertEqual( status["running"], [] )
+        self.assertEqual( status["workers"]["w1"]["done"], 3 )
+        self.assertTrue( status["eta"] >= 0 )
+
+    def testListener( self ):
+        stream = io.StringIO()
+        listener = Progress.ProgressListener( 2, interval = 60, statusfile = self.statusfile, stream = stream )
+        listener.start()
+        self.assertEqual( json.load( open( self.statusfile ) )["done"], 0 )
+
+        # events are ignored without a queue
+        Progress.sendEvent( "finish" )
+        Progress.QUEUE = listener.queue
+        for x in range( 2 ):
+            Progress.sendEvent( "start", tracker = "T", directive = "a.rst:%i" % x )
+            Progress.sendEvent( "finish" )
+        listener.stop()
+
+        status = json.load( open( self.statusfile ) )
+        self.assertEqual( status["status"], "finished" )
+        self.assertEqual( status["done"], 2 )
+        self.assertTrue( status["workers"]["MainProcess"]["rss"] > 0 )
+        self.assertTrue( stream.getvalue().splitlines()[-1].startswith( "SphinxReport: 2/2 directives (100%)" ) )
+        self.assertEqual( [ x for x in os.listdir( self.tmpdir ) if x.startswith( ".tmp" ) ], [] )
+
+if __name__ == "__main__":
+    unittest.main()
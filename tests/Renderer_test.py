@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+'''unit testing code for SphinxReport renderers.
+'''
+
+import unittest
+import os
+
+import numpy
+import pandas
+import openpyxl
+
+from SphinxReport import Utils
+from SphinxReport.ResultBlock import ResultBlocks
+from SphinxReportPlugins import Renderer
+
+class TableOutputTest(unittest.TestCase):
+    '''check the vectorized table output against pandas.'''
+
+    def setUp( self ):
+        self.renderer = Renderer.Table()
+        self.dataframe = pandas.DataFrame(
+            { 'ints' : [1, 2, 3],
+              'floats' : [1.5, numpy.nan, 3.0],
+              'text' : ['a,b', '`link <http://x>`_', None] },
+            columns = ('ints', 'floats', 'text'),
+            index = pandas.Index( ['r1', 'r2', 'r3'], name = 'track' ) )
+
+    def testCSV( self ):
+        header, rows = self.renderer.asCSV( self.dataframe )
+        self.assertEqual( header, "track,ints,floats,text" )
+        self.assertEqual( rows, [ 'r1,1,1.5,"a,b"',
+                                  'r2,2,,`link <http://x>`_',
+                                  'r3,3,3.0,' ] )
+
+    def testHierarchicalIndex( self ):
+        index = pandas.MultiIndex.from_tuples( [('a','x'), ('a','y')],
+                                               names = ['track', 'slice'] )
+        header, rows = self.renderer.asCSV( pandas.DataFrame( {'v' : [1,2]}, index = index ) )
+        self.assertEqual( header, "track,slice,v" )
+        self.assertEqual( rows, [ "a,x,1", "a,y,2" ] )
+
+    def testHTML( self ):
+        r = self.renderer.asFile( self.dataframe,
+                                  self.dataframe.index,
+                                  self.dataframe.columns,
+                                  "test" )
+        lines = r.html.split("\n")
+        self.assertEqual( lines[1], "<tr><th>track</th><th>ints</th><th>floats</th><th>text</th></tr>" )
+        self.assertEqual( lines[2], "<tr><td>r1</td><td>1</td><td>1.5</td><td>a,b</td></tr>" )
+        self.assertEqual( lines[3], '<tr><td>r2</td><td>2</td><td></td><td><a href="http://x">link</a></td></tr>' )
+
+    def testSpreadSheet( self ):
+        r = self.renderer.asSpreadSheet( self.dataframe,
+                                         self.dataframe.index,
+                                         self.dataframe.columns,
+                                         "test" )
+        try:
+            wb = openpyxl.load_workbook( r.xls )
+            rows = [ [ c.value for c in row ] for row in wb.worksheets[0].iter_rows() ]
+        finally:
+            os.remove( r.xls )
+        self.assertEqual( rows[0], ['track', 'ints', 'floats', 'text'] )
+        self.assertEqual( rows[2], ['r2', 2, None, '=HYPERLINK("http://x","link")'] )
+        self.assertEqual( rows[3], ['r3', 3, 3, None] )
+
+    def testRemoveSpreadSheets( self ):
+        r = self.renderer.asSpreadSheet( self.dataframe,
+                                         self.dataframe.index,
+                                         self.dataframe.columns,
+                                         "test" )
+        self.assertTrue( os.path.exists( r.xls ) )
+        Utils.removeSpreadSheets( ResultBlocks( ResultBlocks( r ) ) )
+        self.assertFalse( os.path.exists( r.xls ) )
+
+if __name__ == "__main__":
+    unittest.main()
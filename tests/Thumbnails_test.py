@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+'''unit testing code for the thumbnail cache.
+'''
+
+import unittest
+import tempfile
+import shutil
+import os
+
+import numpy
+import matplotlib.image
+
+from SphinxReport import Thumbnails, Tracker, Utils
+
+class ThumbnailsTest(unittest.TestCase):
+    '''check that thumbnails are only created for new images.'''
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+        self.thumbdir = os.path.join( self.tmpdir, "thumbnails" )
+        self.images = []
+        for x in range( 3 ):
+            filename = os.path.join( self.tmpdir, "image%i.png" % x )
+            matplotlib.image.imsave( filename, numpy.ones( (40, 40) ) * x, vmin = 0, vmax = 2 )
+            self.images.append( filename )
+
+    def tearDown( self ):
+        shutil.rmtree( self.tmpdir )
+
+    def testUpdate( self ):
+        cache = Thumbnails.ThumbnailCache( self.thumbdir )
+        thumbnails = cache.update( self.images, processes = 2 )
+        self.assertEqual( list( thumbnails.keys() ), self.images )
+        for thumbnail in thumbnails.values():
+            self.assertEqual( matplotlib.image.imread( thumbnail ).shape[:2], (12, 12) )
+
+        # identical images share a thumbnail
+        shutil.copy( self.images[0], os.path.join( self.tmpdir, "copy.png" ) )
+        self.assertEqual( cache.getThumbnail( os.path.join( self.tmpdir, "copy.png" ) ),
+                          thumbnails[self.images[0]] )
+
+        # existing thumbnails are not created again
+        makeThumbnail = Thumbnails.makeThumbnail
+        Thumbnails.makeThumbnail = None
+        try:
+            self.assertEqual( Thumbnails.ThumbnailCache( self.thumbdir ).update( self.images, processes = 1 ),
+                              thumbnails )
+        finally:
+            Thumbnails.makeThumbnail = makeThumbnail
+
+        # images that can not be read have no thumbnail
+        open( self.images[1], "w" ).write( "not an image" )
+        self.assertEqual( cache.update( self.images, processes = 1 )[self.images[1]], None )
+
+    def testIndex( self ):
+        for x, filename in enumerate( self.images ):
+            Thumbnails.addImage( self.thumbdir, "image%i" % x, filename, "caption %i" % x )
+        Thumbnails.addImage( self.thumbdir, "image0", self.images[0], "new caption" )
+        os.unlink( self.images[2] )
+
+        images = Thumbnails.readImages( self.thumbdir )
+        self.assertEqual( list( images.keys() ), ["image0", "image1"] )
+        self.assertEqual( images["image0"]["caption"], "new caption" )
+
+        Thumbnails.writeImages( self.thumbdir, images )
+        self.assertEqual( len( open( os.path.join( self.thumbdir, Thumbnails.IMAGE_INDEX ) ).readlines() ), 2 )
+
+    def testTrackerImages( self ):
+        cache_dir = Utils.PARAMS["report_cachedir"]
+        Utils.PARAMS["report_cachedir"] = os.path.join( self.tmpdir, "cache" )
+        try:
+            t = Tracker.TrackerImages( glob = os.path.join( self.tmpdir, "*.png" ) )
+            self.assertEqual( t.getTracks(), self.images )
+            t.prefetch( [ (x,) for x in t.getTracks() ] )
+            data = t( self.images[1] )
+            self.assertEqual( data["filename"], self.images[1] )
+            self.assertTrue( os.path.exists( data["thumbnail"] ) )
+        finally:
+            Utils.PARAMS["report_cachedir"] = cache_dir
+
+if __name__ == "__main__":
+    unittest.main()
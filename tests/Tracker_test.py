@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+'''unit testing code for SQL trackers.
+'''
+
+import unittest
+import tempfile
+import shutil
+import sqlite3
+import os
+import pickle
+import gzip
+
+import numpy
+
+from SphinxReport import Tracker
+from SphinxReport import Dispatcher
+from SphinxReport import Utils
+
+class TrackerSQLTest(unittest.TestCase):
+    '''check SQL trackers against a small sqlite database.'''
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join( self.tmpdir, "csvdb" )
+        self.backend = "sqlite:///%s" % self.filename
+        conn = sqlite3.connect( self.filename )
+        conn.execute( "CREATE TABLE experiment_data (track TEXT, slice TEXT, value INT, score FLOAT)" )
+        conn.executemany( "INSERT INTO experiment_data VALUES (?,?,?,?)",
+                          [ ("t%i" % (x % 3), "s%i" % (x % 2), x, x / 2.0) for x in range(12) ] )
+        conn.commit()
+        conn.close()
+        # keep schema catalogs and cached queries out of the working directory
+        self.cache_dir = Utils.PARAMS["report_cachedir"]
+        Utils.PARAMS["report_cachedir"] = os.path.join( self.tmpdir, "cache" )
+
+    def tearDown( self ):
+        Utils.PARAMS["report_cachedir"] = self.cache_dir
+        shutil.rmtree( self.tmpdir )
+
+    def testSharedEngine( self ):
+        t1 = Tracker.TrackerSQL( backend = self.backend )
+        t2 = Tracker.TrackerSQL( backend = self.backend )
+        self.assertEqual( t1.getValue( "SELECT COUNT(*) FROM experiment_data" ), 12 )
+        t2.connect()
+        self.assertTrue( t1.db is t2.db )
+
+    def testReadOnly( self ):
+        # writing is allowed by default
+        t = Tracker.TrackerSQL( backend = self.backend )
+        t.execute( "CREATE TEMP TABLE tmp_data (x INT)" )
+
+        pragmas = Utils.PARAMS["report_sql_pragmas"]
+        Utils.PARAMS["report_sql_pragmas"] = "query_only=ON"
+        try:
+            # pragmas are applied to new connections
+            Tracker.ENGINES.clear()
+            t = Tracker.TrackerSQL( backend = self.backend )
+            self.assertRaises( Tracker.SQLError, t.execute, "DELETE FROM experiment_data" )
+        finally:
+            Utils.PARAMS["report_sql_pragmas"] = pragmas
+            Tracker.ENGINES.clear()
+
+    def testOverflow( self ):
+        # more open results than pooled connections
+        results = [ iter( Tracker.SQLResult( self.backend, "SELECT value FROM experiment_data", chunk_size = 2 ) ) \
+                        for x in range( Utils.PARAMS["report_sql_pool_size"] + 3 ) ]
+        for result in results:
+            self.assertEqual( list( next( result )["value"] ), [0, 1] )
+
+    def testOverflowLimit( self ):
+        # connections beyond pool size and overflow are not opened
+        params = dict( [ (x, Utils.PARAMS[x]) for x in ( "report_sql_pool_size", 
+                                                         "report_sql_max_overflow",
+                                                         "report_sql_pool_timeout" ) ] )
+        Utils.PARAMS.update( { "report_sql_pool_size" : 1,
+                               "report_sql_max_overflow" : 2,
+                               "report_sql_pool_timeout" : 0.1 } )
+        Tracker.ENGINES.clear()
+        try:
+            results = [ iter( Tracker.SQLResult( self.backend, "SELECT value FROM experiment_data", chunk_size = 2 ) ) \
+                            for x in range( 3 ) ]
+            self.assertEqual( Tracker.getEngine( self.backend ).pool.checkedout(), 3 )
+            self.assertRaises( Tracker.SQLError, iter, 
+                               Tracker.SQLResult( self.backend, "SELECT value FROM experiment_data" ) )
+            # connections are available again once results are closed
+            del results
+            result = iter( Tracker.SQLResult( self.backend, "SELECT value FROM experiment_data", chunk_size = 2 ) )
+            self.assertEqual( list( next( result )["value"] ), [0, 1] )
+        finally:
+            Utils.PARAMS.update( params )
+            Tracker.ENGINES.clear()
+
+    def testSchemaCatalog( self ):
+        t = Tracker.TrackerSQL( backend = self.backend )
+        self.assertTrue( t.hasTable( "experiment_data" ) )
+        self.assertEqual( t.getColumns( "experiment_data" ), ["track", "slice", "value", "score"] )
+        self.assertEqual( len( os.listdir( Utils.PARAMS["report_cachedir"] ) ), 1 )
+
+        # changes to the database invalidate the catalog
+        conn = sqlite3.connect( self.filename )
+        conn.execute( "CREATE TABLE other_data (value INT)" )
+        conn.commit()
+        conn.close()
+        self.assertEqual( t.getTables( "_data$" ), ["experiment_data", "other_data"] )
+
+    def testGetAll( self ):
+        t = Tracker.TrackerSQL( backend = self.backend )
+        t.chunk_size = 5
+        data = t.getAll( "SELECT track, value, score FROM experiment_data" )
+        self.assertEqual( list(data.keys()), ["track", "value", "score"] )
+        self.assertEqual( data["value"], tuple(range(12)) )
+        self.assertEqual( data["score"][:2], (0.0, 0.5) )
+        self.assertEqual( t.getAll( "SELECT * FROM experiment_data WHERE value > 100" ), {} )
+
+    def testGetDataFrame( self ):
+        t = Tracker.TrackerSQL( backend = self.backend )
+        t.chunk_size = 5
+        df = t.getDataFrame( "SELECT slice, SUM(value) AS total FROM experiment_data GROUP BY slice" )
+        self.assertEqual( list(df.columns), ["slice", "total"] )
+        self.assertEqual( list(df.total), [30, 36] )
+        chunks = list( t.getColumnChunks( "SELECT value FROM experiment_data" ) )
+        self.assertEqual( [ len(x["value"]) for x in chunks ], [5, 5, 2] )
+
+    def testGetIter( self ):
+        t = Tracker.TrackerSQL( backend = self.backend )
+        self.assertEqual( [ x[0] for x in t.getIter( "SELECT value FROM experiment_data" ) ], list(range(12)) )
+
+    def testGetChunks( self ):
+        t = Tracker.TrackerSQL( backend = self.backend )
+        t.chunk_size = 5
+        result = t.getChunks( "SELECT value FROM experiment_data" )
+        # results can be iterated over repeatedly and pickled
+        self.assertEqual( [ len(x["value"]) for x in result ], [5, 5, 2] )
+        result = pickle.loads( pickle.dumps( result ) )
+        self.assertEqual( list(result.asColumns()["value"]), list(range(12)) )
+        self.assertEqual( result.getColumnNames(), ["value"] )
+
+    def testBindParameters( self ):
+        t = Tracker.TrackerSQL( backend = self.backend )
+        stmt = "SELECT value FROM experiment_data WHERE track = :track AND slice = :slice"
+        # frames are not inspected if bind parameters are given
+        getCallerLocals = Tracker.getCallerLocals
+        Tracker.getCallerLocals = None
+        try:
+            self.assertEqual( t.getValues( stmt, { "track" : "t1", "slice" : "s1" } ), [1, 7] )
+            self.assertEqual( t.getValues( stmt, { "track" : "t2", "slice" : "s0" } ), [2, 8] )
+            self.assertEqual( list( t.getChunks( stmt, { "track" : "t0", "slice" : "s0" } ).asColumns()["value"] ),
+                              [0, 6] )
+        finally:
+            Tracker.getCallerLocals = getCallerLocals
+        self.assertTrue( t.prepare( stmt ) is Tracker.TrackerSQL( backend = self.backend ).prepare( stmt ) )
+        # placeholders are still interpolated
+        track = "t1"
+        self.assertEqual( t.getValues( "SELECT value FROM experiment_data WHERE track = '%(track)s'" ),
+                          [1, 4, 7, 10] )
+
+    def testQueryCache( self ):
+        t = Tracker.TrackerSQL( backend = self.backend )
+        t.query_cache = True
+        stmt = "SELECT value FROM experiment_data WHERE track = 't1'"
+        self.assertEqual( t.getValues( stmt ), [1, 4, 7, 10] )
+
+        # identical statements are served from the cache
+        execute = t.execute
+        t.execute = None
+        self.assertEqual( t.getValues( stmt.replace( " ", "\n  " ) ), [1, 4, 7, 10] )
+        self.assertRaises( TypeError, t.getAll, stmt )
+        t.execute = execute
+
+        # changes to the database invalidate results
+        conn = sqlite3.connect( self.filename )
+        conn.execute( "INSERT INTO experiment_data VALUES ('t1', 's0', 12, 6.0)" )
+        conn.commit()
+        conn.close()
+        self.assertEqual( t.getValues( stmt ), [1, 4, 7, 10, 12] )
+
+        # the cache is limited in size
+        cache = Tracker.getQueryCache()
+        cache.max_size = 0
+        t.getValues( stmt + " AND value > 1" )
+        self.assertEqual( os.listdir( cache.directory ), [] )
+
+    def testQueryCacheEviction( self ):
+        cache = Tracker.QueryCache( os.path.join( self.tmpdir, "queries" ), 10000 )
+        cache.scan_interval = 10
+        scans = []
+        evict = cache.evict
+        def _evict():
+            scans.append( len(os.listdir( cache.directory )) )
+            evict()
+        cache.evict = _evict
+        value = "x" * 1000
+        for x in range( 30 ):
+            cache[cache.getKey( x )] = value
+        # first write, every 10th write and whenever the cache is full
+        self.assertTrue( len(scans) < 30 )
+        self.assertTrue( 10 in scans )
+        self.assertTrue( cache.size <= 10000 )
+        self.assertEqual( cache.size, sum( [ os.path.getsize( os.path.join( cache.directory, x ) ) \
+                                                 for x in os.listdir( cache.directory ) ] ) )
+        # most recent results are kept
+        self.assertEqual( cache[cache.getKey( 29 )], value )
+
+    def testPreload( self ):
+        conn = sqlite3.connect( self.filename )
+        conn.execute( "CREATE TABLE bins (bin INT, mouse FLOAT, human INT)" )
+        conn.executemany( "INSERT INTO bins VALUES (?,?,?)",
+                          [ (100, 1.5, 10), (200, None, 15), (300, 2.5, None) ] )
+        conn.execute( "CREATE TABLE edges (a TEXT, b TEXT, value INT, value2 INT)" )
+        conn.executemany( "INSERT INTO edges VALUES (?,?,?,?)",
+                          [ ("x", "y", 1, 2), ("x", "z", 3, None), ("y", "z", None, 4), ("x", "y", 5, 6) ] )
+        conn.commit()
+        conn.close()
+
+        class Columns( Tracker.SingleTableTrackerColumns ):
+            table = "bins"
+            column = "bin"
+
+        class EdgeList( Tracker.SingleTableTrackerEdgeList ):
+            table = "edges"
+            row = "a"
+            column = "b"
+            value = "value"
+            value2 = "value2"
+
+        def check( cls, expected ):
+            t = cls( backend = self.backend )
+            p = cls( backend = self.backend )
+            p.preload = True
+            result = [ t( track, slice ) for track in t.tracks for slice in t.slices ]
+            self.assertEqual( result, expected )
+            # slices might be passed as strings
+            self.assertEqual( [ p( track, str(slice) ) for track in t.tracks for slice in t.slices ], expected )
+            return t, p
+
+        t, p = check( Columns, [ 1.5, None, 2.5, 10, 15, None ] )
+        self.assertEqual( p( "mouse" ), t( "mouse" ) )
+        self.assertRaises( Tracker.exc.SQLAlchemyError, t, "mouse", 400 )
+        self.assertRaises( Tracker.exc.SQLAlchemyError, p, "mouse", 400 )
+
+        check( EdgeList, [ None, 1, 3, 2, None, None, None, 4, None ] )
+
+    def testPreloadMissingKeys( self ):
+        # integer keys and values with missing values
+        conn = sqlite3.connect( self.filename )
+        conn.execute( "CREATE TABLE counts (bin INT, value INT)" )
+        conn.executemany( "INSERT INTO counts VALUES (?,?)",
+                          [ (100, 10), (None, 20), (300, None) ] )
+        conn.commit()
+        conn.close()
+
+        class Columns( Tracker.SingleTableTrackerColumns ):
+            table = "counts"
+            column = "bin"
+            preload = True
+
+        p = Columns( backend = self.backend )
+        self.assertEqual( p( "value", 100 ), 10 )
+        self.assertTrue( type( p( "value", "100" ) ) is int )
+        self.assertEqual( p( "value", 300 ), None )
+        self.assertEqual( p( "value" ), [10, 20, None] )
+        self.assertTrue( type( p( "value" )[0] ) is int )
+
+class TrackerFileTest(unittest.TestCase):
+    '''check trackers reading tab-separated files.'''
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown( self ):
+        shutil.rmtree( self.tmpdir )
+
+    def write( self, filename, text ):
+        filename = os.path.join( self.tmpdir, filename )
+        if filename.endswith( ".gz" ):
+            outf = gzip.open( filename, "wt" )
+        else:
+            outf = open( filename, "w" )
+        outf.write( text )
+        outf.close()
+        return filename
+
+    def testTSV( self ):
+        filename = self.write( "data.tsv.gz", "# comment\ncounts\tscore\tname\n1\t0.5\ta\n2\t1.5\tb\n" )
+        for usecols in ( False, True ):
+            t = Tracker.TrackerTSV( filename = filename )
+            t.usecols = usecols
+            self.assertEqual( t.getTracks(), ["counts", "score", "name"] )
+            self.assertEqual( t( "counts" ).dtype.kind, "i" )
+            self.assertEqual( list( t( "score" ) ), [0.5, 1.5] )
+            self.assertEqual( list( t( "name" ) ), ["a", "b"] )
+
+        # parsed files are shared, but results are not
+        t( "counts" )[0] = 10
+        self.assertEqual( list( t( "counts" ) ), [1, 2] )
+
+        # changes to the file are picked up
+        filename = self.write( "data.tsv.gz", "counts\tscore\n3\t2.5\n" )
+        self.assertEqual( t.getTracks(), ["counts", "score"] )
+        self.assertEqual( list( t( "counts" ) ), [3] )
+
+    def testComments( self ):
+        # only lines starting with # are comments
+        filename = self.write( "comments.tsv", "# comment\nname\tcolour\n#skipped\t1\na\t#ff0000\nb#2\tred\n" )
+        t = Tracker.TrackerTSV( filename = filename )
+        self.assertEqual( t.getTracks(), ["name", "colour"] )
+        self.assertEqual( list( t( "name" ) ), ["a", "b#2"] )
+        self.assertEqual( list( t( "colour" ) ), ["#ff0000", "red"] )
+
+    def testMatrices( self ):
+        self.write( "m_a.tsv", "# comment\nrow\tx\ty\n1.50\t1\t2\nr2\t3\t4.5\n" )
+        t = Tracker.TrackerMatrices( glob = os.path.join( self.tmpdir, "m_*.tsv" ),
+                                     regex = "m_(.*).tsv" )
+        self.assertEqual( list( t.getTracks() ), ["a"] )
+        data = t( "a" )
+        self.assertEqual( data["rows"], ["1.50", "r2"] )
+        self.assertEqual( data["columns"], ["x", "y"] )
+        self.assertEqual( data["matrix"].dtype, numpy.float64 )
+        self.assertEqual( data["matrix"].tolist(), [[1.0, 2.0], [3.0, 4.5]] )
+
+        numpy.save( os.path.join( self.tmpdir, "m_b.npy" ), numpy.eye( 2 ) )
+        t = Tracker.TrackerMatrices( glob = os.path.join( self.tmpdir, "m_b.npy" ),
+                                     regex = "m_(.*).npy" )
+        self.assertEqual( t( "b" )["matrix"].tolist(), [[1.0, 0.0], [0.0, 1.0]] )
+        self.assertEqual( t( "b" )["rows"], ["0", "1"] )
+
+    def testDataframes( self ):
+        for x in range( 5 ):
+            self.write( "df_%i.tsv.gz" % x, "name\tvalue\na\t%i\nb\t%i\n" % (x, x * 2) )
+        numpy.save( os.path.join( self.tmpdir, "df_5.npy" ),
+                    numpy.array( [ ("a", 5), ("b", 10) ], dtype = [ ("name", "U1"), ("value", "i8") ] ) )
+
+        t = Tracker.TrackerDataframes( glob = os.path.join( self.tmpdir, "df_*" ),
+                                       regex = "df_(\\d+)", index_column = "name" )
+        t.threads = 3
+        tracks = t.getTracks()
+        self.assertEqual( tracks, [ str(x) for x in range( 6 ) ] )
+
+        # prefetching fills the cache of parsed files
+        t.prefetch( [ (x,) for x in tracks ] )
+        for filename in t.getFiles().values():
+            self.assertTrue( ( os.path.abspath( filename ), Tracker.parseDataframe, ("name",) ) \
+                                 in Tracker.PARSED_FILES )
+
+        for x in range( 6 ):
+            df = t( str(x) )
+            self.assertEqual( list( df.index ), ["a", "b"] )
+            self.assertEqual( list( df["value"] ), [x, x * 2] )
+
+    def testPrefetchWindow( self ):
+        for x in range( 8 ):
+            self.write( "df_%i.tsv" % x, "name\tvalue\na\t%i\n" % x )
+
+        class Prefetching( Tracker.TrackerDataframes ):
+            threads = 3
+            windows = []
+            # do not use the dispatcher's cache in the working directory
+            cache = False
+            def prefetch( self, paths ):
+                self.windows.append( [ x[0] for x in paths ] )
+                Tracker.TrackerDataframes.prefetch( self, paths )
+
+        t = Prefetching( glob = os.path.join( self.tmpdir, "df_*" ), regex = "df_(\\d+)" )
+        dispatcher = Dispatcher.Dispatcher( t, None, [] )
+        dispatcher.parseArguments( nocache = True )
+        # do not record profiling events
+        Utils.PARAMS["report_profile"] = False
+        try:
+            data = dispatcher.collect()
+        finally:
+            Utils.PARAMS["report_profile"] = True
+        self.assertEqual( list( data.keys() ), [ str(x) for x in range( 8 ) ] )
+        self.assertEqual( t.windows, [ ["0", "1", "2"], ["3", "4", "5"], ["6", "7"] ] )
+
+        # the number of parsed files is limited
+        max_parsed_files = Tracker.MAX_PARSED_FILES
+        Tracker.MAX_PARSED_FILES = 2
+        try:
+            Tracker.PARSED_FILES.clear()
+            t.windows = []
+            self.assertEqual( t.getPrefetchWindow(), 2 )
+            for x in range( 8 ): t( str(x) )
+            self.assertEqual( [ os.path.basename( key[0] ) for key in Tracker.PARSED_FILES ],
+                              [ "df_6.tsv", "df_7.tsv" ] )
+            # recently used files are kept
+            t( "6" )
+            t( "0" )
+            self.assertEqual( [ os.path.basename( key[0] ) for key in Tracker.PARSED_FILES ],
+                              [ "df_6.tsv", "df_0.tsv" ] )
+        finally:
+            Tracker.MAX_PARSED_FILES = max_parsed_files
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+'''unit testing code for transformers consuming chunked and
+spilled results.
+'''
+
+import unittest
+import tempfile
+import shutil
+import os
+
+import numpy
+import pandas
+
+from collections import OrderedDict as odict
+
+from SphinxReport import Utils, Stats, DataTree, Tracker, Dispatcher
+from SphinxReportPlugins import Transformer
+
+class ListResult( Utils.ChunkedResult ):
+    '''chunked result from a list of chunks.'''
+    def __init__(self, chunks ):
+        self.chunks = chunks
+        self.passes = 0
+    def __iter__(self):
+        self.passes += 1
+        return iter( self.chunks )
+
+def toChunks( values, chunk_size ):
+    return ListResult( [ odict( (("value", values[x:x+chunk_size]),) ) \
+                             for x in range( 0, len(values), chunk_size ) ] )
+
+class TransformerChunksTest(unittest.TestCase):
+    '''check that chunked results give the same results
+    as fully loaded arrays.'''
+
+    def setUp( self ):
+        numpy.random.seed( 1 )
+        self.values = numpy.random.normal( 10, 3, 10001 ).round( 1 )
+        self.chunks = toChunks( self.values, 1000 )
+
+    def testStats( self ):
+        values = numpy.sort( self.values )
+        n = len(values)
+        expected = { "counts" : n, "min" : values[0], "max" : values[-1],
+                     "mean" : values.mean(), "median" : numpy.median( values ),
+                     "samplestd" : values.std(), "sum" : values.sum(),
+                     "q1" : values[n // 4], "q3" : values[n * 3 // 4] }
+        # small limit to force refinement of histograms
+        result = Stats.summaryFromChunks( self.chunks.getColumn( "value" ), nbins = 16, max_values = 100 )
+        for key in expected.keys():
+            self.assertAlmostEqual( result[key], expected[key] )
+
+        result = Transformer.TransformerStats()( odict( (("track", self.chunks),) ) )
+        self.assertAlmostEqual( result["track"]["value"]["median"], expected["median"] )
+
+    def testHistogram( self ):
+        transformer = Transformer.TransformerHistogram( **{ "tf-bins" : "20" } )
+        expected = transformer( odict( (("track", list(self.values)),) ) )
+        result = transformer( odict( (("track", self.chunks),) ) )
+        self.assertTrue( numpy.allclose( result["track"]["value"]["bins"], expected["track"]["bins"] ) )
+        self.assertEqual( list(result["track"]["value"]["frequency"]), list(expected["track"]["frequency"]) )
+
+    def testAggregate( self ):
+        for option in ( "cumulative", "reverse-cumulative", "normalized-total", "cumulative,normalized-max" ):
+            transformer = Transformer.TransformerAggregate( **{ "tf-aggregate" : option } )
+            bins = numpy.arange( len(self.values) )
+            expected = transformer( odict( (("track", odict( (("bins", bins), ("value", self.values)) )),) ) )
+            chunks = ListResult( [ odict( (("bins", bins[x:x+1000]), ("value", self.values[x:x+1000])) ) \
+                                       for x in range( 0, len(bins), 1000 ) ] )
+            result = transformer( odict( (("track", chunks),) ) )
+            self.assertTrue( numpy.allclose( result["track"]["value"], expected["track"]["value"] ) )
+
+    def testPasses( self ):
+        # all columns are processed in the same passes
+        chunks = ListResult( [ odict( [ ("c%i" % y, self.values[x:x+1000] + y) for y in range( 3 ) ] ) \
+                                   for x in range( 0, len(self.values), 1000 ) ] )
+        result = Transformer.TransformerStats()( odict( (("track", chunks),) ) )
+        self.assertEqual( list(result["track"].keys()), ["c0", "c1", "c2"] )
+        self.assertAlmostEqual( result["track"]["c2"]["median"], numpy.median( self.values ) + 2 )
+        self.assertEqual( chunks.passes, 2 )
+
+        chunks.passes = 0
+        transformer = Transformer.TransformerHistogram( **{ "tf-bins" : "20" } )
+        result = transformer( odict( (("track", chunks),) ) )
+        expected = transformer( odict( (("track", list(self.values + 1)),) ) )
+        self.assertEqual( list(result["track"]["c1"]["frequency"]), list(expected["track"]["frequency"]) )
+        self.assertEqual( chunks.passes, 2 )
+
+    def testLoadChunks( self ):
+        result = Transformer.TransformerFilter( **{ "tf-fields" : "value" } )( odict( (("track", self.chunks),) ) )
+        self.assertEqual( list(result["track"]["value"]), list(self.values) )
+
+class TransformerSpillTest(unittest.TestCase):
+    '''check that leaves spilled to disk give the same results
+    as leaves held in memory.'''
+
+    def setUp( self ):
+        numpy.random.seed( 1 )
+        self.tmpdir = tempfile.mkdtemp()
+        # 1.6Mb per leaf
+        self.data = odict( ( ("track%i" % x, odict( ( ("value", numpy.random.normal( 10, 3, 200000 )),
+                                                      ("small", numpy.arange( 10 )) ) ) ) \
+                                 for x in range( 3 ) ) )
+
+    def tearDown( self ):
+        shutil.rmtree( self.tmpdir )
+
+    def testSpill( self ):
+        nbytes = self.data["track0"]["value"].nbytes
+        data, used, spilled = DataTree.spillLeaves( self.data, nbytes + 1000, self.tmpdir )
+        # the first leaf fits into the budget, small leaves are never spilled
+        self.assertEqual( spilled, 2 )
+        self.assertEqual( used, nbytes + 3 * self.data["track0"]["small"].nbytes )
+        self.assertFalse( Utils.isSpilled( data["track0"]["value"] ) )
+        self.assertTrue( Utils.isSpilled( data["track1"]["value"] ) )
+        self.assertFalse( Utils.isSpilled( data["track1"]["small"] ) )
+        self.assertEqual( DataTree.getPaths( data )[1], ["value", "small"] )
+        self.assertEqual( len( os.listdir( self.tmpdir ) ), 2 )
+
+        loaded = DataTree.loadSpilled( data )
+        self.assertTrue( numpy.all( loaded["track1"]["value"] == data["track1"]["value"].load() ) )
+        # loading does not modify the tree
+        self.assertTrue( DataTree.hasSpilled( data ) )
+        self.assertFalse( DataTree.hasSpilled( loaded ) )
+        self.assertTrue( loaded["track0"] is data["track0"] )
+
+        del data, loaded, self.data
+        self.assertEqual( os.listdir( self.tmpdir ), [] )
+
+    def testSpillDataFrame( self ):
+        dataframe = pandas.DataFrame( { "value" : numpy.arange( 200000 ) } )
+        data, used, spilled = DataTree.spillLeaves( odict( (("track", dataframe),) ), 0, self.tmpdir )
+        self.assertEqual( (used, spilled), (0, 1) )
+        self.assertTrue( DataTree.loadSpilled( data )["track"].equals( dataframe ) )
+
+    def testTransform( self ):
+        # trackers return lists of values
+        data = odict( ( (track, list( values["value"] )) for track, values in self.data.items() ) )
+        transformer = Transformer.TransformerHistogram( **{ "tf-bins" : "20" } )
+        expected = transformer( odict( data ) )
+        data, used, spilled = DataTree.spillLeaves( data, 0, self.tmpdir )
+        self.assertEqual( spilled, 3 )
+        result = transformer( data )
+        for track in expected.keys():
+            self.assertEqual( list(result[track]["frequency"]), list(expected[track]["frequency"]) )
+
+    def testDispatcher( self ):
+        data = self.data
+        class Values( Tracker.Tracker ):
+            tracks = list( data.keys() )
+            # do not use the dispatcher's cache in the working directory
+            cache = False
+            def __call__( self, track ):
+                return list( data[track]["value"] )
+
+        def collect( transformers ):
+            dispatcher = Dispatcher.Dispatcher( Values(), None, transformers )
+            dispatcher.parseArguments( nocache = True )
+            return dispatcher.collect(), dispatcher
+
+        cache_dir = Utils.PARAMS["report_cachedir"]
+        Utils.PARAMS["report_cachedir"] = self.tmpdir
+        Utils.PARAMS["report_memory_budget"] = 1
+        # do not record profiling events
+        Utils.PARAMS["report_profile"] = False
+        try:
+            # leaves are not spilled unless a transformer reduces them
+            collected, dispatcher = collect( [] )
+            self.assertFalse( DataTree.hasSpilled( collected ) )
+            collected, dispatcher = collect( [ Transformer.TransformerToList() ] )
+            self.assertFalse( DataTree.hasSpilled( collected ) )
+
+            transformer = Transformer.TransformerHistogram( **{ "tf-bins" : "20" } )
+            collected, dispatcher = collect( [ transformer ] )
+            self.assertEqual( [ Utils.isSpilled( x ) for x in collected.values() ], [True] * 3 )
+            self.assertEqual( len( os.listdir( os.path.join( self.tmpdir, "spill" ) ) ), 3 )
+            result = dispatcher.transform()
+            expected = transformer( odict( ( (x, list( y["value"] )) for x, y in data.items() ) ) )
+            for track in expected.keys():
+                self.assertEqual( list(result[track]["frequency"]), list(expected[track]["frequency"]) )
+        finally:
+            Utils.PARAMS["report_cachedir"] = cache_dir
+            Utils.PARAMS["report_memory_budget"] = None
+            Utils.PARAMS["report_profile"] = True
+
+if __name__ == "__main__":
+    unittest.main()